@@ -1,23 +1,47 @@
 # app.py (Backend Flask)
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
-from supabase import create_client, Client
 import os
+import json
 from dotenv import load_dotenv
 import jwt
 import datetime
+import time
+import hmac
 from functools import wraps
 
-# Cargar variables de entorno
+# Cargar variables de entorno (antes de importar los servicios, que leen su configuración al importar)
 load_dotenv()
 
+from services.demo_service import DemoResponseRenderer
+from services.batch_service import BatchParseError, analyze_batch, parse_batch_body, to_business_data
+from services.ai_agents import agent_orchestrator
+from services.async_bridge import async_bridge
+from services.job_queue import job_queue
+from services.identity_cache import identity_cache
+from services.analysis_cache import analysis_cache
+from services.semantic_cache import semantic_cache
+from services.worker_pool import agent_pool
+from services.llm_engine import llm_engine
+from services.supabase_client import LazySupabaseClient, supabase_factory
+from services.http_cache import conditional_json
+from services.json_provider import FastJSONProvider
+
+# Con LLM_MODE=llm no se arranca sin el modelo
+llm_engine.check_available()
+
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 CORS(app)
 
-# Configuración de Supabase
-SUPABASE_URL = os.environ.get("SUPABASE_URL")
-SUPABASE_KEY = os.environ.get("SUPABASE_KEY")
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+# Respuestas demo pre-serializadas con el mismo proveedor JSON que jsonify
+demo_renderer = DemoResponseRenderer(
+    render=lambda document: app.json.response(document).get_data(),
+    encode=lambda value: app.json.dumps(value).encode('utf-8')
+)
+
+# Configuración de Supabase (el cliente se crea en el primer uso, con conexiones keep-alive)
+supabase = LazySupabaseClient(supabase_factory)
 
 # Clave secreta para JWT
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'mysecretkey')
@@ -34,8 +58,15 @@ def token_required(f):
             if token.startswith('Bearer '):
                 token = token[7:]
             data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"])
-            # Verificar el usuario en Supabase
-            current_user = supabase.auth.get_user(token).user
+            # Tokens cerrados con /logout en cualquier worker
+            if identity_cache.is_revoked(token, data):
+                return jsonify({'message': 'Token has been revoked!'}), 401
+            # Verificar el usuario en Supabase (o reutilizar una verificación reciente)
+            current_user = identity_cache.get(token)
+            if current_user is None:
+                started = time.perf_counter()
+                current_user = supabase.auth.get_user(token).user
+                identity_cache.set(token, current_user, data.get('exp'), time.perf_counter() - started)
         except Exception as e:
             return jsonify({'message': 'Token is invalid!', 'error': str(e)}), 401
         return f(current_user, *args, **kwargs)
@@ -101,9 +132,11 @@ def login():
         expires_in = datetime.timedelta(days=30) if remember_me else datetime.timedelta(hours=24)
         
         # Generar token JWT
+        now = datetime.datetime.utcnow()
         token = jwt.encode({
             'user_id': user.user.id,
-            'exp': datetime.datetime.utcnow() + expires_in
+            'iat': now,
+            'exp': now + expires_in
         }, app.config['SECRET_KEY'])
         
         return jsonify({
@@ -118,128 +151,147 @@ def login():
     except Exception as e:
         return jsonify({'error': 'Invalid credentials', 'details': str(e)}), 401
 
+# Ruta para cerrar sesión (revoca el token en todos los workers hasta su expiración)
+@app.route('/logout', methods=['POST'])
+@token_required
+def logout(current_user):
+    token = request.headers.get('Authorization', '')
+    if token.startswith('Bearer '):
+        token = token[7:]
+    exp = jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"]).get('exp')
+    identity_cache.revoke(token, exp)
+    return jsonify({'message': 'Logged out'}), 200
+
+# Ruta de métricas internas (cachés, pool de agentes, cola de trabajos y modelo LLM).
+# Sólo con el token de administración METRICS_TOKEN; sin él configurado no se exponen
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    metrics_token = os.environ.get('METRICS_TOKEN', '')
+    token = request.headers.get('Authorization', '')
+    if token.startswith('Bearer '):
+        token = token[7:]
+    if not metrics_token or not hmac.compare_digest(token.encode('utf-8'), metrics_token.encode('utf-8')):
+        return jsonify({'message': 'Forbidden'}), 403
+    return jsonify({
+        'identity_cache': identity_cache.stats(),
+        'analysis_cache': analysis_cache.stats(),
+        'semantic_cache': semantic_cache.stats(),
+        'agent_pool': agent_pool.stats(),
+        'jobs': job_queue.stats(),
+        'llm': llm_engine.stats()
+    }), 200
+
+# Ruta de salud (comprueba la conexión con Supabase)
+@app.route('/health', methods=['GET'])
+def health():
+    supabase_health = supabase_factory.health_check()
+    status_code = 200 if supabase_health['status'] == 'ok' else 503
+    return jsonify({
+        'status': supabase_health['status'],
+        'supabase': supabase_health
+    }), status_code
+
 # Ruta para análisis sin autenticación (demo)
 @app.route('/analyze-demo', methods=['POST'])
 def analyze_business_demo():
     try:
         data = request.get_json()
         
-        # Análisis simplificado para demo
-        business_type = data.get('business_type', 'startup')
-        business_name = data.get('business_name', 'Tu Negocio')
-        
-        # Generar análisis basado en tipo de negocio
-        if business_type == 'saas':
-            analysis_result = {
-                'business_type': 'saas',
-                'business_name': business_name,
-                'score': 75,
-                'summary': f"Análisis completado para {business_name}. Identificamos oportunidades clave para optimizar métricas de SaaS.",
-                'recommendations': [
-                    {
-                        'category': 'Reducción de Churn',
-                        'priority': 'Alta',
-                        'impact': '30% reducción en cancelaciones',
-                        'actions': [
-                            'Implementar sistema de alertas tempranas de churn',
-                            'Crear programa de customer success proactivo',
-                            'Desarrollar feature adoption tracking y nudges'
-                        ]
-                    },
-                    {
-                        'category': 'Crecimiento de MRR',
-                        'priority': 'Alta',
-                        'impact': '25% aumento en revenue mensual',
-                        'actions': [
-                            'Optimizar pricing basado en valor',
-                            'Implementar upselling automatizado',
-                            'Crear tiers premium con features avanzadas'
-                        ]
-                    }
-                ],
-                'kpis': [
-                    {'name': 'MRR Growth', 'current': '12%', 'target': '20%', 'improvement': '+67%'},
-                    {'name': 'Churn Rate', 'current': '7.2%', 'target': '4.5%', 'improvement': '-38%'},
-                    {'name': 'CAC Payback', 'current': '8.2 meses', 'target': '5.1 meses', 'improvement': '-38%'},
-                    {'name': 'NPS Score', 'current': '42', 'target': '65', 'improvement': '+55%'}
-                ],
-                'timeline': '3-6 meses para implementación completa',
-                'estimated_roi': '185%',
-                'is_demo': True,
-                'generated_at': datetime.datetime.utcnow().isoformat()
-            }
-        elif business_type == 'ecommerce':
-            analysis_result = {
-                'business_type': 'ecommerce',
-                'business_name': business_name,
-                'score': 68,
-                'summary': f"Análisis completado para {business_name}. Identificamos oportunidades para optimizar conversiones y AOV.",
-                'recommendations': [
-                    {
-                        'category': 'Optimización de Conversión',
-                        'priority': 'Alta',
-                        'impact': '35% aumento en conversiones',
-                        'actions': [
-                            'Implementar abandoned cart recovery con secuencia de emails',
-                            'Optimizar checkout process reduciendo pasos a 2-3',
-                            'Agregar reviews y ratings prominentes en product pages'
-                        ]
-                    },
-                    {
-                        'category': 'Customer Experience',
-                        'priority': 'Alta',
-                        'impact': '40% aumento en repeat purchases',
-                        'actions': [
-                            'Implementar chatbot para soporte 24/7',
-                            'Crear programa de loyalty con rewards',
-                            'Personalizar product recommendations con ML'
-                        ]
-                    }
-                ],
-                'kpis': [
-                    {'name': 'Conversion Rate', 'current': '1.8%', 'target': '2.9%', 'improvement': '+61%'},
-                    {'name': 'Average Order Value', 'current': '$67', 'target': '$89', 'improvement': '+33%'},
-                    {'name': 'Cart Abandonment', 'current': '69%', 'target': '52%', 'improvement': '-25%'},
-                    {'name': 'Customer LTV', 'current': '$156', 'target': '$218', 'improvement': '+40%'}
-                ],
-                'timeline': '2-4 meses para implementación completa',
-                'estimated_roi': '165%',
-                'is_demo': True,
-                'generated_at': datetime.datetime.utcnow().isoformat()
-            }
-        else:
-            # Análisis genérico para otros tipos
-            analysis_result = {
-                'business_type': business_type,
-                'business_name': business_name,
-                'score': 68,
-                'summary': f"Análisis completado para {business_name}. Identificamos oportunidades de crecimiento.",
-                'recommendations': [
-                    {
-                        'category': 'Optimización Digital',
-                        'priority': 'Alta',
-                        'impact': '30% mejora en presencia online',
-                        'actions': [
-                            'Mejorar SEO y presencia online',
-                            'Implementar analytics y tracking',
-                            'Optimizar experiencia del cliente'
-                        ]
-                    }
-                ],
-                'kpis': [
-                    {'name': 'Crecimiento Revenue', 'current': '8%', 'target': '15%', 'improvement': '+88%'},
-                    {'name': 'Satisfacción Cliente', 'current': '7.2/10', 'target': '8.5/10', 'improvement': '+18%'}
-                ],
-                'timeline': '2-4 meses para implementación',
-                'estimated_roi': '165%',
-                'is_demo': True,
-                'generated_at': datetime.datetime.utcnow().isoformat()
-            }
+        # Análisis simplificado para demo (bytes pre-serializados + campos variables)
+        body = demo_renderer.render(
+            data.get('business_type', 'startup'),
+            data.get('business_name', 'Tu Negocio')
+        )
         
-        return jsonify(analysis_result), 200
+        return app.response_class(body, mimetype=app.json.mimetype), 200
         
     except Exception as e:
         return jsonify({'error': f'Error en el análisis demo: {str(e)}'}), 400
 
+# Ruta para análisis por lotes (JSON array o NDJSON, respuesta NDJSON en streaming)
+@app.route('/analyze/batch', methods=['POST'])
+@token_required
+def analyze_business_batch(current_user):
+    try:
+        items = parse_batch_body(request.get_data(as_text=True), request.mimetype)
+    except BatchParseError as e:
+        return jsonify({'error': f'Error en el lote: {str(e)}'}), 400
+    
+    max_parallel = request.args.get('max_parallel', type=int)
+    
+    def generate():
+        for line in analyze_batch(items, max_parallel=max_parallel, scope=str(current_user.id)):
+            yield app.json.dumps(line) + '\n'
+    
+    return Response(generate(), mimetype='application/x-ndjson')
+
+def _sse_event(event: str, payload) -> str:
+    """Formatear un evento Server-Sent Events"""
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+# Ruta para análisis en streaming (SSE): un evento por agente y uno consolidado al final
+@app.route('/analyze/stream', methods=['POST'])
+@token_required
+def analyze_business_stream(current_user):
+    try:
+        data = request.get_json()
+        business_data = to_business_data(data)
+    except Exception as e:
+        return jsonify({'error': f'Error en el análisis: {str(e)}'}), 400
+    
+    def generate():
+        try:
+            stream = agent_orchestrator.analyze_business_stream(business_data, scope=str(current_user.id))
+            for event, name, result in async_bridge.iterate(stream):
+                if event == 'agent':
+                    yield _sse_event('agent', {'agent': name, 'result': result})
+                else:
+                    yield _sse_event('consolidated', result)
+        except Exception as e:
+            yield _sse_event('error', {'error': f'Error en el análisis: {str(e)}'})
+    
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+# Ruta para encolar un análisis asíncrono (devuelve el job ID al instante)
+@app.route('/jobs', methods=['POST'])
+@token_required
+def submit_analysis_job(current_user):
+    try:
+        data = request.get_json()
+        job_queue.ensure_started()
+        job_id = job_queue.submit(to_business_data(data), owner=str(current_user.id))
+        
+        return jsonify({
+            'job_id': job_id,
+            'status': 'queued',
+            'status_url': f'/jobs/{job_id}'
+        }), 202
+        
+    except Exception as e:
+        return jsonify({'error': f'Error encolando el análisis: {str(e)}'}), 400
+
+# Ruta para consultar un trabajo (?wait=N segundos para long-polling)
+@app.route('/jobs/<job_id>', methods=['GET'])
+@token_required
+@conditional_json
+def get_analysis_job(current_user, job_id):
+    try:
+        job_queue.ensure_started()
+        wait = min(request.args.get('wait', default=0, type=float), 60)
+        owner = str(current_user.id)
+        job = job_queue.wait(job_id, wait, owner) if wait > 0 else job_queue.get(job_id, owner)
+        
+        # Los trabajos de otros usuarios no se distinguen de los inexistentes
+        if job is None:
+            return jsonify({'message': 'Job not found'}), 404
+        return jsonify(job), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
 if __name__ == '__main__':
+    job_queue.ensure_started()
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -1,23 +1,29 @@
 # app.py (Backend Flask)
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-from supabase import create_client, Client
 import os
 from dotenv import load_dotenv
 import jwt
 import datetime
+import time
 from functools import wraps
 
-# Cargar variables de entorno
+# Cargar variables de entorno (antes de importar los servicios, que leen su configuración al importar)
 load_dotenv()
 
+from services.identity_cache import identity_cache
+from services.supabase_client import LazySupabaseClient, supabase_factory
+from services.analysis_writer import analysis_writer
+from services.analysis_store import get_analysis, list_analyses
+from services.http_cache import conditional_json
+from services.json_provider import FastJSONProvider
+
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 CORS(app)
 
-# Configuración de Supabase
-SUPABASE_URL = os.environ.get("SUPABASE_URL")
-SUPABASE_KEY = os.environ.get("SUPABASE_KEY")
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+# Configuración de Supabase (el cliente se crea en el primer uso, con conexiones keep-alive)
+supabase = LazySupabaseClient(supabase_factory)
 
 # Clave secreta para JWT
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'mysecretkey')
@@ -34,8 +40,15 @@ def token_required(f):
             if token.startswith('Bearer '):
                 token = token[7:]
             data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"])
-            # Verificar el usuario en Supabase
-            current_user = supabase.auth.get_user(token).user
+            # Tokens cerrados con /logout en cualquier worker
+            if identity_cache.is_revoked(token, data):
+                return jsonify({'message': 'Token has been revoked!'}), 401
+            # Verificar el usuario en Supabase (o reutilizar una verificación reciente)
+            current_user = identity_cache.get(token)
+            if current_user is None:
+                started = time.perf_counter()
+                current_user = supabase.auth.get_user(token).user
+                identity_cache.set(token, current_user, data.get('exp'), time.perf_counter() - started)
         except Exception as e:
             return jsonify({'message': 'Token is invalid!', 'error': str(e)}), 401
         return f(current_user, *args, **kwargs)
@@ -101,9 +114,11 @@ def login():
         expires_in = datetime.timedelta(days=30) if remember_me else datetime.timedelta(hours=24)
         
         # Generar token JWT
+        now = datetime.datetime.utcnow()
         token = jwt.encode({
             'user_id': user.user.id,
-            'exp': datetime.datetime.utcnow() + expires_in
+            'iat': now,
+            'exp': now + expires_in
         }, app.config['SECRET_KEY'])
         
         return jsonify({
@@ -118,6 +133,17 @@ def login():
     except Exception as e:
         return jsonify({'error': 'Invalid credentials', 'details': str(e)}), 401
 
+# Ruta para cerrar sesión: revoca el token en todos los workers
+@app.route('/logout', methods=['POST'])
+@token_required
+def logout(current_user):
+    token = request.headers.get('Authorization', '')
+    if token.startswith('Bearer '):
+        token = token[7:]
+    exp = jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"]).get('exp')
+    identity_cache.revoke(token, exp)
+    return jsonify({'message': 'Logged out'}), 200
+
 # Ruta para login social (Google)
 @app.route('/login/google', methods=['POST'])
 def login_google():
@@ -202,19 +228,13 @@ def analyze_business(current_user):
         data = request.get_json()
         
         # Importar el orquestador de IA
-        import asyncio
         from services.ai_service import ai_orchestrator
+        from services.async_bridge import async_bridge
         
         # Ejecutar análisis completo con agentes especializados
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
-        try:
-            comprehensive_analysis = loop.run_until_complete(
-                ai_orchestrator.perform_comprehensive_analysis(data)
-            )
-        finally:
-            loop.close()
+        comprehensive_analysis = async_bridge.run(
+            ai_orchestrator.perform_comprehensive_analysis(data)
+        )
         
         # Formatear resultado para compatibilidad con frontend
         analysis_result = {
@@ -230,7 +250,7 @@ def analyze_business(current_user):
             "confidence_score": comprehensive_analysis.get('analysis_metadata', {}).get('confidence_score', 0.8)
         }
         
-        # Guardar el análisis en la base de datos
+        # Guardar el análisis en la base de datos (en segundo plano, por lotes)
         analysis_data = {
             'user_id': current_user.id,
             'business_data': data,
@@ -238,12 +258,7 @@ def analyze_business(current_user):
             'comprehensive_analysis': comprehensive_analysis,
             'created_at': datetime.datetime.utcnow().isoformat()
         }
-        
-        try:
-            supabase.table('analyses').insert(analysis_data).execute()
-        except Exception as db_error:
-            print(f"Database error: {db_error}")
-            # Continue without saving to DB for demo purposes
+        analysis_writer.enqueue(analysis_data)
         
         return jsonify(analysis_result), 200
         
@@ -258,19 +273,13 @@ def analyze_business_demo():
         data = request.get_json()
         
         # Importar el orquestador de IA
-        import asyncio
         from services.ai_service import ai_orchestrator
+        from services.async_bridge import async_bridge
         
         # Ejecutar análisis completo con agentes especializados
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
-        try:
-            comprehensive_analysis = loop.run_until_complete(
-                ai_orchestrator.perform_comprehensive_analysis(data)
-            )
-        finally:
-            loop.close()
+        comprehensive_analysis = async_bridge.run(
+            ai_orchestrator.perform_comprehensive_analysis(data)
+        )
         
         # Formatear resultado para compatibilidad con frontend
         analysis_result = {
@@ -313,15 +322,35 @@ def analyze_business_demo():
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
-# Ruta para obtener historial de análisis del usuario
+# Ruta para obtener historial de análisis del usuario (resúmenes paginados por cursor)
 @app.route('/analyses', methods=['GET'])
 @token_required
+@conditional_json
 def get_analyses(current_user):
     try:
-        # Obtener análisis del usuario
-        response = supabase.table('analyses').select('*').eq('user_id', current_user.id).execute()
+        page = list_analyses(
+            supabase,
+            current_user.id,
+            limit=request.args.get('limit', type=int),
+            cursor=request.args.get('cursor')
+        )
         
-        return jsonify({'analyses': response.data}), 200
+        return jsonify(page), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+# Ruta para obtener un análisis completo del usuario
+@app.route('/analyses/<analysis_id>', methods=['GET'])
+@token_required
+@conditional_json
+def get_analysis_detail(current_user, analysis_id):
+    try:
+        analysis = get_analysis(supabase, current_user.id, analysis_id)
+        
+        if analysis is None:
+            return jsonify({'message': 'Analysis not found'}), 404
+        return jsonify(analysis), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 400
@@ -594,7 +623,7 @@ def comprehensive_analysis(current_user):
         # Ejecutar análisis completo con todos los agentes
         comprehensive_result = agent_orchestrator.run_comprehensive_analysis(business_data)
         
-        # Guardar en base de datos
+        # Guardar en base de datos (en segundo plano, por lotes)
         analysis_data = {
             'user_id': current_user.id,
             'business_data': business_data,
@@ -602,11 +631,7 @@ def comprehensive_analysis(current_user):
             'analysis_type': 'comprehensive_ai',
             'created_at': datetime.datetime.utcnow().isoformat()
         }
-        
-        try:
-            supabase.table('analyses').insert(analysis_data).execute()
-        except Exception as db_error:
-            print(f"Database error: {db_error}")
+        analysis_writer.enqueue(analysis_data)
         
         return jsonify(comprehensive_result), 200
         
@@ -0,0 +1,180 @@
+# asgi.py (Backend ASGI - modo de servicio asíncrono)
+# Las rutas que pasan casi todo el tiempo esperando a Supabase (/signup, /login)
+# y las baratas (/, /analyze-demo) son vistas async con el cliente asíncrono de
+# Supabase: mientras una petición espera E/S el proceso sigue atendiendo otras.
+# El resto de rutas las sirve la misma app Flask de app.py (montada como WSGI en
+# un hilo), de modo que ambos modos exponen siempre los mismos endpoints.
+# Ejecutar con: uvicorn asgi:app --host 0.0.0.0 --port 5000
+import os
+import json
+import asyncio
+import datetime
+import warnings
+from typing import Optional
+
+import jwt
+from dotenv import load_dotenv
+
+# Cargar variables de entorno (antes de importar los servicios, que leen su configuración al importar)
+load_dotenv()
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Mount, Route
+from supabase._async.client import AsyncClient, create_client as create_async_client
+
+with warnings.catch_warnings():
+    # Deprecado en favor de a2wsgi, pero incluido en la versión fijada de starlette
+    warnings.simplefilter('ignore', DeprecationWarning)
+    from starlette.middleware.wsgi import WSGIMiddleware
+
+from services.demo_service import DemoResponseRenderer
+from wsgi import app as flask_app
+
+# Cliente asíncrono de Supabase (se crea en el primer uso)
+supabase: Optional[AsyncClient] = None
+_supabase_lock: Optional[asyncio.Lock] = None
+
+# Clave secreta para JWT (la misma que valida token_required en las rutas Flask)
+SECRET_KEY = flask_app.config['SECRET_KEY']
+
+# Respuestas demo pre-serializadas con el mismo formato que JSONResponse
+demo_renderer = DemoResponseRenderer(
+    render=lambda document: JSONResponse(document).body,
+    encode=lambda value: json.dumps(value, ensure_ascii=False, allow_nan=False, separators=(',', ':')).encode('utf-8')
+)
+
+
+async def get_supabase() -> AsyncClient:
+    """Cliente asíncrono de Supabase compartido por todas las peticiones"""
+    global supabase, _supabase_lock
+    if supabase is not None:
+        return supabase
+    if _supabase_lock is None:
+        # Se crea dentro del event loop (en Python 3.9 un Lock se asocia al loop al construirse)
+        _supabase_lock = asyncio.Lock()
+    async with _supabase_lock:
+        # Las peticiones que esperaban al lock reutilizan el cliente ya creado
+        if supabase is None:
+            supabase = await create_async_client(os.environ.get("SUPABASE_URL"), os.environ.get("SUPABASE_KEY"))
+    return supabase
+
+
+# Ruta de inicio
+async def home(request: Request):
+    return JSONResponse({'message': 'Bienvenido a Anclora Cortex API'})
+
+
+# Ruta para registro de usuario
+async def signup(request: Request):
+    try:
+        data = await request.json()
+        email = data.get('email')
+        password = data.get('password')
+        phone = data.get('phone')
+        name = data.get('name')
+
+        # Crear usuario en Supabase
+        client = await get_supabase()
+        user = await client.auth.sign_up({
+            "email": email,
+            "password": password,
+            "phone": phone,
+            "options": {
+                "data": {
+                    "full_name": name
+                }
+            }
+        })
+
+        # Enviar verificación por SMS
+        if phone:
+            await client.auth.sign_in_with_otp({
+                "phone": phone
+            })
+
+        return JSONResponse({
+            'message': 'User created successfully. Please verify your phone number.',
+            'user_id': user.user.id
+        }, status_code=201)
+
+    except Exception as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+
+
+# Ruta para login de usuario
+async def login(request: Request):
+    try:
+        data = await request.json()
+        email = data.get('email')
+        password = data.get('password')
+        remember_me = data.get('remember_me', False)
+
+        # Iniciar sesión con Supabase
+        client = await get_supabase()
+        user = await client.auth.sign_in_with_password({
+            "email": email,
+            "password": password
+        })
+
+        # Configurar expiración del token según "remember me"
+        expires_in = datetime.timedelta(days=30) if remember_me else datetime.timedelta(hours=24)
+
+        # Generar token JWT
+        now = datetime.datetime.utcnow()
+        token = jwt.encode({
+            'user_id': user.user.id,
+            'iat': now,
+            'exp': now + expires_in
+        }, SECRET_KEY)
+
+        return JSONResponse({
+            'token': token,
+            'user': {
+                'id': user.user.id,
+                'email': user.user.email,
+                'phone': user.user.phone
+            }
+        }, status_code=200)
+
+    except Exception as e:
+        return JSONResponse({'error': 'Invalid credentials', 'details': str(e)}, status_code=401)
+
+
+# Ruta para análisis sin autenticación (demo)
+async def analyze_business_demo(request: Request):
+    try:
+        data = await request.json()
+
+        # Análisis simplificado para demo (bytes pre-serializados + campos variables)
+        body = demo_renderer.render(
+            data.get('business_type', 'startup'),
+            data.get('business_name', 'Tu Negocio')
+        )
+
+        return Response(body, status_code=200, media_type='application/json')
+
+    except Exception as e:
+        return JSONResponse({'error': f'Error en el análisis demo: {str(e)}'}, status_code=400)
+
+
+routes = [
+    Route('/', home, methods=['GET']),
+    Route('/signup', signup, methods=['POST']),
+    Route('/login', login, methods=['POST']),
+    Route('/analyze-demo', analyze_business_demo, methods=['POST']),
+    # Resto de endpoints (/logout, /metrics, /health, /analyze/*, /jobs...): la app Flask
+    Mount('/', app=WSGIMiddleware(flask_app)),
+]
+
+app = Starlette(
+    routes=routes,
+    middleware=[Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])]
+)
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run('asgi:app', host='0.0.0.0', port=5000)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Benchmark: tamaño por fila y coste de escritura/lectura de un análisis
+guardado como JSON en claro, como JSON comprimido con zlib y con el formato
+compacto de services.analysis_codec (plantilla versionada + diferencias).
+Comprueba además que cada documento se reconstruye idéntico.
+
+Uso: python benchmarks/bench_analysis_codec.py [iteraciones]
+"""
+
+import os
+import sys
+import json
+import zlib
+import time
+import base64
+import asyncio
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from services.ai_agents import AIAgentOrchestrator
+from services.analysis_cache import AnalysisCache
+from services.analysis_codec import AnalysisCodec, AnalysisTemplates
+
+SAMPLES = [
+    {'business_type': 'saas', 'business_name': 'CloudMetrics', 'website': 'https://cloudmetrics.io',
+     'description': 'Plataforma SaaS de analítica para pymes', 'challenges': 'Churn alto y onboarding lento',
+     'goals': 'Reducir churn y crecer MRR'},
+    {'business_type': 'ecommerce', 'business_name': 'Moda Verde', 'description': 'Tienda online de moda sostenible',
+     'challenges': 'Competencia fuerte y carritos abandonados', 'goals': 'Aumentar conversión'},
+    {'business_type': 'local', 'business_name': 'Café Central', 'description': 'Cafetería de barrio',
+     'challenges': 'Poca visibilidad online', 'goals': 'Más clientes recurrentes'},
+    {'business_type': 'startup', 'business_name': 'Nova', 'description': 'Startup en fase de validación de MVP',
+     'challenges': 'Falta de tracción y problemas de retención', 'goals': 'Encontrar product-market fit'},
+]
+
+
+def _json_bytes(value) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _timed(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def _typed(doc) -> str:
+    # Distingue True de 1 y 70 de 70.0 (== de Python no)
+    return json.dumps(doc, ensure_ascii=False, sort_keys=True)
+
+
+def _zlib_encode(doc):
+    return base64.b64encode(zlib.compress(_json_bytes(doc), 6)).decode('ascii')
+
+
+def _zlib_decode(value):
+    return json.loads(zlib.decompress(base64.b64decode(value)))
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    orchestrator = AIAgentOrchestrator(cache=AnalysisCache(max_entries=0))
+    codec = AnalysisCodec(AnalysisTemplates(table=None))
+
+    print(f"{'tipo':10s} {'JSON':>9s} {'zlib':>9s} {'compacto':>9s}   "
+          f"{'escr. JSON':>10s} {'escr. zlib':>10s} {'escr. comp':>10s}   "
+          f"{'lect. JSON':>10s} {'lect. zlib':>10s} {'lect. comp':>10s}")
+    for data in SAMPLES:
+        doc = json.loads(_json_bytes(asyncio.run(orchestrator.analyze_business_comprehensive(data))))
+        plain, zipped, compact = _json_bytes(doc), _zlib_encode(doc), codec.encode(doc)
+        assert _typed(codec.decode(compact)) == _typed(doc), 'el documento reconstruido no coincide'
+        assert _typed(codec.decode(json.loads(_json_bytes(compact)))) == _typed(doc)
+
+        sizes = (len(plain), len(_json_bytes(zipped)), len(_json_bytes(compact)))
+        writes = (_timed(lambda: _json_bytes(doc), n), _timed(lambda: _zlib_encode(doc), n),
+                  _timed(lambda: _json_bytes(codec.encode(doc)), n))
+        plain_text, zipped_text, compact_text = plain, _json_bytes(zipped), _json_bytes(compact)
+        reads = (_timed(lambda: json.loads(plain_text), n),
+                 _timed(lambda: _zlib_decode(json.loads(zipped_text)), n),
+                 _timed(lambda: codec.decode(json.loads(compact_text)), n))
+        print(f"{data['business_type']:10s} {sizes[0]:8d}B {sizes[1]:8d}B {sizes[2]:8d}B   "
+              + ' '.join(f'{t:8.1f}µs' for t in writes) + '   '
+              + ' '.join(f'{t:8.1f}µs' for t in reads))
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: coste por llamada de crear un event loop nuevo por petición
+frente a enviar la corrutina al loop persistente de services.async_bridge.
+
+Uso: python benchmarks/bench_async_bridge.py [iteraciones]
+"""
+
+import os
+import sys
+import time
+import asyncio
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from services.async_bridge import AsyncLoopBridge
+
+
+async def _noop():
+    return 1
+
+
+def per_call_loop(iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(_noop())
+        loop.close()
+    return time.perf_counter() - start
+
+
+def persistent_loop(iterations: int) -> float:
+    bridge = AsyncLoopBridge(name='bench-loop')
+    bridge.run(_noop())  # calentar
+    start = time.perf_counter()
+    for _ in range(iterations):
+        bridge.run(_noop(), timeout=5)
+    elapsed = time.perf_counter() - start
+    bridge.shutdown()
+    return elapsed
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    before = per_call_loop(n)
+    after = persistent_loop(n)
+    print(f"Loop nuevo por llamada : {before / n * 1e6:8.1f} µs/llamada")
+    print(f"Loop persistente       : {after / n * 1e6:8.1f} µs/llamada")
+    print(f"Mejora                 : {before / after:8.1f}x")
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Comprueba que las respuestas demo pre-serializadas (DemoResponseRenderer) son
+byte a byte idénticas a serializar build_demo_analysis con jsonify (Flask) y
+con JSONResponse (ASGI), y mide respuestas por segundo de ambos caminos.
+
+Uso: python benchmarks/bench_demo_render.py [iteraciones]
+"""
+
+import os
+import sys
+import json
+import time
+import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from flask import Flask
+from starlette.responses import JSONResponse
+
+from services import demo_service
+from services.demo_service import DemoResponseRenderer, build_demo_analysis
+from services.json_provider import FastJSONProvider
+
+BUSINESS_TYPES = ['saas', 'ecommerce', 'local', 'startup', '', 'SaaS', 'tipo "raro"\n', None, 7, ['saas'], {'a': 1}]
+BUSINESS_NAMES = [
+    'Tu Negocio', 'Añil & Cía', 'Comillas "dobles" y \\barras\\', '</script><script>alert(1)</script>',
+    'Línea\nnueva\ttab\x00nulo\x1f', 'emoji 🚀 y   separador', '{name} {0}', '', None, 42, 3.5, True,
+    ['lista'], {'anidado': 'valor'}
+]
+
+
+class _FrozenClock(datetime.datetime):
+    @classmethod
+    def utcnow(cls):
+        return datetime.datetime(2024, 5, 1, 10, 30, 15, 123456)
+
+
+def _freeze_clock():
+    demo_service.datetime = type('datetime_module', (), {'datetime': _FrozenClock})
+
+
+def _check_identical(flask_app, flask_renderer, asgi_renderer) -> int:
+    checked = 0
+    for business_type in BUSINESS_TYPES:
+        for business_name in BUSINESS_NAMES:
+            expected = flask_app.json.response(build_demo_analysis(business_type, business_name)).get_data()
+            assert flask_renderer.render(business_type, business_name) == expected, (business_type, business_name)
+            expected = JSONResponse(build_demo_analysis(business_type, business_name)).body
+            assert asgi_renderer.render(business_type, business_name) == expected, (business_type, business_name)
+            checked += 2
+    return checked
+
+
+def _per_second(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return iterations / (time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    flask_renderer = DemoResponseRenderer(
+        render=lambda document: app.json.response(document).get_data(),
+        encode=lambda value: app.json.dumps(value).encode('utf-8')
+    )
+    asgi_renderer = DemoResponseRenderer(
+        render=lambda document: JSONResponse(document).body,
+        encode=lambda value: json.dumps(value, ensure_ascii=False, allow_nan=False, separators=(',', ':')).encode('utf-8')
+    )
+
+    real_datetime = demo_service.datetime
+    _freeze_clock()
+    print(f"Respuestas idénticas byte a byte: {_check_identical(app, flask_renderer, asgi_renderer)} casos")
+    demo_service.datetime = real_datetime
+
+    for label, business_type in (('saas', 'saas'), ('genérico', 'local')):
+        print(f"\n[{label}]")
+        results = {
+            'Flask jsonify(dict)': _per_second(
+                lambda: app.json.response(build_demo_analysis(business_type, 'Mi Negocio')), n),
+            'Flask pre-serializado': _per_second(
+                lambda: app.response_class(flask_renderer.render(business_type, 'Mi Negocio'), mimetype='application/json'), n),
+            'ASGI JSONResponse(dict)': _per_second(
+                lambda: JSONResponse(build_demo_analysis(business_type, 'Mi Negocio')), n),
+            'ASGI pre-serializado': _per_second(lambda: asgi_renderer.render(business_type, 'Mi Negocio'), n),
+        }
+        for name, rate in results.items():
+            print(f"{name:26s}: {rate:10.0f} respuestas/s")
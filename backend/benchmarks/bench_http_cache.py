@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Benchmark: bytes transferidos y tiempo de respuesta de los endpoints de
+análisis sin caché HTTP, con compresión gzip/brotli y con revalidación
+If-None-Match (304), usando services.http_cache sobre payloads reales del
+orquestador (un análisis completo, una página de resúmenes y el listado
+completo que devolvía el antiguo select('*')).
+
+El tiempo medido es el del servidor (cliente de pruebas de Flask, sin red);
+la última columna estima el tiempo hasta la respuesta completa con un enlace
+de 10 Mbit/s sumando la transferencia del cuerpo.
+
+Uso: python benchmarks/bench_http_cache.py [iteraciones]
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from flask import Flask, jsonify
+
+from services import http_cache
+from services.ai_agents import agent_orchestrator
+from services.http_cache import conditional_json
+
+
+def _payloads():
+    analysis = json.loads(json.dumps(asyncio.run(agent_orchestrator.analyze_business_comprehensive({
+        'business_type': 'saas', 'business_name': 'CloudMetrics', 'description': 'Plataforma SaaS B2B',
+        'challenges': 'Churn alto y poca conversión', 'goals': 'Crecer MRR'
+    }))))
+    page = {'analyses': [
+        {'id': i, 'created_at': f'2024-05-01T10:{i % 60:02d}:00+00:00', 'business_name': f'Negocio {i}',
+         'business_type': 'saas', 'score': 85} for i in range(20)
+    ], 'next_cursor': 'WyIyMDI0LTA1LTAxVDEwOjAwOjAwKzAwOjAwIiwyMF0'}
+    full_list = {'analyses': [dict(analysis, business_name=f'Negocio {i}') for i in range(200)]}
+    return {'analysis': analysis, 'page': page, 'full_list': full_list}
+
+
+def _app(payloads, cached: bool) -> Flask:
+    app = Flask(__name__)
+    for name, payload in payloads.items():
+        def view(payload=payload):
+            return jsonify(payload), 200
+        app.add_url_rule(f'/{name}', name, conditional_json(view) if cached else view)
+    return app
+
+
+LINK_BYTES_PER_MS = 10e6 / 8 / 1000  # 10 Mbit/s
+
+
+def _row(name, label, body_size, ms):
+    print(f"{name:10s} {label:22s} {body_size:9d} {ms:12.3f} {ms + body_size / LINK_BYTES_PER_MS:14.2f}")
+
+
+def _measure(client, path, headers, iterations):
+    response = client.get(path, headers=headers)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        client.get(path, headers=headers)
+    return response, (time.perf_counter() - start) / iterations * 1000
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    payloads = _payloads()
+    plain = _app(payloads, cached=False).test_client()
+    cached = _app(payloads, cached=True).test_client()
+
+    print(f"brotli disponible: {http_cache.brotli is not None}, umbral {http_cache.COMPRESSION_MIN_BYTES} B, "
+          f"gzip nivel {http_cache.GZIP_LEVEL}, brotli calidad {http_cache.BROTLI_QUALITY}")
+    print(f"{'endpoint':10s} {'escenario':22s} {'bytes':>9s} {'ms/petición':>12s} {'ms @10 Mbit/s':>14s}")
+    for name in payloads:
+        path = f'/{name}'
+        scenarios = [('sin caché', plain, {}), ('gzip', cached, {'Accept-Encoding': 'gzip'})]
+        if http_cache.brotli is not None:
+            scenarios.append(('brotli', cached, {'Accept-Encoding': 'br, gzip'}))
+        for label, client, headers in scenarios:
+            response, ms = _measure(client, path, headers, n)
+            _row(name, label, len(response.data), ms)
+
+        headers = {'Accept-Encoding': 'br, gzip'}
+        etag = cached.get(path, headers=headers).headers['ETag']
+        response, ms = _measure(cached, path, dict(headers, **{'If-None-Match': etag}), n)
+        assert response.status_code == 304
+        _row(name, 'revalidación (304)', len(response.data), ms)
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Generador de carga mínimo para medir peticiones por segundo contra un servidor
+en marcha (dev server de Flask, gunicorn o uvicorn).
+
+Uso: python benchmarks/bench_http_throughput.py URL [segundos] [concurrencia]
+Ejemplo: python benchmarks/bench_http_throughput.py http://127.0.0.1:5000/analyze-demo 10 16
+"""
+
+import sys
+import json
+import time
+import threading
+import http.client
+from urllib.parse import urlparse
+
+PAYLOAD = json.dumps({
+    'business_type': 'saas',
+    'business_name': 'Mi SaaS',
+    'description': 'Plataforma de gestión de proyectos',
+    'challenges': 'Alto churn rate',
+    'goals': 'Reducir churn y aumentar MRR'
+}).encode()
+
+
+def worker(url, deadline, latencies, errors):
+    parsed = urlparse(url)
+    conn = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=30)
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            conn.request('POST', parsed.path or '/', body=PAYLOAD,
+                         headers={'Content-Type': 'application/json'})
+            response = conn.getresponse()
+            response.read()
+            if response.status >= 400:
+                errors.append(response.status)
+            latencies.append(time.perf_counter() - start)
+            if response.getheader('Connection', '').lower() == 'close' or response.version == 10:
+                conn.close()
+                conn = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=30)
+        except Exception as e:
+            errors.append(str(e))
+            conn.close()
+            conn = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=30)
+    conn.close()
+
+
+if __name__ == '__main__':
+    url = sys.argv[1]
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 10
+    concurrency = int(sys.argv[3]) if len(sys.argv) > 3 else 16
+
+    latencies, errors = [], []
+    deadline = time.perf_counter() + seconds
+    threads = [threading.Thread(target=worker, args=(url, deadline, latencies, errors))
+               for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    latencies.sort()
+    n = len(latencies)
+    print(f"Peticiones: {n}  errores: {len(errors)}  concurrencia: {concurrency}")
+    print(f"Throughput: {n / seconds:.1f} req/s")
+    if n:
+        print(f"Latencia p50: {latencies[n // 2] * 1000:.2f} ms  "
+              f"p99: {latencies[min(n - 1, int(n * 0.99))] * 1000:.2f} ms")
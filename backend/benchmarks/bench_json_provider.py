@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Benchmark: codificación (respuesta jsonify completa) y decodificación de
+payloads reales de análisis con el proveedor JSON por defecto de Flask frente
+a services.json_provider.FastJSONProvider. Comprueba que ambos producen el
+mismo documento.
+
+Uso: python benchmarks/bench_json_provider.py [iteraciones]
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from services import json_provider
+from services.ai_agents import agent_orchestrator
+from services.ai_service import ai_service
+from services.json_provider import FastJSONProvider
+
+DATA = {'business_type': 'saas', 'business_name': 'CloudMetrics', 'description': 'Plataforma SaaS B2B de analítica',
+        'challenges': 'Churn alto, poca conversión y tráfico bajo', 'goals': 'Crecer MRR'}
+
+
+def _payloads():
+    analysis = asyncio.run(agent_orchestrator.analyze_business_comprehensive(DATA))
+    rules = ai_service._analyze_with_rules(DATA)
+    return {
+        'análisis multiagente': analysis,
+        'análisis por reglas': rules,
+        'listado de 200': {'analyses': [dict(analysis, business_name=f'Negocio {i}') for i in range(200)]},
+    }
+
+
+def _per_second(fn, iterations: int) -> float:
+    fn()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return iterations / (time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    app = Flask(__name__)
+    default_provider, fast_provider = DefaultJSONProvider(app), FastJSONProvider(app)
+    print(f"orjson disponible: {json_provider.orjson is not None}")
+    print(f"{'payload':22s} {'bytes':>9s} {'encode std':>12s} {'encode fast':>12s} {'decode std':>12s} {'decode fast':>12s}")
+
+    with app.app_context():
+        for name, payload in _payloads().items():
+            iterations = max(1, n // 20) if name.startswith('listado') else n
+            std_body = default_provider.response(payload).get_data()
+            fast_body = fast_provider.response(payload).get_data()
+            assert json.loads(std_body) == json.loads(fast_body), 'los proveedores no coinciden'
+
+            encode_std = _per_second(lambda: default_provider.response(payload), iterations)
+            encode_fast = _per_second(lambda: fast_provider.response(payload), iterations)
+            decode_std = _per_second(lambda: default_provider.loads(std_body), iterations)
+            decode_fast = _per_second(lambda: fast_provider.loads(fast_body), iterations)
+            mb = len(fast_body) / 1e6
+            print(f"{name:22s} {len(fast_body):9d} {encode_std * mb:9.1f}MB/s {encode_fast * mb:9.1f}MB/s "
+                  f"{decode_std * mb:9.1f}MB/s {decode_fast * mb:9.1f}MB/s")
+
+        moment = datetime.datetime(2024, 5, 1, 10, 30, 15, 123456)
+        assert fast_provider.loads(fast_provider.dumps({'generated_at': moment}))['generated_at'] == moment.isoformat()
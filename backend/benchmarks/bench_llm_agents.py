@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Benchmark del modo LLM de los agentes con un modelo GGUF local en CPU.
+Ejecuta análisis completos del orquestador (3 agentes) con peticiones
+concurrentes desde varios hilos, como los hilos de un worker de gunicorn, y
+muestra latencias, espera en cola frente a cómputo del modelo y la memoria
+del proceso. Comprueba también que sin modelo los agentes usan sus reglas.
+
+Genera antes el modelo de pruebas: python benchmarks/make_test_model.py
+
+Uso: python benchmarks/bench_llm_agents.py [modelo.gguf] [peticiones] [concurrencia]
+"""
+
+import os
+import sys
+import time
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.join(os.path.dirname(__file__), '..')
+MODEL = sys.argv[1] if len(sys.argv) > 1 else os.path.join(BACKEND_DIR, 'data', 'models', 'tiny-main.gguf')
+os.environ['LLAMA_MODEL_PATH'] = MODEL
+os.environ.setdefault('LLM_MAX_TOKENS', '48')
+os.environ.setdefault('LLM_TIMEOUT', '120')
+os.environ.setdefault('AGENT_TIMEOUT', '180')
+os.environ.setdefault('AGENT_POOL_QUEUE_SIZE', '256')
+sys.path.insert(0, BACKEND_DIR)
+
+from services.ai_agents import agent_orchestrator
+from services.async_bridge import async_bridge
+from services.llm_engine import llm_engine
+
+
+def _business(index: int):
+    # Entradas distintas para no acertar en la caché de análisis
+    return {'business_type': ('saas', 'ecommerce', 'local')[index % 3], 'business_name': f'Negocio {index}',
+            'description': 'Plataforma de analítica para clientes', 'challenges': 'Churn alto y poca conversión',
+            'goals': f'Crecer un {10 + index}% este año', 'website': ''}
+
+
+def _analyze(index: int) -> float:
+    started = time.perf_counter()
+    async_bridge.run(agent_orchestrator.analyze_business_comprehensive(_business(index)))
+    return time.perf_counter() - started
+
+
+def _rss_mb() -> float:
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def _run(label: str, requests: int, concurrency: int, offset: int) -> None:
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        started = time.perf_counter()
+        latencies = sorted(executor.map(_analyze, range(offset, offset + requests)))
+        elapsed = time.perf_counter() - started
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(f"{label:28s} {requests / elapsed:7.2f} análisis/s  p50 {statistics.median(latencies) * 1000:8.0f} ms  "
+          f"p95 {p95 * 1000:8.0f} ms")
+
+
+if __name__ == '__main__':
+    requests = int(sys.argv[2]) if len(sys.argv) > 2 else 12
+    concurrency = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+    if not llm_engine.enabled:
+        sys.exit(f"Modelo no disponible ({MODEL}): ejecuta benchmarks/make_test_model.py")
+
+    llm_engine.mode = 'rules'
+    result = async_bridge.run(agent_orchestrator.analyze_business_comprehensive(_business(-1)))
+    assert 'error' not in str(result['agent_insights']), 'los agentes fallaron en modo reglas'
+    _run('reglas', requests, concurrency, 1000)
+
+    llm_engine.mode = 'auto'
+    rss_before = _rss_mb()
+    started = time.perf_counter()
+    llm_engine.ensure_loaded()
+    print(f"Carga del modelo: {(time.perf_counter() - started) * 1000:.0f} ms, "
+          f"RSS +{_rss_mb() - rss_before:.1f} MB (pesos mmap: {os.path.getsize(MODEL) / 1e6:.1f} MB), "
+          f"{llm_engine.n_threads} hilos")
+
+    result = async_bridge.run(agent_orchestrator.analyze_business_comprehensive(_business(-2)))
+    print(f"Ejemplo (modelo de pesos aleatorios, texto sin sentido): {result['agent_insights']['market']['recommendations'][:2]}")
+
+    _run('LLM secuencial', max(1, requests // concurrency), 1, 2000)
+    _run(f'LLM {concurrency} concurrentes', requests, concurrency, 3000)
+    stats = llm_engine.stats()
+    print(f"Generaciones: {stats['completed']} ({stats['failed']} fallidas, {stats['rejected']} rechazadas), "
+          f"{stats['tokens_generated']} tokens")
+    print(f"Media por generación: espera en cola {stats['avg_queue_wait_ms']:.0f} ms, "
+          f"cómputo {stats['avg_compute_ms']:.0f} ms")
+    print(f"RSS final: {_rss_mb():.1f} MB")
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la caché persistente de generaciones (services.llm_completion_cache)
+con un modelo GGUF pequeño en CPU. Simula tráfico con prompts repetidos
+(demo, reintentos, mismas preguntas por tipo de negocio) y muestra la tasa de
+aciertos, la latencia con acierto frente a generar y el tiempo ahorrado.
+Comprueba además que el contenido sobrevive a un reinicio (sin cargar el
+modelo), que varios procesos comparten el fichero a la vez y que el fichero
+se mantiene dentro del tamaño máximo al desalojar.
+
+Genera antes el modelo de pruebas: python benchmarks/make_test_model.py
+
+Uso: python benchmarks/bench_llm_completion_cache.py [modelo.gguf] [peticiones]
+"""
+
+import os
+import sys
+import time
+import random
+import tempfile
+import statistics
+import multiprocessing
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from services.ai_agents import agent_orchestrator
+from services.llm_completion_cache import CompletionCache, completion_cache_key
+from services.llm_engine import LLMEngine
+
+BUSINESS_TYPES = ('saas', 'ecommerce', 'local', 'startup')
+INSTRUCTION = 'Enumera las acciones más importantes.'
+
+
+def _prompt(index: int) -> str:
+    agents = list(agent_orchestrator.agents.values())
+    data = {'business_type': BUSINESS_TYPES[index % len(BUSINESS_TYPES)], 'business_name': f'Negocio {index}',
+            'description': 'Plataforma de gestión de proyectos', 'challenges': 'Churn alto y poca conversión',
+            'goals': 'Crecer un 20% este año'}
+    return agents[index % len(agents)]._llm_prompt(data, INSTRUCTION)
+
+
+def _engine(model: str, db_path: str, max_mb: float = 64) -> LLMEngine:
+    return LLMEngine(model, n_threads=int(os.getenv('LLM_THREADS', '0')) or None, max_sequences=1,
+                     max_tokens=32, timeout=600, cache=CompletionCache(db_path, int(max_mb * 2 ** 20)))
+
+
+def _timed(engine: LLMEngine, prompts):
+    hits_before = engine.cache.hits
+    hit_times, miss_times = [], []
+    for prompt in prompts:
+        started = time.perf_counter()
+        engine.complete(prompt, temperature=0, stop=['\n\n'])
+        elapsed = time.perf_counter() - started
+        if engine.cache.hits > hits_before:
+            hit_times.append(elapsed)
+            hits_before = engine.cache.hits
+        else:
+            miss_times.append(elapsed)
+    return hit_times, miss_times
+
+
+def _reader(args) -> int:
+    """Proceso que lee las claves conocidas y escribe claves propias en el mismo fichero"""
+    db_path, keys, worker = args
+    cache = CompletionCache(db_path)
+    found = sum(cache.get(key) is not None for key in keys)
+    for i in range(200):
+        cache.set(f'worker-{worker}-{i}', 'bench', f'texto {worker} {i}' * 20, 1.0)
+    return found
+
+
+if __name__ == '__main__':
+    model = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(__file__), '..', 'data', 'models', 'tiny-main.gguf')
+    n = int(sys.argv[2]) if len(sys.argv) > 2 else 60
+    if not os.path.exists(model):
+        sys.exit(f"Modelo no disponible ({model}): ejecuta benchmarks/make_test_model.py")
+    workdir = tempfile.mkdtemp(prefix='llm-cache-')
+    db_path = os.path.join(workdir, 'llm_cache.sqlite3')
+
+    # Tráfico sesgado: 12 prompts distintos, los primeros mucho más frecuentes
+    rng = random.Random(3)
+    distinct = [_prompt(i) for i in range(12)]
+    traffic = rng.choices(distinct, weights=[1 / (rank + 1) for rank in range(len(distinct))], k=n)
+
+    engine = _engine(model, db_path)
+    engine.ensure_loaded()
+    started = time.perf_counter()
+    hit_times, miss_times = _timed(engine, traffic)
+    elapsed = time.perf_counter() - started
+    stats = engine.stats()['completion_cache']
+    engine.shutdown()
+    print(f"[{n} peticiones, {len(set(traffic))} prompts distintos]")
+    print(f"Aciertos {stats['hits']}/{stats['hits'] + stats['misses']} ({stats['hit_rate']:.0%}), "
+          f"tiempo ahorrado {stats['time_saved_ms'] / 1000:.1f} s de {elapsed + stats['time_saved_ms'] / 1000:.1f} s")
+    print(f"Latencia generando: {statistics.mean(miss_times) * 1000:8.1f} ms")
+    print(f"Latencia con acierto: {statistics.mean(hit_times) * 1000:6.2f} ms "
+          f"({statistics.mean(miss_times) / statistics.mean(hit_times):.0f}x)")
+    print(f"Fichero: {stats['entries']} entradas, {stats['size_mb']} MB de datos, {stats['file_mb']} MB en disco")
+
+    # Reinicio: un motor nuevo sobre el mismo fichero responde sin cargar el modelo
+    engine = _engine(model, db_path)
+    reference = CompletionCache(db_path).get(completion_cache_key(
+        engine.model_id, distinct[0],
+        dict(engine.sampling, max_tokens=32, temperature=0, stop=['\n\n'])))
+    started = time.perf_counter()
+    texts = [engine.complete(prompt, temperature=0, stop=['\n\n']) for prompt in set(traffic)]
+    stats = engine.stats()
+    print(f"Tras reiniciar: {stats['completion_cache']['hits']}/{len(texts)} aciertos en "
+          f"{(time.perf_counter() - started) * 1000:.1f} ms, modelo cargado: {stats['loaded']}, "
+          f"texto de ejemplo conservado: {reference is not None}")
+
+    # Varios procesos leyendo y escribiendo a la vez el mismo fichero
+    keys = [completion_cache_key(engine.model_id, prompt, dict(engine.sampling, max_tokens=32, temperature=0,
+                                                              stop=['\n\n'])) for prompt in set(traffic)]
+    started = time.perf_counter()
+    with multiprocessing.get_context('fork').Pool(4) as pool:
+        found = pool.map(_reader, [(db_path, keys, worker) for worker in range(4)])
+    shared = CompletionCache(db_path).stats()
+    print(f"4 procesos: aciertos {found} de {len(keys)} cada uno, 800 escrituras en "
+          f"{(time.perf_counter() - started) * 1000:.0f} ms, {shared['entries']} entradas, "
+          f"{shared['errors']} errores")
+
+    # Desalojo por tamaño: 5000 generaciones de ~1 KB en una caché de 1 MB
+    small = CompletionCache(os.path.join(workdir, 'small.sqlite3'), 2 ** 20)
+    for i in range(5000):
+        small.set(f'clave-{i}', 'bench', ' '.join(rng.choice(('ventas', 'clientes', 'churn', 'SEO', 'precio'))
+                                                  for _ in range(200)) + str(i), 100.0)
+    small_stats = small.stats()
+    print(f"Caché de {small_stats['max_mb']} MB tras 5000 inserciones: {small_stats['entries']} entradas, "
+          f"{small_stats['size_mb']} MB de datos, {small_stats['file_mb']} MB en disco, "
+          f"{small_stats['evictions']} desalojos, última clave presente: {small.get('clave-4999') is not None}, "
+          f"primera: {small.get('clave-0') is not None}")
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la caché de prefijos de prompt (services.llm_prefix_cache) con un
+modelo GGUF pequeño en CPU. Para cada agente y tipo de negocio mide el tiempo
+hasta el primer token con la caché fría (primera petición de la clave), con
+la caché caliente (otra empresa del mismo tipo) y sin caché. Con temperatura 0
+comprueba que el texto generado es el mismo con y sin caché, y con tráfico
+sesgado hacia algunos tipos de negocio compara la tasa de aciertos y el
+desalojo LRU con un presupuesto pequeño y con uno amplio.
+
+Genera antes el modelo de pruebas: python benchmarks/make_test_model.py
+
+Uso: python benchmarks/bench_llm_prefix_cache.py [modelo.gguf]
+"""
+
+import os
+import sys
+import time
+import random
+import statistics
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from services.ai_agents import agent_orchestrator
+from services.llm_engine import LLMEngine
+
+BUSINESS_TYPES = ('saas', 'ecommerce', 'local', 'startup')
+INSTRUCTION = 'Enumera las acciones más importantes.'
+
+
+def _requests(company: str):
+    for business_type in BUSINESS_TYPES:
+        for agent in agent_orchestrator.agents.values():
+            data = {'business_type': business_type, 'business_name': company,
+                    'description': f'Descripción de {company}', 'challenges': 'Churn alto y poca conversión',
+                    'goals': 'Crecer un 20% este año'}
+            yield (agent._llm_prompt(data, INSTRUCTION), agent._llm_prefix(business_type),
+                   f'{agent.name}:{business_type}')
+
+
+def _engine(model: str, prefix_cache_mb: float, n_ctx: int = 2048) -> LLMEngine:
+    engine = LLMEngine(model, n_ctx=n_ctx, n_threads=int(os.getenv('LLM_THREADS', '0')) or None, max_sequences=1,
+                       prefix_cache_mb=prefix_cache_mb, timeout=600)
+    engine.ensure_loaded()
+    return engine
+
+
+def _ttft(engine: LLMEngine, requests, use_prefix: bool = True):
+    """Latencia de una generación de un token (prefill + primer token) por petición, en serie"""
+    times = []
+    for prompt, prefix, key in requests:
+        started = time.perf_counter()
+        engine.complete(prompt, max_tokens=1, temperature=0,
+                        prefix=prefix if use_prefix else None, prefix_key=key if use_prefix else None)
+        times.append(time.perf_counter() - started)
+    return times
+
+
+def _texts(engine: LLMEngine, requests):
+    return [engine.complete(prompt, max_tokens=16, temperature=0, prefix=prefix, prefix_key=key)
+            for prompt, prefix, key in requests]
+
+
+if __name__ == '__main__':
+    model = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(__file__), '..', 'data', 'models', 'tiny-main.gguf')
+    if not os.path.exists(model):
+        sys.exit(f"Modelo no disponible ({model}): ejecuta benchmarks/make_test_model.py")
+    first, second, third = list(_requests('Acme')), list(_requests('Globex')), list(_requests('Initech'))
+
+    engine = _engine(model, 512)
+    scheduler = engine._scheduler
+    bytes_per_cell = scheduler.prefixes.bytes_per_cell
+    prompt_tokens = [len(scheduler.tokenize(prompt)) for prompt, _, _ in first]
+    prefix_tokens = [len(scheduler.tokenize(prefix)) for _, prefix, _ in first]
+    print(f"{len(first)} claves (agente, tipo de negocio): prompt medio {statistics.mean(prompt_tokens):.0f} tokens, "
+          f"prefijo medio {statistics.mean(prefix_tokens):.0f} tokens "
+          f"({statistics.mean(prefix_tokens) / statistics.mean(prompt_tokens):.0%})")
+
+    no_cache, cold, warm = [], [], []
+    for cold_request, warm_request in zip(first, second):
+        no_cache += _ttft(engine, [cold_request], use_prefix=False)
+        cold += _ttft(engine, [cold_request])
+        warm += _ttft(engine, [warm_request])
+    stats = engine.stats()['prefix_cache']
+    print(f"TTFT sin caché:       {statistics.mean(no_cache) * 1000:7.1f} ms")
+    print(f"TTFT caché fría:      {statistics.mean(cold) * 1000:7.1f} ms")
+    print(f"TTFT caché caliente:  {statistics.mean(warm) * 1000:7.1f} ms  "
+          f"({statistics.mean(no_cache) / statistics.mean(warm):.1f}x más rápido)")
+    print(f"Caché: {stats['entries']} prefijos, {stats['cells']} celdas, {stats['memory_mb']} MB "
+          f"(presupuesto {stats['budget_mb']} MB), aciertos {stats['hits']}/{stats['hits'] + stats['misses']}, "
+          f"{stats['tokens_reused']} tokens reutilizados")
+
+    cached_texts = _texts(engine, third)
+    engine.shutdown()
+    engine = _engine(model, 0)
+    plain_texts = _texts(engine, third)
+    engine.shutdown()
+    same = sum(a == b for a, b in zip(cached_texts, plain_texts))
+    print(f"Textos idénticos con y sin caché: {same}/{len(third)}")
+
+    # Tráfico sesgado: la mitad SaaS; cada petición es de otra empresa
+    rng = random.Random(7)
+    companies = [list(_requests(f'Empresa {i}')) for i in range(40)]
+    weights = [0.5, 0.3, 0.1, 0.1]
+    traffic = []
+    for requests in companies:
+        type_index = rng.choices(range(len(BUSINESS_TYPES)), weights)[0]
+        traffic.append(requests[type_index * 3 + rng.randrange(3)])
+    for label, prefixes, n_ctx in (('pequeño (~2 prefijos)', 2.5, 2048), ('amplio', 12, 8192)):
+        budget_mb = prefixes * statistics.mean(prefix_tokens) * bytes_per_cell / 2 ** 20
+        engine = _engine(model, budget_mb, n_ctx)
+        times = _ttft(engine, traffic)
+        stats = engine.stats()['prefix_cache']
+        engine.shutdown()
+        print(f"Presupuesto {label}, {stats['budget_mb']} MB: {stats['entries']} prefijos residentes, "
+              f"{stats['evictions']} desalojos, aciertos {stats['hits']}/{stats['hits'] + stats['misses']} "
+              f"({stats['hit_rate']:.0%}), TTFT medio {statistics.mean(times) * 1000:.0f} ms")
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Benchmark del planificador de batching continuo (services.llm_scheduler) con
+un modelo GGUF pequeño en CPU. Lanza peticiones concurrentes (prompts de
+agente, todos a la vez y con llegadas escalonadas, y prompts cortos con
+respuestas largas) con 1 secuencia activa (generación en serie) y con varias,
+y muestra tokens/s, latencia p50/p95, espera en cola frente a cómputo y
+tamaño medio de los batches. Con temperatura 0 comprueba que el texto
+generado no cambia al agrupar peticiones.
+
+Genera antes el modelo de pruebas: python benchmarks/make_test_model.py
+
+Uso: python benchmarks/bench_llm_scheduler.py [modelo.gguf] [peticiones] [max_tokens]
+"""
+
+import os
+import sys
+import time
+import statistics
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from services.ai_agents import agent_orchestrator
+from services.llm_engine import LLMEngine
+
+BUSINESS_TYPES = ('saas', 'ecommerce', 'local', 'startup')
+
+
+def _prompts(n: int):
+    agents = list(agent_orchestrator.agents.values())
+    prompts = []
+    for i in range(n):
+        data = {'business_type': BUSINESS_TYPES[i % len(BUSINESS_TYPES)], 'business_name': f'Negocio {i}',
+                'description': 'Plataforma de gestión de proyectos', 'challenges': 'Churn alto y poca conversión',
+                'goals': f'Crecer un {10 + i}% este año'}
+        prompts.append(agents[i % len(agents)]._llm_prompt(data, 'Enumera las acciones más importantes.'))
+    return prompts
+
+
+def _run(model: str, prompts, max_tokens: int, parallel: int, interval: float):
+    engine = LLMEngine(model, n_threads=int(os.getenv('LLM_THREADS', '0')) or None, max_sequences=parallel,
+                       max_queue=len(prompts), max_tokens=max_tokens, timeout=600)
+    engine.ensure_loaded()
+    latencies, outputs = [0.0] * len(prompts), [''] * len(prompts)
+
+    def request(index: int):
+        started = time.perf_counter()
+        outputs[index] = engine.complete(prompts[index], temperature=0, stop=['\n\n'])
+        latencies[index] = time.perf_counter() - started
+
+    threads = [threading.Thread(target=request, args=(i,)) for i in range(len(prompts))]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+        time.sleep(interval)
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    stats = engine.stats()
+    engine.shutdown()
+    return outputs, elapsed, sorted(latencies), stats
+
+
+if __name__ == '__main__':
+    model = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(__file__), '..', 'data', 'models', 'tiny-main.gguf')
+    n = int(sys.argv[2]) if len(sys.argv) > 2 else 12
+    max_tokens = int(sys.argv[3]) if len(sys.argv) > 3 else 48
+    if not os.path.exists(model):
+        sys.exit(f"Modelo no disponible ({model}): ejecuta benchmarks/make_test_model.py")
+    agent_prompts = _prompts(n)
+    short_prompts = [f'[INST] Idea de negocio {i}: [/INST]\n- ' for i in range(n)]
+    scenarios = (
+        ('prompts de agente, todas a la vez', agent_prompts, max_tokens, 0.0),
+        ('prompts de agente, una cada 150 ms', agent_prompts, max_tokens, 0.15),
+        ('prompts cortos, respuestas largas', short_prompts, max_tokens * 3, 0.0),
+    )
+
+    for label, prompts, budget, interval in scenarios:
+        print(f"\n[{n} peticiones, {label}, max_tokens={budget}]")
+        print(f"{'secuencias':>10s} {'tok/s':>8s} {'p50 ms':>8s} {'p95 ms':>8s} {'cola ms':>8s} "
+              f"{'cómputo ms':>11s} {'1er token ms':>13s} {'tokens/batch':>13s}")
+        reference = None
+        for parallel in (1, 2, 4, 8):
+            outputs, elapsed, latencies, stats = _run(model, prompts, budget, parallel, interval)
+            if reference is None:
+                reference = outputs
+            same = sum(a == b for a, b in zip(outputs, reference))
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            print(f"{parallel:10d} {stats['tokens_generated'] / elapsed:8.1f} {statistics.median(latencies) * 1000:8.0f} "
+                  f"{p95 * 1000:8.0f} {stats['avg_queue_wait_ms']:8.0f} {stats['avg_compute_ms']:11.0f} "
+                  f"{stats['avg_first_token_ms']:13.0f} {stats['avg_batch_tokens']:13.1f}"
+                  f"{'' if same == len(outputs) else f'  ({same}/{len(outputs)} textos iguales a la serie)'}")
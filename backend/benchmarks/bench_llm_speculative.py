@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la decodificación especulativa (services.llm_speculative) con
+los modelos GGUF de pruebas en CPU: genera respuestas de agente (prompts
+largos) y respuestas largas a prompts cortos con el modelo principal solo y
+emparejado con el borrador, con distintos tokens propuestos por paso y con
+una o varias secuencias en paralelo. Muestra tokens/s, tasa de
+aceptación, tokens aceptados por ronda y pasadas del modelo principal, y
+comprueba que con temperatura 0 el texto es idéntico con y sin borrador.
+Por último mide un análisis con el borrador sólo para algunos agentes
+(LLM_DRAFT_AGENTS).
+
+Genera antes los modelos de pruebas: python benchmarks/make_test_model.py
+(con más capas y dimensión, p. ej. 12 1024, el principal pesa más frente al
+borrador y la ganancia es mayor).
+
+Uso: python benchmarks/bench_llm_speculative.py [directorio de modelos] [peticiones] [max_tokens]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from services.ai_agents import agent_orchestrator
+from services.llm_engine import LLMEngine
+
+BUSINESS_TYPES = ('saas', 'ecommerce', 'local', 'startup')
+
+
+def _prompts(n: int):
+    agents = list(agent_orchestrator.agents.values())
+    prompts = []
+    for i in range(n):
+        data = {'business_type': BUSINESS_TYPES[i % len(BUSINESS_TYPES)], 'business_name': f'Negocio {i}',
+                'description': 'Plataforma de gestión de proyectos', 'challenges': 'Churn alto y poca conversión',
+                'goals': f'Crecer un {10 + i}% este año'}
+        prompts.append((agents[i % len(agents)], agents[i % len(agents)]._llm_prompt(data, 'Enumera las acciones más importantes.')))
+    return prompts
+
+
+def _run(model: str, draft: str, prompts, max_tokens: int, parallel: int, draft_tokens: int):
+    engine = LLMEngine(model, n_threads=int(os.getenv('LLM_THREADS', '0')) or None, max_sequences=parallel,
+                       max_tokens=max_tokens, timeout=600, draft_model_path=draft, draft_tokens=draft_tokens)
+    engine.ensure_loaded()
+    started = time.perf_counter()
+    futures = [(agent, engine.submit(prompt, temperature=0, speculative=agent.speculative)) for agent, prompt in prompts]
+    outputs = [future.result() for _, future in futures]
+    elapsed = time.perf_counter() - started
+    stats = engine.stats()
+    engine.shutdown()
+    return outputs, elapsed, stats
+
+
+if __name__ == '__main__':
+    directory = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(__file__), '..', 'data', 'models')
+    n = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    max_tokens = int(sys.argv[3]) if len(sys.argv) > 3 else 64
+    model, draft = os.path.join(directory, 'tiny-main.gguf'), os.path.join(directory, 'tiny-draft.gguf')
+    if not os.path.exists(model) or not os.path.exists(draft):
+        sys.exit(f"Modelos no disponibles en {directory}: ejecuta benchmarks/make_test_model.py")
+    print(f"Principal {os.path.getsize(model) / 1e6:.0f} MB, borrador {os.path.getsize(draft) / 1e6:.0f} MB, "
+          f"{n} peticiones, max_tokens={max_tokens}")
+    agent_prompts = _prompts(n)
+    market = agent_orchestrator.agents['market']
+    short_prompts = [(market, f'[INST] Idea de negocio {i}: [/INST]\n- ') for i in range(n)]
+    scenarios = (
+        ('prompts de agente', agent_prompts, max_tokens, 1),
+        ('prompts cortos, respuestas largas', short_prompts, max_tokens * 2, 1),
+        ('prompts cortos, respuestas largas', short_prompts, max_tokens * 2, n),
+    )
+
+    for label, prompts, budget, parallel in scenarios:
+        print(f"\n[{label}, max_tokens={budget}, {parallel} secuencias en paralelo]")
+        print(f"{'borrador':>12s} {'tok/s':>8s} {'aceptación':>11s} {'acept./ronda':>13s} {'pasadas':>8s} "
+              f"{'borrador ms':>12s}")
+        reference = None
+        for draft_tokens in (0, 2, 4):
+            outputs, elapsed, stats = _run(model, draft if draft_tokens else None, prompts, budget,
+                                           parallel, draft_tokens)
+            if reference is None:
+                reference = outputs
+            same = sum(a == b for a, b in zip(outputs, reference))
+            spec = stats['speculative'] or {}
+            label = f'{draft_tokens} tokens' if draft_tokens else 'sin borrador'
+            print(f"{label:>12s} {stats['tokens_generated'] / elapsed:8.1f} "
+                  f"{spec.get('acceptance_rate', 0.0):11.0%} {spec.get('avg_accepted_per_round', 0.0):13.2f} "
+                  f"{stats['decode_steps']:8d} {spec.get('draft_ms', 0.0):12.0f}"
+                  f"{'' if same == len(outputs) else f'  ({same}/{len(outputs)} textos iguales sin borrador)'}")
+
+    # Configuración por agente: borrador sólo para el agente de mercado
+    agents = agent_orchestrator.agents
+    for key, agent in agents.items():
+        agent.speculative = key == 'market'
+    outputs, elapsed, stats = _run(model, draft, agent_prompts, max_tokens, 1, 4)
+    spec = stats['speculative']
+    print(f"\nBorrador sólo para 'market' (LLM_DRAFT_AGENTS=market): {stats['tokens_generated'] / elapsed:.1f} tok/s, "
+          f"{spec['rounds']} rondas especulativas de {stats['decode_steps']} pasadas, "
+          f"aceptación {spec['acceptance_rate']:.0%}")
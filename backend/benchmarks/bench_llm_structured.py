@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la salida estructurada de los agentes (services.llm_structured)
+con un modelo GGUF pequeño en CPU. Pide a cada agente su objeto JSON
+(recomendación consolidada; el de crecimiento, también los KPIs) con la
+gramática derivada del esquema y sin ella, con el bucle de parseo y
+reintentos, y muestra cuántas salidas se parsean a la primera, reintentos,
+fallos, tokens desperdiciados en intentos no válidos y latencia por objeto
+válido.
+
+El modelo de pruebas tiene pesos aleatorios: sin gramática no llega a
+producir JSON, mientras que un modelo real acierta más a menudo. La columna
+relevante es la de la gramática, que debe tener cero reintentos.
+
+Genera antes el modelo de pruebas: python benchmarks/make_test_model.py
+
+Uso: python benchmarks/bench_llm_structured.py [modelo.gguf] [empresas] [reintentos]
+"""
+
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from services.ai_agents import GROWTH_PLAN_SCHEMA, agent_orchestrator
+from services.llm_engine import LLMEngine
+from services.llm_structured import max_chars, recommendation_schema, schema_template
+
+BUSINESS_TYPES = ('saas', 'ecommerce', 'local', 'startup')
+SCHEMAS = {
+    'market': ('Da la recomendación de mercado y posicionamiento competitivo más importante.',
+               recommendation_schema('Análisis de Mercado')),
+    'customer': ('Da la recomendación de experiencia del cliente más importante.',
+                 recommendation_schema('Experiencia del Cliente')),
+    'growth': ('Da la recomendación más importante para escalar el negocio y sus KPIs con valor actual y objetivo.',
+               GROWTH_PLAN_SCHEMA)
+}
+
+
+def _requests(companies: int):
+    for i in range(companies):
+        data = {'business_type': BUSINESS_TYPES[i % len(BUSINESS_TYPES)], 'business_name': f'Empresa {i}',
+                'description': 'Plataforma de gestión de proyectos', 'challenges': 'Churn alto y poca conversión',
+                'goals': 'Crecer un 20% este año'}
+        for key, (instruction, schema) in SCHEMAS.items():
+            agent = agent_orchestrator.agents[key]
+            prompt = agent._llm_prompt(data, f"{instruction} Responde sólo con JSON de esta forma: {schema_template(schema)}", '')
+            yield prompt, schema, agent._llm_prefix(data['business_type']), f"{agent.name}:{data['business_type']}"
+
+
+def _run(engine: LLMEngine, requests, constrained: bool, retries: int):
+    def generate(request):
+        prompt, schema, prefix, prefix_key = request
+        started = time.perf_counter()
+        try:
+            engine.complete_structured(prompt, schema, constrained=constrained, retries=retries,
+                                       prefix=prefix, prefix_key=prefix_key)
+        except ValueError:
+            return None
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=engine.max_sequences) as executor:
+        latencies = [latency for latency in executor.map(generate, requests) if latency is not None]
+    return latencies, time.perf_counter() - started
+
+
+if __name__ == '__main__':
+    model = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(__file__), '..', 'data', 'models', 'tiny-main.gguf')
+    companies = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    retries = int(sys.argv[3]) if len(sys.argv) > 3 else 2
+    if not os.path.exists(model):
+        sys.exit(f"Modelo no disponible ({model}): ejecuta benchmarks/make_test_model.py")
+    requests = list(_requests(companies))
+    max_tokens = int(os.getenv('LLM_MAX_TOKENS', '192'))
+    print(f"{len(requests)} objetos JSON ({companies} empresas x 3 agentes), hasta {retries} reintentos, "
+          f"presupuesto {max_chars(SCHEMAS['market'][1])}-{max_chars(GROWTH_PLAN_SCHEMA)} tokens "
+          f"(tope LLM_MAX_TOKENS={max_tokens})")
+    print(f"{'modo':>14s} {'a la 1ª':>8s} {'reintentos':>11s} {'fallos':>7s} {'tokens':>7s} "
+          f"{'desperdiciados':>15s} {'s/objeto válido':>16s} {'total s':>8s}")
+
+    for constrained in (True, False):
+        # Motor nuevo por modo y sin caché de generaciones: se mide siempre la generación
+        engine = LLMEngine(model, n_threads=int(os.getenv('LLM_THREADS', '0')) or None, max_sequences=4,
+                           n_ctx=4096, max_tokens=max_tokens, timeout=600)
+        engine.ensure_loaded()
+        latencies, elapsed = _run(engine, requests, constrained, retries)
+        stats = engine.stats()['structured']['constrained' if constrained else 'unconstrained']
+        engine.shutdown()
+        per_valid = f"{elapsed / len(latencies):16.1f}" if latencies else f"{'-':>16s}"
+        print(f"{'gramática' if constrained else 'sin gramática':>14s} "
+              f"{stats['parsed_first_try']:>4d}/{stats['requests']:<3d} {stats['retries']:11d} {stats['failures']:7d} "
+              f"{stats['tokens']:7d} {stats['wasted_tokens']:15d} {per_valid} {elapsed:8.1f}")
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark del motor de reglas (BusinessAnalysisAI._analyze_with_rules):
+bloques de memoria reservados y tiempo por análisis.
+
+Uso: python benchmarks/bench_rule_engine.py [iteraciones]
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from services.ai_service import ai_service
+
+SAMPLES = [
+    {'business_type': 'saas', 'business_name': 'Mi SaaS',
+     'challenges': 'Alto churn rate y poco tráfico seo', 'goals': 'Reducir churn y aumentar MRR'},
+    {'business_type': 'ecommerce', 'business_name': 'Tienda',
+     'challenges': 'pocas ventas y baja conversión', 'goals': 'más clientes'},
+    {'business_type': 'local', 'business_name': 'Café', 'challenges': '', 'goals': ''},
+    {'business_type': 'startup', 'business_name': 'Nova', 'challenges': 'validar producto', 'goals': 'crecimiento'},
+]
+
+
+def allocations_per_analysis(rounds: int = 200) -> float:
+    kept = []
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for _ in range(rounds):
+        for sample in SAMPLES:
+            kept.append(ai_service._analyze_with_rules(sample))
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, 'filename'))
+    return blocks / (rounds * len(SAMPLES))
+
+
+def time_per_analysis(iterations: int) -> float:
+    start = time.perf_counter()
+    for i in range(iterations):
+        ai_service._analyze_with_rules(SAMPLES[i % len(SAMPLES)])
+    return (time.perf_counter() - start) / iterations
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    print(f"Bloques retenidos por análisis: {allocations_per_analysis():8.1f}")
+    print(f"Tiempo por análisis           : {time_per_analysis(n) * 1e6:8.2f} µs")
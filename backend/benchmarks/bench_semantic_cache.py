@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la caché semántica de análisis (services.semantic_cache).
+Indexa unas entradas semilla (la de test_analysis.json y otras de distintos
+tipos de negocio) y consulta una muestra etiquetada: paráfrasis de una
+semilla, que deberían reutilizar su análisis, y negativos difíciles (misma
+descripción con otro desafío u otros objetivos, u otro tipo de negocio, nombre
+o usuario), que no. Para varios umbrales
+muestra precisión (aciertos que devuelven el análisis correcto) y recall
+(paráfrasis que aciertan), y después comprueba el límite de entradas, el
+desalojo LRU y el coste de codificar y buscar con el índice lleno.
+
+Necesita sentence-transformers y el modelo (SEMANTIC_CACHE_MODEL) descargado.
+Sirve para elegir SEMANTIC_CACHE_THRESHOLD antes de activar la caché.
+
+Uso: python benchmarks/bench_semantic_cache.py [tamaño del índice]
+"""
+
+import os
+import sys
+import json
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from services.semantic_cache import SentenceTransformer, SemanticCache, semantic_cache
+
+SCOPE = 'usuario-1'
+THRESHOLDS = (0.80, 0.85, 0.88, 0.90, 0.92, 0.94, 0.96)
+
+
+def _seeds():
+    with open(os.path.join(os.path.dirname(__file__), '..', '..', 'test_analysis.json'), encoding='utf-8') as f:
+        sample = json.load(f)
+    saas = {'business_type': sample['business_type'], 'business_name': sample['business_name'],
+            'description': sample['description'], 'challenges': sample['current_challenges'],
+            'goals': sample['goals']}
+    return {
+        'saas': saas,
+        'ecommerce': {'business_type': 'ecommerce', 'business_name': 'Moda Online',
+                      'description': 'Tienda online de ropa sostenible',
+                      'challenges': 'Carritos abandonados y baja conversión',
+                      'goals': 'Aumentar la tasa de conversión'},
+        'local': {'business_type': 'local', 'business_name': 'Café Central',
+                  'description': 'Cafetería de especialidad en el centro',
+                  'challenges': 'Pocos clientes entre semana', 'goals': 'Fidelizar clientes habituales'},
+        'startup': {'business_type': 'startup', 'business_name': 'FinBot',
+                    'description': 'App de finanzas personales con IA',
+                    'challenges': 'Poca tracción inicial', 'goals': 'Conseguir los primeros 1000 usuarios'}
+    }
+
+
+def _sample(seeds):
+    """(entrada, ámbito, semilla esperada o None) de la muestra etiquetada"""
+    def variant(seed, **fields):
+        return dict(seeds[seed], **fields)
+
+    positives = [
+        (variant('saas', description='Plataforma para gestionar proyectos'), SCOPE, 'saas'),
+        (variant('saas', description='Software de gestión de proyectos', challenges='Churn alto'), SCOPE, 'saas'),
+        (variant('saas', challenges='Tasa de churn elevada', goals='Reducir el churn y subir el MRR'), SCOPE, 'saas'),
+        (variant('saas', description='  PLATAFORMA de gestión de proyectos ', goals='Reducir churn y aumentar el MRR'), SCOPE, 'saas'),
+        (variant('ecommerce', description='Tienda online de moda sostenible'), SCOPE, 'ecommerce'),
+        (variant('ecommerce', challenges='Muchos carritos abandonados y poca conversión'), SCOPE, 'ecommerce'),
+        (variant('local', description='Cafetería de especialidad en el centro de la ciudad'), SCOPE, 'local'),
+        (variant('local', challenges='Poca clientela entre semana', goals='Fidelizar a los clientes habituales'), SCOPE, 'local'),
+        (variant('startup', description='Aplicación de finanzas personales con inteligencia artificial'), SCOPE, 'startup'),
+        (variant('startup', goals='Llegar a los primeros 1000 usuarios'), SCOPE, 'startup'),
+    ]
+    negatives = [
+        (variant('saas', challenges='Pocos leads cualificados'), SCOPE, None),
+        (variant('saas', goals='Expandirse a Latinoamérica'), SCOPE, None),
+        (variant('saas', description='Plataforma de facturación electrónica'), SCOPE, None),
+        (variant('saas', challenges='Ciclo de venta muy largo', goals='Cerrar más clientes enterprise'), SCOPE, None),
+        (variant('ecommerce', challenges='Costes de envío demasiado altos'), SCOPE, None),
+        (variant('ecommerce', description='Tienda online de electrónica de consumo'), SCOPE, None),
+        (variant('local', goals='Abrir un segundo local'), SCOPE, None),
+        (variant('local', description='Panadería artesanal de barrio'), SCOPE, None),
+        (variant('startup', challenges='Falta de financiación', goals='Cerrar una ronda seed'), SCOPE, None),
+        (variant('startup', description='App de recetas de cocina con IA'), SCOPE, None),
+        # Misma entrada con otro tipo de negocio, otro nombre u otro usuario: nunca se reutiliza
+        (dict(seeds['saas'], business_type='startup'), SCOPE, None),
+        (dict(seeds['saas'], business_name='Otro SaaS'), SCOPE, None),
+        (seeds['saas'], 'usuario-2', None),
+    ]
+    return positives + negatives
+
+
+def _evaluate(cache, sample):
+    """(similitud, semilla devuelta, semilla esperada) de cada consulta con umbral 0"""
+    threshold, cache.threshold = cache.threshold, -1.0
+    outcomes = []
+    for data, scope, expected in sample:
+        match = cache.lookup(data, scope)
+        if match is None:
+            outcomes.append((-1.0, None, expected))
+        else:
+            outcomes.append((match['similarity'], match['result']['seed'], expected))
+    cache.threshold = threshold
+    return outcomes
+
+
+if __name__ == '__main__':
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+    if SentenceTransformer is None:
+        sys.exit("sentence-transformers no está instalado: pip install -r requirements.txt")
+    seeds = _seeds()
+    sample = _sample(seeds)
+    cache = SemanticCache(semantic_cache.model_name, max_entries=size)
+    started = time.perf_counter()
+    for key, data in seeds.items():
+        cache.set(data, {'seed': key, 'business_name': data['business_name']}, SCOPE)
+    print(f"Modelo {cache.model_name}: carga y {len(seeds)} semillas en {time.perf_counter() - started:.1f} s")
+
+    outcomes = _evaluate(cache, sample)
+    positives = sum(expected is not None for _, _, expected in outcomes)
+    print(f"\nMuestra: {positives} paráfrasis, {len(outcomes) - positives} negativos difíciles")
+    print(f"{'umbral':>7s} {'aciertos':>9s} {'correctos':>10s} {'precisión':>10s} {'recall':>7s}")
+    for threshold in THRESHOLDS:
+        hits = [(found, expected) for similarity, found, expected in outcomes if similarity >= threshold]
+        correct = sum(found == expected for found, expected in hits)
+        precision = correct / len(hits) if hits else 1.0
+        print(f"{threshold:7.2f} {len(hits):9d} {correct:10d} {precision:10.0%} {correct / positives:7.0%}"
+              f"{'  <- SEMANTIC_CACHE_THRESHOLD' if threshold == semantic_cache.threshold else ''}")
+    print("\nSimilitud de cada consulta con su vecino más cercano:")
+    for (data, _, _), (similarity, found, expected) in zip(sample, outcomes):
+        label = 'paráfrasis' if expected else 'negativo'
+        print(f"  {similarity:6.3f} {label:>10s} -> {found or '-':9s} {data['description'][:40]} | "
+              f"{data['challenges'][:30]} | {data['goals'][:30]}")
+
+    # Límite de entradas y desalojo: se llena el índice con entradas distintas
+    started = time.perf_counter()
+    for i in range(size + len(seeds)):
+        cache.set({'business_type': 'saas', 'description': f'Producto {i} de gestión de proyectos',
+                   'challenges': f'Desafío número {i}', 'goals': f'Objetivo {i}'}, {'seed': None}, SCOPE)
+    fill = time.perf_counter() - started
+    stats = cache.stats()
+    started = time.perf_counter()
+    for data, scope, _ in sample:
+        cache.lookup(data, scope)
+    lookup = (time.perf_counter() - started) / len(sample)
+    print(f"\nÍndice de {size} entradas: {stats['entries']} entradas tras {size + len(seeds) * 2} inserciones, "
+          f"{stats['evictions']} desalojos; {fill / (size + len(seeds)) * 1000:.1f} ms por inserción, "
+          f"{lookup * 1000:.1f} ms por consulta (codificar {stats['avg_encode_ms']:.1f} ms)")
+    print(f"Semillas desalojadas (LRU): {sum(cache.lookup(data, SCOPE) is None for data in seeds.values())}/{len(seeds)}")
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Genera modelos GGUF diminutos (arquitectura llama, pesos aleatorios) para
+probar y medir en CPU el modo LLM de los agentes sin descargar un modelo real.
+Escribe un modelo principal y un modelo draft que comparte embeddings, salida
+y las primeras capas; las capas extra del principal aportan poco al residual,
+así que el draft predice casi siempre el mismo token (útil para medir la
+decodificación especulativa). El texto generado no tiene sentido: sólo sirve
+para medir rendimiento y comprobar la mecánica (batching, caché KV,
+gramáticas...).
+
+Requiere numpy y gguf (pip install numpy gguf).
+
+Uso: python benchmarks/make_test_model.py [directorio] [capas] [dimensión]
+"""
+
+import os
+import sys
+
+import numpy as np
+import gguf
+
+WORDS = (
+    'de la que el en los se del las un por con no una su para es al lo como más pero sus le ya '
+    'negocio cliente clientes mercado crecimiento ventas estrategia análisis marketing producto '
+    'conversión retención churn canal canales digital online precio valor equipo datos métricas '
+    'mejorar optimizar implementar aumentar reducir crear desarrollar programa sistema plan '
+    'the and of to in for with on is are your customers growth market sales'
+).split()
+CHARS = (
+    "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+    "áéíóúñüÁÉÍÓÚÑ.,;:!?¿¡-_'\"()[]{}<>/\\|@#$%&*+=~`^\n\t"
+)
+
+
+def _vocab():
+    tokens, scores, types = ['<unk>', '<s>', '</s>'], [0.0, 0.0, 0.0], [
+        gguf.TokenType.UNKNOWN, gguf.TokenType.CONTROL, gguf.TokenType.CONTROL]
+    for byte in range(256):
+        tokens.append(f'<0x{byte:02X}>')
+        scores.append(0.0)
+        types.append(gguf.TokenType.BYTE)
+    pieces = ['▁'] + list(CHARS) + [f'▁{c}' for c in CHARS if c.isalnum()]
+    # Prefijos de cada palabra: la tokenización SPM fusiona pares adyacentes paso a paso
+    for word in WORDS:
+        pieces += [f'▁{word}'[:end] for end in range(2, len(word) + 2)]
+    seen = set()
+    for piece in pieces:
+        if piece in seen:
+            continue
+        seen.add(piece)
+        tokens.append(piece)
+        scores.append(-1000.0 + 10.0 * len(piece))  # las piezas largas se fusionan antes
+        types.append(gguf.TokenType.NORMAL)
+    return tokens, scores, types
+
+
+def _write(path, tokens, scores, types, n_embd, n_ff, n_head, layers, shared, residual_scale):
+    writer = gguf.GGUFWriter(path, 'llama')
+    writer.add_name(os.path.splitext(os.path.basename(path))[0])
+    writer.add_context_length(2048)
+    writer.add_embedding_length(n_embd)
+    writer.add_block_count(len(layers))
+    writer.add_feed_forward_length(n_ff)
+    writer.add_rope_dimension_count(n_embd // n_head)
+    writer.add_head_count(n_head)
+    writer.add_head_count_kv(n_head)
+    writer.add_layer_norm_rms_eps(1e-5)
+    writer.add_file_type(gguf.GGMLQuantizationType.F16)
+    writer.add_tokenizer_model('llama')
+    writer.add_token_list(tokens)
+    writer.add_token_scores(scores)
+    writer.add_token_types(types)
+    writer.add_bos_token_id(1)
+    writer.add_eos_token_id(2)
+    writer.add_unk_token_id(0)
+
+    for name, value in shared.items():
+        writer.add_tensor(name, value)
+    for index, layer in enumerate(layers):
+        scale = 1.0 if index < residual_scale[0] else residual_scale[1]
+        for name, value in layer.items():
+            if name in ('attn_output.weight', 'ffn_down.weight'):
+                value = (value.astype(np.float32) * scale).astype(np.float16)
+            writer.add_tensor(f'blk.{index}.{name}', value)
+
+    writer.write_header_to_file()
+    writer.write_kv_data_to_file()
+    writer.write_tensors_to_file()
+    writer.close()
+
+
+def main(directory: str, n_layers: int, n_embd: int, draft_layers: int = 1) -> None:
+    os.makedirs(directory, exist_ok=True)
+    rng = np.random.default_rng(1234)
+    tokens, scores, types = _vocab()
+    n_vocab, n_head, n_ff = len(tokens), max(1, n_embd // 64), int(n_embd * 8 / 3) // 32 * 32
+
+    def weight(*shape, std=0.02):
+        return (rng.standard_normal(shape, dtype=np.float32) * std).astype(np.float16)
+
+    shared = {
+        'token_embd.weight': weight(n_vocab, n_embd, std=1.0),
+        'output_norm.weight': np.ones(n_embd, dtype=np.float32),
+        'output.weight': weight(n_vocab, n_embd, std=0.5),
+    }
+    layers = [{
+        'attn_norm.weight': np.ones(n_embd, dtype=np.float32),
+        'attn_q.weight': weight(n_embd, n_embd),
+        'attn_k.weight': weight(n_embd, n_embd),
+        'attn_v.weight': weight(n_embd, n_embd),
+        'attn_output.weight': weight(n_embd, n_embd),
+        'ffn_norm.weight': np.ones(n_embd, dtype=np.float32),
+        'ffn_gate.weight': weight(n_ff, n_embd),
+        'ffn_up.weight': weight(n_ff, n_embd),
+        'ffn_down.weight': weight(n_embd, n_ff),
+    } for _ in range(n_layers)]
+
+    main_path = os.path.join(directory, 'tiny-main.gguf')
+    draft_path = os.path.join(directory, 'tiny-draft.gguf')
+    _write(main_path, tokens, scores, types, n_embd, n_ff, n_head, layers, shared, (draft_layers, 0.05))
+    _write(draft_path, tokens, scores, types, n_embd, n_ff, n_head, layers[:draft_layers], shared, (draft_layers, 0.05))
+    for path in (main_path, draft_path):
+        print(f"{path}: {os.path.getsize(path) / 1e6:.1f} MB")
+
+
+if __name__ == '__main__':
+    main(
+        sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(__file__), '..', 'data', 'models'),
+        int(sys.argv[2]) if len(sys.argv) > 2 else 8,
+        int(sys.argv[3]) if len(sys.argv) > 3 else 512
+    )
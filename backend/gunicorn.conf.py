@@ -0,0 +1,82 @@
+# gunicorn.conf.py (Configuración del servidor de producción)
+import os
+import importlib.util
+
+from dotenv import load_dotenv
+
+# Las mismas variables que verá la app (LLM_MODE, LLAMA_MODEL_PATH...)
+load_dotenv()
+
+
+def _available_cores() -> int:
+    """Núcleos realmente disponibles para el proceso (respeta cpusets de contenedor)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def _llm_active() -> bool:
+    """True si los agentes usarán el modelo LLM local (mismo criterio que llm_engine.enabled)"""
+    if os.getenv('LLM_MODE', 'auto') == 'rules':
+        return False
+    return (importlib.util.find_spec('llama_cpp') is not None
+            and os.path.exists(os.getenv('LLAMA_MODEL_PATH', './models/llama-2-7b-chat.gguf')))
+
+
+cores = _available_cores()
+llm_active = _llm_active()
+
+bind = os.getenv('BIND', '0.0.0.0:5000')
+# Sin LLM los workers son baratos: 2*núcleos+1. Con LLM cada worker carga su propio contexto y
+# caché KV (sólo los pesos mmap se comparten) y la inferencia usa todos los núcleos que le toquen:
+# por defecto 1 worker (2 con 4 núcleos o más) y LLM_THREADS = núcleos / workers. Más workers
+# multiplican la RAM de contextos y dejan a cada modelo con menos hilos; la concurrencia de E/S
+# la dan los hilos de gthread y el batching continuo del modelo (LLM_PARALLEL).
+default_workers = max(1, min(2, cores // 2)) if llm_active else cores * 2 + 1
+workers = int(os.getenv('WEB_CONCURRENCY', str(default_workers)))
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', str(max(2, min(8, cores * 2)))))
+
+# Repartir los núcleos entre los modelos de los workers
+os.environ.setdefault('LLM_THREADS', str(max(1, cores // workers)))
+
+# Importar la app y los servicios de IA antes del fork (copy-on-write)
+preload_app = True
+
+# Apagado ordenado: los workers terminan las peticiones en curso
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))
+
+# Reciclar workers periódicamente para acotar el crecimiento de memoria
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '2000'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', '200'))
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.getenv('LOG_LEVEL', 'info')
+
+
+def post_fork(server, worker):
+    """Arrancar los workers de la cola de trabajos en cada proceso hijo"""
+    from services.job_queue import job_queue
+
+    job_queue.ensure_started()
+
+
+def worker_exit(server, worker):
+    """Vaciar los análisis pendientes y liberar colas, pools, modelo LLM, event loop y conexiones a Supabase al salir"""
+    from services.job_queue import job_queue
+    from services.worker_pool import agent_pool
+    from services.async_bridge import async_bridge
+    from services.supabase_client import supabase_factory
+    from services.analysis_writer import analysis_writer
+    from services.llm_engine import llm_engine
+
+    analysis_writer.shutdown()
+    job_queue.shutdown()
+    agent_pool.shutdown(wait=True)
+    llm_engine.shutdown()
+    async_bridge.shutdown()
+    supabase_factory.close()
@@ -3,12 +3,19 @@ Sistema de Agentes de IA Especializados para Anclora Cortex
 Cada agente se especializa en un aspecto específico del análisis de negocio
 """
 
+import os
 import json
 import requests
-from typing import Dict, List, Any, Optional
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 from datetime import datetime
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
+
+from services.worker_pool import BoundedWorkerPool, agent_pool
+from services.analysis_cache import AnalysisCache, analysis_cache
+from services.semantic_cache import SemanticCache, semantic_cache
+from services.keyword_matcher import keyword_matcher
+from services.llm_engine import LLMUnavailableError, llm_engine
+from services.llm_structured import kpis_schema, recommendation_schema, schema_template
 
 class BaseAgent:
     """Clase base para todos los agentes de IA"""
@@ -17,11 +24,61 @@ class BaseAgent:
         self.name = name
         self.specialization = specialization
         self.created_at = datetime.now()
+        # Decodificación especulativa con el modelo borrador (LLM_DRAFT_AGENTS)
+        self.speculative = True
     
-    def analyze(self, data: Dict[str, Any]) -> Dict[str, Any]:
+    def analyze(self, data: Dict[str, Any], use_llm: bool = True) -> Dict[str, Any]:
         """Método base para análisis - debe ser implementado por cada agente"""
         raise NotImplementedError("Each agent must implement its own analyze method")
     
+    def _llm_context(self, business_type: str) -> List[str]:
+        """Conocimiento del sector que el agente incluye en el prompt (por tipo de negocio)"""
+        return []
+    
+    def _llm_prefix(self, business_type: str) -> str:
+        """Inicio del prompt común a todas las peticiones del agente para un tipo de negocio"""
+        context = ''.join(f"- {line}\n" for line in self._llm_context(business_type))
+        return (
+            f"[INST] <<SYS>>\nEres {self.name}, consultor experto en {self.specialization.lower()}. "
+            "Responde en español con acciones concretas.\n<</SYS>>\n\n"
+            f"Tipo de negocio: {business_type}\n"
+            + (f"Contexto del sector:\n{context}" if context else '')
+            + "\n"
+        )
+    
+    def _llm_prompt(self, data: Dict[str, Any], instruction: str, answer: str = '- ') -> str:
+        """Prompt de chat llama-2: prefijo del agente primero y datos del negocio después"""
+        return (
+            self._llm_prefix(data.get('business_type', ''))
+            + f"Nombre: {data.get('business_name', '')}\n"
+            f"Descripción: {data.get('description', '')}\n"
+            f"Desafíos: {data.get('challenges', '')}\n"
+            f"Objetivos: {data.get('goals', '')}\n\n"
+            f"{instruction} [/INST]\n{answer}"
+        )
+    
+    def _llm_structured(self, data: Dict[str, Any], instruction: str, schema: Dict[str, Any]) -> Optional[Any]:
+        """JSON con la forma de schema generado con el modelo local; None si no está disponible o falla
+        (con LLM_MODE=llm el error se propaga en lugar de usar las reglas)"""
+        if not llm_engine.enabled:
+            if llm_engine.required:
+                raise LLMUnavailableError(f'Modelo LLM no disponible: {llm_engine.model_path}')
+            return None
+        try:
+            business_type = data.get('business_type', '')
+            # El prefijo (instrucciones + contexto del sector) se evalúa una vez por agente y tipo de negocio;
+            # la gramática derivada del esquema garantiza un JSON válido a la primera
+            return llm_engine.complete_structured(
+                self._llm_prompt(data, f"{instruction} Responde sólo con JSON de esta forma: {schema_template(schema)}", ''),
+                schema, prefix=self._llm_prefix(business_type), prefix_key=f"{self.name}:{business_type}",
+                speculative=self.speculative
+            )
+        except Exception as e:
+            if llm_engine.required:
+                raise
+            print(f"LLM no disponible para {self.name}, usando reglas: {str(e) or type(e).__name__}")
+            return None
+    
     def get_info(self) -> Dict[str, str]:
         """Información del agente"""
         return {
@@ -36,7 +93,7 @@ class MarketAnalysisAgent(BaseAgent):
     def __init__(self):
         super().__init__("Market Analyzer", "Análisis de mercado y competencia")
     
-    def analyze(self, data: Dict[str, Any]) -> Dict[str, Any]:
+    def analyze(self, data: Dict[str, Any], use_llm: bool = True) -> Dict[str, Any]:
         """Analizar mercado y competencia"""
         business_type = data.get('business_type', '')
         description = data.get('description', '')
@@ -51,13 +108,34 @@ class MarketAnalysisAgent(BaseAgent):
         # Análisis de website si está disponible
         website_analysis = self._analyze_website(website) if website else {}
         
-        return {
+        recommendations = self._generate_market_recommendations(business_type, competitive_analysis)
+        result = {
             "agent": self.name,
             "market_insights": market_insights,
             "competitive_analysis": competitive_analysis,
             "website_analysis": website_analysis,
-            "recommendations": self._generate_market_recommendations(business_type, competitive_analysis)
+            "recommendations": recommendations
         }
+        if use_llm:
+            recommendation = self._llm_structured(
+                data, 'Da la recomendación de mercado y posicionamiento competitivo más importante.',
+                recommendation_schema('Análisis de Mercado')
+            )
+            if recommendation:
+                result['recommendations'] = recommendation['actions']
+                result['recommendation'] = recommendation
+        
+        return result
+    
+    def _llm_context(self, business_type: str) -> List[str]:
+        insights = self._get_market_insights(business_type)
+        competition = self._analyze_competition(business_type, '')
+        return [
+            f"Tamaño de mercado: {insights['market_size']}, crecimiento {insights['growth_rate']}",
+            f"Tendencias: {', '.join(insights['key_trends'])}",
+            f"Retos del sector: {', '.join(insights['challenges'])}",
+            f"Nivel de competencia: {competition.get('competition_level', 'Media')}"
+        ]
     
     def _get_market_insights(self, business_type: str) -> Dict[str, Any]:
         """Obtener insights del mercado"""
@@ -216,7 +294,7 @@ class CustomerAnalysisAgent(BaseAgent):
     def __init__(self):
         super().__init__("Customer Analyzer", "Análisis de clientes y experiencia")
     
-    def analyze(self, data: Dict[str, Any]) -> Dict[str, Any]:
+    def analyze(self, data: Dict[str, Any], use_llm: bool = True) -> Dict[str, Any]:
         """Analizar aspectos relacionados con clientes"""
         business_type = data.get('business_type', '')
         challenges = data.get('challenges', '')
@@ -230,14 +308,31 @@ class CustomerAnalysisAgent(BaseAgent):
         
         # Recomendaciones de CX
         cx_recommendations = self._generate_cx_recommendations(business_type, pain_points)
-        
-        return {
+        result = {
             "agent": self.name,
             "customer_journey": customer_journey,
             "pain_points": pain_points,
             "cx_recommendations": cx_recommendations,
             "retention_strategies": self._get_retention_strategies(business_type)
         }
+        if use_llm:
+            recommendation = self._llm_structured(
+                data, 'Da la recomendación de experiencia del cliente más importante.',
+                recommendation_schema('Experiencia del Cliente')
+            )
+            if recommendation:
+                result['cx_recommendations'] = recommendation['actions']
+                result['recommendation'] = recommendation
+        
+        return result
+    
+    def _llm_context(self, business_type: str) -> List[str]:
+        journey = self._analyze_customer_journey(business_type)
+        context = [f"Etapas del customer journey: {', '.join(journey['stages'])}"]
+        if journey.get('critical_moments'):
+            context.append(f"Momentos críticos: {', '.join(journey['critical_moments'])}")
+        context.append(f"Estrategias de retención habituales: {', '.join(self._get_retention_strategies(business_type))}")
+        return context
     
     def _analyze_customer_journey(self, business_type: str) -> Dict[str, Any]:
         """Analizar customer journey típico"""
@@ -286,7 +381,7 @@ class CustomerAnalysisAgent(BaseAgent):
     def _identify_pain_points(self, challenges: str) -> List[str]:
         """Identificar pain points del cliente basado en desafíos"""
         pain_points = []
-        challenges_lower = challenges.lower()
+        found_keywords = set(keyword_matcher.find(challenges, 'pain_points'))
         
         pain_point_mapping = {
             'churn': 'Clientes cancelan el servicio',
@@ -300,7 +395,7 @@ class CustomerAnalysisAgent(BaseAgent):
         }
         
         for keyword, pain_point in pain_point_mapping.items():
-            if keyword in challenges_lower:
+            if keyword in found_keywords:
                 pain_points.append(pain_point)
         
         return pain_points if pain_points else ['Pain points requieren análisis específico']
@@ -364,13 +459,22 @@ class CustomerAnalysisAgent(BaseAgent):
             'Programa de referidos'
         ])
 
+# Salida estructurada del agente de crecimiento: recomendación consolidada y KPIs
+GROWTH_PLAN_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'recommendation': recommendation_schema('Estrategia de Crecimiento'),
+        'kpis': kpis_schema()
+    }
+}
+
 class GrowthStrategyAgent(BaseAgent):
     """Agente especializado en estrategias de crecimiento"""
     
     def __init__(self):
         super().__init__("Growth Strategist", "Estrategias de crecimiento y escalabilidad")
     
-    def analyze(self, data: Dict[str, Any]) -> Dict[str, Any]:
+    def analyze(self, data: Dict[str, Any], use_llm: bool = True) -> Dict[str, Any]:
         """Analizar oportunidades de crecimiento"""
         business_type = data.get('business_type', '')
         goals = data.get('goals', '')
@@ -385,20 +489,44 @@ class GrowthStrategyAgent(BaseAgent):
         # Métricas de crecimiento
         growth_metrics = self._define_growth_metrics(business_type)
         
-        return {
+        # Recomendaciones para escalar
+        scaling_recommendations = self._get_scaling_recommendations(business_type)
+        result = {
             "agent": self.name,
             "current_stage": current_stage,
             "growth_strategies": growth_strategies,
             "acquisition_channels": acquisition_channels,
             "growth_metrics": growth_metrics,
-            "scaling_recommendations": self._get_scaling_recommendations(business_type)
+            "scaling_recommendations": scaling_recommendations
         }
+        if use_llm:
+            # Recomendación de crecimiento y KPIs consolidados en una sola generación
+            plan = self._llm_structured(
+                data, 'Da la recomendación más importante para escalar el negocio y sus KPIs con valor actual y objetivo.',
+                GROWTH_PLAN_SCHEMA
+            )
+            if plan:
+                result['scaling_recommendations'] = plan['recommendation']['actions']
+                result['recommendation'] = plan['recommendation']
+                result['kpis'] = plan['kpis']
+        
+        return result
+    
+    def _llm_context(self, business_type: str) -> List[str]:
+        strategies = self._get_growth_strategies(business_type, '')
+        channels = self._recommend_acquisition_channels(business_type)
+        metrics = self._define_growth_metrics(business_type)
+        return [
+            "Estrategias de crecimiento: " + '; '.join(f"{s['strategy']} ({s['description']})" for s in strategies),
+            "Canales de adquisición: " + ', '.join(c['channel'] for c in channels),
+            "Métricas clave: " + ', '.join(f"{m['metric']} ({m['target']})" for m in metrics)
+        ]
     
     def _determine_business_stage(self, data: Dict[str, Any]) -> str:
         """Determinar etapa del negocio"""
         # Lógica simplificada para determinar etapa
-        description = data.get('description', '').lower()
-        challenges = data.get('challenges', '').lower()
+        description = keyword_matcher.find(data.get('description', ''), 'business_stage')
+        challenges = keyword_matcher.find(data.get('challenges', ''), 'business_stage')
         
         if 'mvp' in description or 'validar' in challenges:
             return 'MVP/Validation'
@@ -529,38 +657,104 @@ class GrowthStrategyAgent(BaseAgent):
 class AIAgentOrchestrator:
     """Orquestador que coordina todos los agentes de IA"""
     
-    def __init__(self):
+    def __init__(self, pool: Optional[BoundedWorkerPool] = None, agent_timeout: Optional[float] = None,
+                 cache: Optional[AnalysisCache] = None, semantic: Optional[SemanticCache] = None):
         self.agents = {
             'market': MarketAnalysisAgent(),
             'customer': CustomerAnalysisAgent(),
             'growth': GrowthStrategyAgent()
         }
+        draft_agents = os.getenv('LLM_DRAFT_AGENTS', ','.join(self.agents)).split(',')
+        for key, agent in self.agents.items():
+            agent.speculative = key in draft_agents
+        self.pool = pool or agent_pool
+        self.agent_timeout = agent_timeout if agent_timeout is not None else float(os.getenv('AGENT_TIMEOUT', '30'))
+        self.cache = cache or analysis_cache
+        self.semantic = semantic or semantic_cache
     
-    async def analyze_business_comprehensive(self, business_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Análisis comprehensivo usando todos los agentes"""
-        
-        # Ejecutar análisis de todos los agentes en paralelo
-        with ThreadPoolExecutor(max_workers=3) as executor:
-            futures = {
-                agent_name: executor.submit(agent.analyze, business_data)
-                for agent_name, agent in self.agents.items()
+    async def _run_agent(self, agent_name: str, business_data: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+        """Ejecutar un agente en el pool compartido (los fallos se devuelven como resultado)"""
+        try:
+            result = await self.pool.run(self.agents[agent_name].analyze, business_data, timeout=self.agent_timeout)
+        except Exception as e:
+            result = {
+                "agent": self.agents[agent_name].name,
+                "error": f"Analysis failed: {str(e) or type(e).__name__}"
             }
-            
-            results = {}
-            for agent_name, future in futures.items():
-                try:
-                    results[agent_name] = future.result(timeout=30)
-                except Exception as e:
-                    results[agent_name] = {
-                        "agent": self.agents[agent_name].name,
-                        "error": f"Analysis failed: {str(e)}"
-                    }
-        
-        # Consolidar resultados
+        return agent_name, result
+    
+    def _use_semantic(self, scope: Optional[str]) -> bool:
+        # Sólo dentro de un ámbito (el usuario): el texto del LLM puede citar datos del negocio.
+        # Con las reglas el análisis cuesta menos que calcular el embedding
+        return scope is not None and self.semantic.enabled and llm_engine.enabled
+    
+    async def _cached(self, business_data: Dict[str, Any], scope: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Análisis de la misma entrada o, si no lo hay, de una casi idéntica del mismo ámbito"""
+        cached = self.cache.get(business_data, namespace='orchestrator')
+        if cached is None and self._use_semantic(scope):
+            # El embedding se calcula en el pool para no bloquear el event loop
+            cached = await self.pool.run(self.semantic.get, business_data, scope, namespace='orchestrator')
+        return cached
+    
+    async def _finalize(self, results: Dict[str, Any], business_data: Dict[str, Any],
+                        scope: Optional[str] = None) -> Dict[str, Any]:
+        """Consolidar (en el orden de los agentes) y cachear si todos respondieron"""
+        results = {agent_name: results[agent_name] for agent_name in self.agents if agent_name in results}
         consolidated_analysis = self._consolidate_results(results, business_data)
         
+        # Sólo se cachean análisis en los que todos los agentes respondieron
+        if not any('error' in result for result in results.values()):
+            self.cache.set(business_data, consolidated_analysis, namespace='orchestrator')
+            if self._use_semantic(scope):
+                await self.pool.run(self.semantic.set, business_data, consolidated_analysis, scope,
+                                    namespace='orchestrator')
+        
         return consolidated_analysis
     
+    async def analyze_business_comprehensive(self, business_data: Dict[str, Any],
+                                             scope: Optional[str] = None) -> Dict[str, Any]:
+        """Análisis comprehensivo usando todos los agentes (scope: usuario, para la caché semántica)"""
+        
+        # Misma entrada (o casi idéntica del mismo usuario) => mismo análisis
+        cached = await self._cached(business_data, scope)
+        if cached is not None:
+            return cached
+        
+        # Ejecutar todos los agentes en el pool compartido y esperarlos a la vez
+        outcomes = await asyncio.gather(*[
+            self._run_agent(agent_name, business_data) for agent_name in self.agents
+        ])
+        
+        # Consolidar resultados
+        return await self._finalize(dict(outcomes), business_data, scope)
+    
+    async def analyze_business_stream(self, business_data: Dict[str, Any],
+                                      scope: Optional[str] = None) -> AsyncIterator[Tuple[str, str, Dict[str, Any]]]:
+        """Emitir ('agent', nombre, resultado) según termina cada agente y al final ('consolidated', ...)"""
+        cached = await self._cached(business_data, scope)
+        if cached is not None:
+            for agent_name, result in cached.get('agent_insights', {}).items():
+                yield 'agent', agent_name, result
+            yield 'consolidated', 'orchestrator', cached
+            return
+        
+        tasks = [
+            asyncio.ensure_future(self._run_agent(agent_name, business_data))
+            for agent_name in self.agents
+        ]
+        results = {}
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                agent_name, result = await next_done
+                results[agent_name] = result
+                yield 'agent', agent_name, result
+        finally:
+            # Si el consumidor abandona el stream no se dejan tareas huérfanas
+            for task in tasks:
+                task.cancel()
+        
+        yield 'consolidated', 'orchestrator', await self._finalize(results, business_data, scope)
+    
     def _consolidate_results(self, agent_results: Dict[str, Any], business_data: Dict[str, Any]) -> Dict[str, Any]:
         """Consolidar resultados de todos los agentes"""
         
@@ -570,7 +764,8 @@ class AIAgentOrchestrator:
         # Market agent recommendations
         if 'market' in agent_results and 'recommendations' in agent_results['market']:
             market_recs = agent_results['market']['recommendations']
-            all_recommendations.extend([{
+            # Recomendación estructurada generada por el LLM si la hay
+            all_recommendations.extend([agent_results['market'].get('recommendation') or {
                 'category': 'Análisis de Mercado',
                 'priority': 'Media',
                 'impact': 'Mejor posicionamiento competitivo',
@@ -580,7 +775,7 @@ class AIAgentOrchestrator:
         # Customer agent recommendations
         if 'customer' in agent_results and 'cx_recommendations' in agent_results['customer']:
             cx_recs = agent_results['customer']['cx_recommendations']
-            all_recommendations.extend([{
+            all_recommendations.extend([agent_results['customer'].get('recommendation') or {
                 'category': 'Experiencia del Cliente',
                 'priority': 'Alta',
                 'impact': '30% mejora en satisfacción',
@@ -591,7 +786,7 @@ class AIAgentOrchestrator:
         if 'growth' in agent_results and 'growth_strategies' in agent_results['growth']:
             growth_strategies = agent_results['growth']['growth_strategies']
             if growth_strategies:
-                all_recommendations.extend([{
+                all_recommendations.extend([agent_results['growth'].get('recommendation') or {
                     'category': 'Estrategia de Crecimiento',
                     'priority': 'Alta',
                     'impact': 'Aceleración del crecimiento',
@@ -604,7 +799,8 @@ class AIAgentOrchestrator:
             base_score += 10  # Bonus por análisis comprehensivo
         
         # Generar KPIs consolidados
-        consolidated_kpis = self._generate_consolidated_kpis(business_data.get('business_type', ''))
+        consolidated_kpis = (agent_results.get('growth', {}).get('kpis')
+                             or self._generate_consolidated_kpis(business_data.get('business_type', '')))
         
         return {
             'business_type': business_data.get('business_type', ''),
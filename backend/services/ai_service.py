@@ -2,36 +2,284 @@ import os
 import json
 from typing import Dict, List, Any
 from datetime import datetime
-import asyncio
+
+from services.keyword_matcher import keyword_matcher
+
+
+class FrozenDict(dict):
+    """dict inmutable: serializable como JSON pero sin métodos de mutación"""
+
+    def _immutable(self, *args, **kwargs):
+        raise TypeError("Las plantillas de análisis son inmutables")
+
+    __setitem__ = __delitem__ = __ior__ = _immutable
+    clear = pop = popitem = setdefault = update = _immutable
+
+    def __reduce__(self):
+        return (FrozenDict, (dict(self),))
+
+
+def _freeze(value: Any) -> Any:
+    """Convertir recursivamente dicts/listas en FrozenDict/tuplas"""
+    if isinstance(value, dict):
+        return FrozenDict((key, _freeze(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _thaw(value: Any) -> Any:
+    """Inverso de _freeze: dicts y listas normales (mutables) para los llamadores"""
+    if isinstance(value, dict):
+        return {key: _thaw(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_thaw(item) for item in value]
+    return value
+
+
+# Plantillas de análisis por tipo de negocio, construidas una sola vez al importar.
+# Cada resultado por petición es un dict ligero que referencia estas estructuras.
+_RULE_TEMPLATES = _freeze({
+    'saas': {
+        'business_type': 'saas',
+        'score': 75,
+        'summary': "Análisis completado para {name}. Identificamos oportunidades clave para optimizar métricas de SaaS.",
+        'default_name': 'tu SaaS',
+        'recommendations': [
+            {
+                'category': 'Optimización de Conversión',
+                'priority': 'Alta',
+                'impact': '25-40% aumento en conversiones',
+                'actions': [
+                    'Implementar onboarding interactivo con progress tracking',
+                    'Optimizar landing page con social proof y testimonios',
+                    'Crear free trial extendido con features premium limitadas'
+                ]
+            },
+            {
+                'category': 'Reducción de Churn',
+                'priority': 'Alta',
+                'impact': '30% reducción en cancelaciones',
+                'actions': [
+                    'Implementar sistema de alertas tempranas de churn',
+                    'Crear programa de customer success proactivo',
+                    'Desarrollar feature adoption tracking y nudges'
+                ]
+            },
+            {
+                'category': 'Crecimiento de Revenue',
+                'priority': 'Media',
+                'impact': '20% aumento en ARPU',
+                'actions': [
+                    'Implementar pricing basado en valor y uso',
+                    'Crear tiers premium con features avanzadas',
+                    'Desarrollar programa de upselling automatizado'
+                ]
+            }
+        ],
+        'kpis': [
+            {'name': 'MRR Growth', 'current': '12%', 'target': '20%', 'improvement': '+67%'},
+            {'name': 'Churn Rate', 'current': '7.2%', 'target': '4.5%', 'improvement': '-38%'},
+            {'name': 'CAC Payback', 'current': '8.2 meses', 'target': '5.1 meses', 'improvement': '-38%'},
+            {'name': 'NPS Score', 'current': '42', 'target': '65', 'improvement': '+55%'}
+        ],
+        'timeline': '3-6 meses para implementación completa',
+        'estimated_roi': '185%'
+    },
+    'ecommerce': {
+        'business_type': 'ecommerce',
+        'score': 68,
+        'summary': "Análisis completado para {name}. Identificamos oportunidades para optimizar conversiones y AOV.",
+        'default_name': 'tu e-commerce',
+        'recommendations': [
+            {
+                'category': 'Optimización de Conversión',
+                'priority': 'Alta',
+                'impact': '35% aumento en conversiones',
+                'actions': [
+                    'Implementar abandoned cart recovery con secuencia de emails',
+                    'Optimizar checkout process reduciendo pasos a 2-3',
+                    'Agregar reviews y ratings prominentes en product pages'
+                ]
+            },
+            {
+                'category': 'Aumento de AOV',
+                'priority': 'Media',
+                'impact': '25% aumento en valor promedio',
+                'actions': [
+                    'Implementar cross-selling y upselling inteligente',
+                    'Crear bundles de productos complementarios',
+                    'Ofrecer envío gratis con compra mínima'
+                ]
+            },
+            {
+                'category': 'Customer Experience',
+                'priority': 'Alta',
+                'impact': '40% aumento en repeat purchases',
+                'actions': [
+                    'Implementar chatbot para soporte 24/7',
+                    'Crear programa de loyalty con rewards',
+                    'Personalizar product recommendations con ML'
+                ]
+            }
+        ],
+        'kpis': [
+            {'name': 'Conversion Rate', 'current': '1.8%', 'target': '2.9%', 'improvement': '+61%'},
+            {'name': 'Average Order Value', 'current': '$67', 'target': '$89', 'improvement': '+33%'},
+            {'name': 'Cart Abandonment', 'current': '69%', 'target': '52%', 'improvement': '-25%'},
+            {'name': 'Customer LTV', 'current': '$156', 'target': '$218', 'improvement': '+40%'}
+        ],
+        'timeline': '2-4 meses para implementación completa',
+        'estimated_roi': '165%'
+    },
+    'local': {
+        'business_type': 'local',
+        'score': 62,
+        'summary': "Análisis completado para {name}. Identificamos oportunidades para mejorar presencia digital local.",
+        'default_name': 'tu negocio local',
+        'recommendations': [
+            {
+                'category': 'Presencia Digital Local',
+                'priority': 'Alta',
+                'impact': '50% más visibilidad local',
+                'actions': [
+                    'Optimizar Google My Business con fotos y reviews',
+                    'Implementar SEO local con keywords geográficas',
+                    'Crear contenido local relevante y actualizado'
+                ]
+            },
+            {
+                'category': 'Customer Retention',
+                'priority': 'Media',
+                'impact': '30% aumento en repeat customers',
+                'actions': [
+                    'Implementar programa de loyalty local',
+                    'Crear sistema de referidos con incentivos',
+                    'Desarrollar email marketing segmentado'
+                ]
+            },
+            {
+                'category': 'Operaciones',
+                'priority': 'Media',
+                'impact': '25% mejora en eficiencia',
+                'actions': [
+                    'Implementar sistema de reservas online',
+                    'Optimizar horarios basado en traffic patterns',
+                    'Crear dashboard de métricas operacionales'
+                ]
+            }
+        ],
+        'kpis': [
+            {'name': 'Local Search Ranking', 'current': '#8', 'target': '#3', 'improvement': '+63%'},
+            {'name': 'Repeat Customer Rate', 'current': '23%', 'target': '35%', 'improvement': '+52%'},
+            {'name': 'Average Transaction', 'current': '$34', 'target': '$45', 'improvement': '+32%'},
+            {'name': 'Google Reviews Score', 'current': '4.1', 'target': '4.6', 'improvement': '+12%'}
+        ],
+        'timeline': '2-3 meses para implementación completa',
+        'estimated_roi': '145%'
+    },
+    'startup': {
+        'business_type': 'startup',
+        'score': 58,
+        'summary': "Análisis completado para {name}. Identificamos áreas clave para validación y crecimiento.",
+        'default_name': 'tu startup',
+        'recommendations': [
+            {
+                'category': 'Product-Market Fit',
+                'priority': 'Alta',
+                'impact': 'Validación de mercado',
+                'actions': [
+                    'Implementar customer development interviews',
+                    'Crear MVP con core features validadas',
+                    'Desarrollar métricas de product-market fit'
+                ]
+            },
+            {
+                'category': 'Go-to-Market Strategy',
+                'priority': 'Alta',
+                'impact': 'Aceleración de crecimiento',
+                'actions': [
+                    'Definir ICP (Ideal Customer Profile) detallado',
+                    'Crear content marketing strategy',
+                    'Implementar growth hacking experiments'
+                ]
+            },
+            {
+                'category': 'Fundraising Preparation',
+                'priority': 'Media',
+                'impact': 'Preparación para inversión',
+                'actions': [
+                    'Crear financial model y projections',
+                    'Desarrollar pitch deck compelling',
+                    'Establecer métricas clave para investors'
+                ]
+            }
+        ],
+        'kpis': [
+            {'name': 'Product-Market Fit Score', 'current': '6.2/10', 'target': '8.5/10', 'improvement': '+37%'},
+            {'name': 'Monthly Growth Rate', 'current': '12%', 'target': '25%', 'improvement': '+108%'},
+            {'name': 'Customer Acquisition Cost', 'current': '$67', 'target': '$42', 'improvement': '-37%'},
+            {'name': 'Runway', 'current': '8 meses', 'target': '14 meses', 'improvement': '+75%'}
+        ],
+        'timeline': '2-4 meses para validación inicial',
+        'estimated_roi': '220%'
+    }
+})
+
+# Recomendaciones adicionales derivadas de keywords en los desafíos
+_TRAFFIC_RECOMMENDATION = _freeze({
+    'category': 'Generación de Tráfico',
+    'priority': 'Alta',
+    'impact': '40% aumento en tráfico orgánico',
+    'actions': [
+        'Implementar estrategia de SEO técnico y contenido',
+        'Crear campaña de Google Ads optimizada',
+        'Desarrollar content marketing con blog regular'
+    ]
+})
+
+_CONVERSION_RECOMMENDATION = _freeze({
+    'category': 'Optimización de Conversión',
+    'priority': 'Alta',
+    'impact': '25% aumento en conversiones',
+    'actions': [
+        'Implementar A/B testing en landing pages',
+        'Optimizar funnel de conversión',
+        'Agregar elementos de urgencia y escasez'
+    ]
+})
 
 class BusinessAnalysisAI:
     def __init__(self):
-        self.model_path = os.getenv('LLAMA_MODEL_PATH', './models/llama-2-7b-chat.gguf')
-        print("✅ BusinessAnalysisAI inicializado")
+        from services.llm_engine import llm_engine
+
+        # El modelo se carga perezosamente en cada proceso la primera vez que un agente lo usa
+        self.model_path = llm_engine.model_path
+        mode = 'LLM local' if llm_engine.enabled else 'reglas'
+        print(f"✅ BusinessAnalysisAI inicializado (agentes: {mode})")
 
     def analyze_business(self, business_data: Dict[str, Any]) -> Dict[str, Any]:
         """Analizar negocio usando IA y agentes especializados"""
         try:
             # Intentar análisis con agentes especializados
             from services.ai_agents import agent_orchestrator
+            from services.async_bridge import async_bridge
             
-            # Ejecutar análisis con agentes
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            agent_result = loop.run_until_complete(
+            # Ejecutar análisis con agentes en el event loop persistente
+            agent_result = async_bridge.run(
                 agent_orchestrator.analyze_business_comprehensive(business_data)
             )
-            loop.close()
             
             return agent_result
             
         except Exception as e:
             print(f"Error en análisis con agentes: {e}")
-            # Fallback a análisis tradicional
-            return self._analyze_with_rules(business_data)
+            # Fallback a análisis tradicional (copia mutable: el llamador puede modificarla)
+            return _thaw(self._analyze_with_rules(business_data))
 
     def _analyze_with_rules(self, business_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Análisis usando reglas de negocio (fallback)"""
+        """Análisis usando reglas de negocio (fallback). Las recomendaciones y KPIs son las tuplas y
+        FrozenDict compartidos de las plantillas: serializables como JSON, pero no modificables"""
         business_type = business_data.get('business_type', 'startup')
         business_name = business_data.get('business_name', 'Tu Negocio')
         description = business_data.get('description', '')
@@ -55,239 +303,56 @@ class BusinessAnalysisAI:
 
         return enhanced_analysis
 
-    def _generate_saas_analysis(self, data: Dict[str, Any]) -> Dict[str, Any]:
-        """Generar análisis específico para SaaS"""
+    def _render_template(self, business_type: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Resultado por petición sobre la plantilla precompilada del tipo de negocio"""
+        template = _RULE_TEMPLATES[business_type]
         return {
-            'business_type': 'saas',
+            'business_type': template['business_type'],
             'business_name': data.get('business_name', ''),
-            'score': 75,
-            'summary': f"Análisis completado para {data.get('business_name', 'tu SaaS')}. Identificamos oportunidades clave para optimizar métricas de SaaS.",
-            'recommendations': [
-                {
-                    'category': 'Optimización de Conversión',
-                    'priority': 'Alta',
-                    'impact': '25-40% aumento en conversiones',
-                    'actions': [
-                        'Implementar onboarding interactivo con progress tracking',
-                        'Optimizar landing page con social proof y testimonios',
-                        'Crear free trial extendido con features premium limitadas'
-                    ]
-                },
-                {
-                    'category': 'Reducción de Churn',
-                    'priority': 'Alta',
-                    'impact': '30% reducción en cancelaciones',
-                    'actions': [
-                        'Implementar sistema de alertas tempranas de churn',
-                        'Crear programa de customer success proactivo',
-                        'Desarrollar feature adoption tracking y nudges'
-                    ]
-                },
-                {
-                    'category': 'Crecimiento de Revenue',
-                    'priority': 'Media',
-                    'impact': '20% aumento en ARPU',
-                    'actions': [
-                        'Implementar pricing basado en valor y uso',
-                        'Crear tiers premium con features avanzadas',
-                        'Desarrollar programa de upselling automatizado'
-                    ]
-                }
-            ],
-            'kpis': [
-                {'name': 'MRR Growth', 'current': '12%', 'target': '20%', 'improvement': '+67%'},
-                {'name': 'Churn Rate', 'current': '7.2%', 'target': '4.5%', 'improvement': '-38%'},
-                {'name': 'CAC Payback', 'current': '8.2 meses', 'target': '5.1 meses', 'improvement': '-38%'},
-                {'name': 'NPS Score', 'current': '42', 'target': '65', 'improvement': '+55%'}
-            ],
-            'timeline': '3-6 meses para implementación completa',
-            'estimated_roi': '185%'
+            'score': template['score'],
+            'summary': template['summary'].format(name=data.get('business_name', template['default_name'])),
+            'recommendations': template['recommendations'],
+            'kpis': template['kpis'],
+            'timeline': template['timeline'],
+            'estimated_roi': template['estimated_roi']
         }
 
+    def _generate_saas_analysis(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Generar análisis específico para SaaS"""
+        return self._render_template('saas', data)
+
     def _generate_ecommerce_analysis(self, data: Dict[str, Any]) -> Dict[str, Any]:
         """Generar análisis específico para E-commerce"""
-        return {
-            'business_type': 'ecommerce',
-            'business_name': data.get('business_name', ''),
-            'score': 68,
-            'summary': f"Análisis completado para {data.get('business_name', 'tu e-commerce')}. Identificamos oportunidades para optimizar conversiones y AOV.",
-            'recommendations': [
-                {
-                    'category': 'Optimización de Conversión',
-                    'priority': 'Alta',
-                    'impact': '35% aumento en conversiones',
-                    'actions': [
-                        'Implementar abandoned cart recovery con secuencia de emails',
-                        'Optimizar checkout process reduciendo pasos a 2-3',
-                        'Agregar reviews y ratings prominentes en product pages'
-                    ]
-                },
-                {
-                    'category': 'Aumento de AOV',
-                    'priority': 'Media',
-                    'impact': '25% aumento en valor promedio',
-                    'actions': [
-                        'Implementar cross-selling y upselling inteligente',
-                        'Crear bundles de productos complementarios',
-                        'Ofrecer envío gratis con compra mínima'
-                    ]
-                },
-                {
-                    'category': 'Customer Experience',
-                    'priority': 'Alta',
-                    'impact': '40% aumento en repeat purchases',
-                    'actions': [
-                        'Implementar chatbot para soporte 24/7',
-                        'Crear programa de loyalty con rewards',
-                        'Personalizar product recommendations con ML'
-                    ]
-                }
-            ],
-            'kpis': [
-                {'name': 'Conversion Rate', 'current': '1.8%', 'target': '2.9%', 'improvement': '+61%'},
-                {'name': 'Average Order Value', 'current': '$67', 'target': '$89', 'improvement': '+33%'},
-                {'name': 'Cart Abandonment', 'current': '69%', 'target': '52%', 'improvement': '-25%'},
-                {'name': 'Customer LTV', 'current': '$156', 'target': '$218', 'improvement': '+40%'}
-            ],
-            'timeline': '2-4 meses para implementación completa',
-            'estimated_roi': '165%'
-        }
+        return self._render_template('ecommerce', data)
 
     def _generate_local_analysis(self, data: Dict[str, Any]) -> Dict[str, Any]:
         """Generar análisis específico para Negocio Local"""
-        return {
-            'business_type': 'local',
-            'business_name': data.get('business_name', ''),
-            'score': 62,
-            'summary': f"Análisis completado para {data.get('business_name', 'tu negocio local')}. Identificamos oportunidades para mejorar presencia digital local.",
-            'recommendations': [
-                {
-                    'category': 'Presencia Digital Local',
-                    'priority': 'Alta',
-                    'impact': '50% más visibilidad local',
-                    'actions': [
-                        'Optimizar Google My Business con fotos y reviews',
-                        'Implementar SEO local con keywords geográficas',
-                        'Crear contenido local relevante y actualizado'
-                    ]
-                },
-                {
-                    'category': 'Customer Retention',
-                    'priority': 'Media',
-                    'impact': '30% aumento en repeat customers',
-                    'actions': [
-                        'Implementar programa de loyalty local',
-                        'Crear sistema de referidos con incentivos',
-                        'Desarrollar email marketing segmentado'
-                    ]
-                },
-                {
-                    'category': 'Operaciones',
-                    'priority': 'Media',
-                    'impact': '25% mejora en eficiencia',
-                    'actions': [
-                        'Implementar sistema de reservas online',
-                        'Optimizar horarios basado en traffic patterns',
-                        'Crear dashboard de métricas operacionales'
-                    ]
-                }
-            ],
-            'kpis': [
-                {'name': 'Local Search Ranking', 'current': '#8', 'target': '#3', 'improvement': '+63%'},
-                {'name': 'Repeat Customer Rate', 'current': '23%', 'target': '35%', 'improvement': '+52%'},
-                {'name': 'Average Transaction', 'current': '$34', 'target': '$45', 'improvement': '+32%'},
-                {'name': 'Google Reviews Score', 'current': '4.1', 'target': '4.6', 'improvement': '+12%'}
-            ],
-            'timeline': '2-3 meses para implementación completa',
-            'estimated_roi': '145%'
-        }
+        return self._render_template('local', data)
 
     def _generate_startup_analysis(self, data: Dict[str, Any]) -> Dict[str, Any]:
         """Generar análisis específico para Startup"""
-        return {
-            'business_type': 'startup',
-            'business_name': data.get('business_name', ''),
-            'score': 58,
-            'summary': f"Análisis completado para {data.get('business_name', 'tu startup')}. Identificamos áreas clave para validación y crecimiento.",
-            'recommendations': [
-                {
-                    'category': 'Product-Market Fit',
-                    'priority': 'Alta',
-                    'impact': 'Validación de mercado',
-                    'actions': [
-                        'Implementar customer development interviews',
-                        'Crear MVP con core features validadas',
-                        'Desarrollar métricas de product-market fit'
-                    ]
-                },
-                {
-                    'category': 'Go-to-Market Strategy',
-                    'priority': 'Alta',
-                    'impact': 'Aceleración de crecimiento',
-                    'actions': [
-                        'Definir ICP (Ideal Customer Profile) detallado',
-                        'Crear content marketing strategy',
-                        'Implementar growth hacking experiments'
-                    ]
-                },
-                {
-                    'category': 'Fundraising Preparation',
-                    'priority': 'Media',
-                    'impact': 'Preparación para inversión',
-                    'actions': [
-                        'Crear financial model y projections',
-                        'Desarrollar pitch deck compelling',
-                        'Establecer métricas clave para investors'
-                    ]
-                }
-            ],
-            'kpis': [
-                {'name': 'Product-Market Fit Score', 'current': '6.2/10', 'target': '8.5/10', 'improvement': '+37%'},
-                {'name': 'Monthly Growth Rate', 'current': '12%', 'target': '25%', 'improvement': '+108%'},
-                {'name': 'Customer Acquisition Cost', 'current': '$67', 'target': '$42', 'improvement': '-37%'},
-                {'name': 'Runway', 'current': '8 meses', 'target': '14 meses', 'improvement': '+75%'}
-            ],
-            'timeline': '2-4 meses para validación inicial',
-            'estimated_roi': '220%'
-        }
+        return self._render_template('startup', data)
 
     def _enhance_with_nlp_analysis(self, base_analysis: Dict[str, Any], challenges: str, goals: str) -> Dict[str, Any]:
         """Enriquecer análisis con procesamiento de lenguaje natural"""
         
         # Análisis de sentimientos y keywords en desafíos
-        challenge_keywords = self._extract_keywords(challenges.lower())
-        goal_keywords = self._extract_keywords(goals.lower())
+        challenge_keywords = self._extract_keywords(challenges)
+        goal_keywords = self._extract_keywords(goals)
         
         # Agregar recomendaciones específicas basadas en keywords
-        additional_recommendations = []
+        additional_recommendations = ()
         
         # Análisis de desafíos
         if any(word in challenge_keywords for word in ['tráfico', 'visitas', 'seo']):
-            additional_recommendations.append({
-                'category': 'Generación de Tráfico',
-                'priority': 'Alta',
-                'impact': '40% aumento en tráfico orgánico',
-                'actions': [
-                    'Implementar estrategia de SEO técnico y contenido',
-                    'Crear campaña de Google Ads optimizada',
-                    'Desarrollar content marketing con blog regular'
-                ]
-            })
+            additional_recommendations += (_TRAFFIC_RECOMMENDATION,)
         
         if any(word in challenge_keywords for word in ['conversión', 'ventas', 'clientes']):
-            additional_recommendations.append({
-                'category': 'Optimización de Conversión',
-                'priority': 'Alta',
-                'impact': '25% aumento en conversiones',
-                'actions': [
-                    'Implementar A/B testing en landing pages',
-                    'Optimizar funnel de conversión',
-                    'Agregar elementos de urgencia y escasez'
-                ]
-            })
+            additional_recommendations += (_CONVERSION_RECOMMENDATION,)
         
-        # Combinar recomendaciones
-        base_analysis['recommendations'].extend(additional_recommendations)
+        # Combinar recomendaciones (la plantilla compartida no se modifica)
+        if additional_recommendations:
+            base_analysis['recommendations'] = base_analysis['recommendations'] + additional_recommendations
         
         # Ajustar score basado en análisis de texto
         complexity_score = len(challenge_keywords) + len(goal_keywords)
@@ -298,19 +363,8 @@ class BusinessAnalysisAI:
 
     def _extract_keywords(self, text: str) -> List[str]:
         """Extraer keywords relevantes del texto"""
-        # Lista de palabras clave relevantes para análisis de negocio
-        business_keywords = [
-            'tráfico', 'visitas', 'seo', 'conversión', 'ventas', 'clientes',
-            'competencia', 'precios', 'marketing', 'publicidad', 'redes sociales',
-            'email', 'contenido', 'blog', 'landing', 'website', 'móvil',
-            'retención', 'churn', 'satisfacción', 'experiencia', 'soporte',
-            'producto', 'servicio', 'calidad', 'innovación', 'tecnología',
-            'costos', 'ingresos', 'rentabilidad', 'crecimiento', 'escalabilidad'
-        ]
-        
-        words = text.split()
-        found_keywords = [word for word in words if word in business_keywords]
-        return found_keywords
+        # Una sola pasada del autómata compartido (frases, acentos y puntuación incluidos)
+        return list(keyword_matcher.find(text, 'business'))
 
 # Instancia global del servicio de IA
 ai_service = BusinessAnalysisAI()
\ No newline at end of file
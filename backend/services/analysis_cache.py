@@ -0,0 +1,128 @@
+"""
+Caché direccionada por contenido para resultados completos de análisis.
+Para una misma entrada los analizadores devuelven el mismo resultado salvo
+`generated_at`, así que se indexa por un hash canónico de los campos de
+entrada con límite LRU, TTL, contadores y invalidación explícita.
+
+Los textos libres entran en la clave tal cual: las reglas los leen en
+minúsculas, pero el prompt del LLM los incluye literalmente y dos variantes
+de mayúsculas o espacios pueden dar generaciones distintas.
+"""
+
+import os
+import copy
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+# Campos de entrada que determinan el resultado de un análisis
+CACHE_KEY_FIELDS = ('business_type', 'business_name', 'description', 'challenges', 'goals', 'website')
+
+def normalize_business_data(business_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Forma canónica de la entrada de un análisis (sólo los campos que determinan el resultado)"""
+    return {field: business_data.get(field) for field in CACHE_KEY_FIELDS}
+
+
+def analysis_cache_key(business_data: Dict[str, Any], namespace: str = '') -> str:
+    """Hash canónico (SHA-256) de la entrada normalizada"""
+    canonical = json.dumps(
+        normalize_business_data(business_data),
+        sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str
+    )
+    return hashlib.sha256(f"{namespace}\x00{canonical}".encode('utf-8')).hexdigest()
+
+
+class AnalysisCache:
+    """Caché LRU con TTL de resultados de análisis"""
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: 'OrderedDict[str, Tuple[float, Dict[str, Any]]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, business_data: Dict[str, Any], namespace: str = '') -> Optional[Dict[str, Any]]:
+        """Devolver el resultado cacheado (con `generated_at` actualizado) o None"""
+        if self.max_entries <= 0:
+            return None
+
+        key = analysis_cache_key(business_data, namespace)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            result = entry[1]
+
+        # Copia profunda: quien recibe el resultado puede modificarlo sin tocar la caché
+        result = copy.deepcopy(result)
+        if 'generated_at' in result:
+            result['generated_at'] = datetime.now().isoformat()
+        return result
+
+    def set(self, business_data: Dict[str, Any], result: Dict[str, Any], namespace: str = '') -> None:
+        """Guardar un resultado para la entrada dada"""
+        if self.max_entries <= 0:
+            return
+
+        key = analysis_cache_key(business_data, namespace)
+        expires_at = time.monotonic() + self.ttl_seconds
+        # Copia profunda: el llamador sigue teniendo (y puede modificar) el resultado original
+        result = copy.deepcopy(result)
+        with self._lock:
+            self._entries[key] = (expires_at, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, business_data: Dict[str, Any], namespace: Optional[str] = None) -> int:
+        """Eliminar la entrada de un input (en un namespace o en los conocidos)"""
+        namespaces = [namespace] if namespace is not None else list(ANALYSIS_CACHE_NAMESPACES)
+        removed = 0
+        with self._lock:
+            for ns in namespaces:
+                if self._entries.pop(analysis_cache_key(business_data, ns), None) is not None:
+                    removed += 1
+        return removed
+
+    def clear(self) -> None:
+        """Vaciar la caché por completo"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores de uso de la caché"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0
+            }
+
+
+# Namespaces usados por los analizadores (resultados con formatos distintos)
+ANALYSIS_CACHE_NAMESPACES = ('orchestrator',)
+
+# Instancia global de la caché de análisis
+analysis_cache = AnalysisCache(
+    max_entries=int(os.getenv('ANALYSIS_CACHE_SIZE', '1024')),
+    ttl_seconds=float(os.getenv('ANALYSIS_CACHE_TTL', '3600'))
+)
@@ -0,0 +1,224 @@
+"""
+Formato compacto de almacenamiento para los análisis persistidos.
+La mayor parte de un análisis (agent_insights, KPIs, recomendaciones) sale
+tal cual de las tablas estáticas de ai_agents.py. Cada documento se guarda
+como referencia a una plantilla versionada (el análisis que producen los
+agentes para ese tipo de negocio con una entrada vacía) más las diferencias
+propias de la petición, comprimidas con zlib usando la plantilla como
+diccionario. Al leer se reconstruye el documento completo.
+
+Cada versión de plantilla se guarda en la base de datos antes de escribir la
+primera fila que la referencia, así que las filas se pueden leer desde
+cualquier host aunque las tablas de ai_agents.py cambien. El JSON se guarda
+como texto (jsonb reordenaría las claves y el diccionario de zlib dejaría de
+coincidir):
+
+    create table analysis_templates (
+        version text primary key,
+        body text not null,
+        created_at timestamptz not null default now()
+    );
+"""
+
+import os
+import json
+import zlib
+import base64
+import hashlib
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+ANALYSIS_ENCODING = 'anclora-compact/1'
+
+# Columnas de la tabla analyses que guardan documentos de análisis
+ANALYSIS_PAYLOAD_COLUMNS = ('result', 'comprehensive_analysis')
+
+# Campos que se mantienen en claro para las proyecciones del listado (result->>...)
+SUMMARY_FIELDS = ('business_type', 'business_name', 'score')
+
+Path = List[Any]
+
+
+def _canonical(doc: Any) -> Any:
+    """Copia JSON pura del documento (tuplas -> listas, FrozenDict -> dict)"""
+    return json.loads(json.dumps(doc, ensure_ascii=False, default=str))
+
+
+def _dumps(doc: Any) -> bytes:
+    return json.dumps(doc, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _same(a: Any, b: Any) -> bool:
+    """Igualdad JSON que distingue tipos (True frente a 1, 70 frente a 70.0)"""
+    if type(a) is not type(b):
+        return False
+    if isinstance(a, dict):
+        return a.keys() == b.keys() and all(_same(value, b[key]) for key, value in a.items())
+    if isinstance(a, list):
+        return len(a) == len(b) and all(_same(old, new) for old, new in zip(a, b))
+    return a == b
+
+
+def _diff(base: Any, doc: Any, path: Path, sets: List[Tuple[Path, Any]], dels: List[Path]) -> None:
+    """Operaciones mínimas (asignar/borrar por ruta) que convierten base en doc"""
+    if isinstance(base, dict) and isinstance(doc, dict):
+        for key, value in doc.items():
+            if key not in base:
+                sets.append((path + [key], value))
+            elif not _same(base[key], value):
+                _diff(base[key], value, path + [key], sets, dels)
+        for key in base:
+            if key not in doc:
+                dels.append(path + [key])
+    elif isinstance(base, list) and isinstance(doc, list) and len(base) == len(doc):
+        for index, (old, new) in enumerate(zip(base, doc)):
+            if not _same(old, new):
+                _diff(old, new, path + [index], sets, dels)
+    else:
+        sets.append((path, doc))
+
+
+def _patch(doc: Any, sets: List[Tuple[Path, Any]], dels: List[Path]) -> Any:
+    for path, value in sets:
+        if not path:
+            doc = value
+            continue
+        target = doc
+        for key in path[:-1]:
+            target = target[key]
+        target[path[-1]] = value
+    for path in dels:
+        target = doc
+        for key in path[:-1]:
+            target = target[key]
+        del target[path[-1]]
+    return doc
+
+
+class AnalysisTemplates:
+    """Plantillas por tipo de negocio, versionadas por hash de su contenido"""
+
+    def __init__(self, table: Optional[str] = 'analysis_templates',
+                 client: Optional[Callable[[], Any]] = None):
+        # Sin tabla las versiones sólo viven en memoria (benchmarks)
+        self.table = table
+        self._client = client
+        self._by_type: Dict[str, Tuple[str, bytes]] = {}
+        self._by_version: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def _table(self):
+        if self._client is None:
+            from services.supabase_client import supabase_factory
+            return supabase_factory.get().table(self.table)
+        return self._client().table(self.table)
+
+    def _build(self, business_type: str) -> Any:
+        from services.ai_agents import agent_orchestrator
+
+        data = {'business_type': business_type, 'business_name': '', 'description': '',
+                'challenges': '', 'goals': '', 'website': ''}
+        # Las plantillas se construyen siempre con las reglas (deterministas)
+        results = {name: agent.analyze(data, use_llm=False) for name, agent in agent_orchestrator.agents.items()}
+        template = _canonical(agent_orchestrator._consolidate_results(results, data))
+        template['generated_at'] = ''
+        return template
+
+    def current(self, business_type: str) -> Tuple[str, bytes]:
+        """(versión, JSON) de la plantilla vigente para el tipo de negocio"""
+        entry = self._by_type.get(business_type)
+        if entry is not None:
+            return entry
+        with self._lock:
+            if business_type not in self._by_type:
+                raw = _dumps(self._build(business_type))
+                version = hashlib.sha256(raw).hexdigest()[:16]
+                # Si no se puede guardar la versión no se codifica ninguna fila con ella
+                self._persist(version, raw)
+                self._by_version[version] = raw
+                self._by_type[business_type] = (version, raw)
+            return self._by_type[business_type]
+
+    def get(self, version: str) -> bytes:
+        """JSON de una plantilla por versión (en memoria o en la base de datos)"""
+        raw = self._by_version.get(version)
+        if raw is not None:
+            return raw
+        rows = []
+        if self.table:
+            rows = self._table().select('body').eq('version', version).limit(1).execute().data
+        if not rows:
+            raise KeyError(f'Plantilla de análisis desconocida: {version}')
+        raw = rows[0]['body'].encode('utf-8')
+        with self._lock:
+            self._by_version[version] = raw
+        return raw
+
+    def _persist(self, version: str, raw: bytes) -> None:
+        if not self.table:
+            return
+        # La versión es un hash del contenido: si ya existe, es idéntica
+        self._table().upsert({'version': version, 'body': raw.decode('utf-8')},
+                             on_conflict='version', ignore_duplicates=True, returning='minimal').execute()
+
+
+class AnalysisCodec:
+    """Codifica análisis como plantilla + diferencias comprimidas y los reconstruye"""
+
+    def __init__(self, templates: AnalysisTemplates, compression_level: int = 6, enabled: bool = True):
+        self.templates = templates
+        self.compression_level = compression_level
+        self.enabled = enabled
+
+    @staticmethod
+    def is_encoded(value: Any) -> bool:
+        return isinstance(value, dict) and value.get('encoding') == ANALYSIS_ENCODING
+
+    def encode(self, doc: Any) -> Any:
+        """Documento -> sobre compacto (los valores que no son dict se dejan igual)"""
+        if not self.enabled or not isinstance(doc, dict) or self.is_encoded(doc):
+            return doc
+        doc = _canonical(doc)
+        version, raw_template = self.templates.current(str(doc.get('business_type') or ''))
+
+        sets: List[Tuple[Path, Any]] = []
+        dels: List[Path] = []
+        _diff(json.loads(raw_template), doc, [], sets, dels)
+
+        compressor = zlib.compressobj(self.compression_level, zdict=raw_template)
+        delta = compressor.compress(_dumps({'s': sets, 'd': dels})) + compressor.flush()
+
+        envelope = {field: doc[field] for field in SUMMARY_FIELDS if field in doc}
+        envelope.update({
+            'encoding': ANALYSIS_ENCODING,
+            'template': version,
+            'delta': base64.b64encode(delta).decode('ascii')
+        })
+        return envelope
+
+    def decode(self, value: Any) -> Any:
+        """Sobre compacto -> documento completo (las filas antiguas en claro pasan tal cual)"""
+        if not self.is_encoded(value):
+            return value
+        raw_template = self.templates.get(value['template'])
+        decompressor = zlib.decompressobj(zdict=raw_template)
+        delta = json.loads(decompressor.decompress(base64.b64decode(value['delta'])) + decompressor.flush())
+        return _patch(json.loads(raw_template), delta['s'], delta['d'])
+
+    def encode_row(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        """Codificar las columnas de análisis de una fila de la tabla analyses"""
+        return {column: self.encode(value) if column in ANALYSIS_PAYLOAD_COLUMNS else value
+                for column, value in row.items()}
+
+    def decode_row(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        """Reconstruir las columnas de análisis de una fila leída"""
+        return {column: self.decode(value) if column in ANALYSIS_PAYLOAD_COLUMNS else value
+                for column, value in row.items()}
+
+
+# Instancia global del codificador de análisis
+analysis_codec = AnalysisCodec(
+    templates=AnalysisTemplates(table=os.getenv('ANALYSIS_TEMPLATE_TABLE', 'analysis_templates')),
+    compression_level=int(os.getenv('ANALYSIS_COMPRESSION_LEVEL', '6')),
+    enabled=os.getenv('ANALYSIS_STORAGE_ENCODING', 'compact') == 'compact'
+)
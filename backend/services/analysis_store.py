@@ -0,0 +1,98 @@
+"""
+Consultas de lectura sobre la tabla de análisis.
+El listado devuelve sólo una proyección resumida (id, nombre, tipo, score y
+fecha) paginada por keyset sobre (created_at, id), de modo que el coste de
+cada página no depende de cuántos análisis tenga el usuario. El análisis
+completo se pide aparte por id (y se reconstruye si se guardó en formato
+compacto, ver services/analysis_codec.py). Conviene un índice en Postgres sobre
+(user_id, created_at DESC, id DESC).
+"""
+
+import os
+import re
+import json
+import base64
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from services.analysis_codec import analysis_codec
+
+# Proyección del listado: los campos del resumen salen del JSON de `result`
+ANALYSIS_SUMMARY_COLUMNS = (
+    'id',
+    'created_at',
+    'business_name:result->>business_name',
+    'business_type:result->>business_type',
+    'score:result->score'
+)
+
+# El cursor acaba dentro de un filtro de PostgREST: sólo se aceptan ids simples
+_CURSOR_ID = re.compile(r'^[A-Za-z0-9_-]+$')
+
+ANALYSES_PAGE_SIZE = int(os.getenv('ANALYSES_PAGE_SIZE', '20'))
+ANALYSES_MAX_PAGE_SIZE = int(os.getenv('ANALYSES_MAX_PAGE_SIZE', '100'))
+
+
+class InvalidCursorError(ValueError):
+    """Cursor de paginación mal formado"""
+
+
+def encode_cursor(created_at: str, analysis_id: Any) -> str:
+    """Cursor opaco con la posición (created_at, id) de la última fila servida"""
+    raw = json.dumps([created_at, analysis_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[str, Any]:
+    """Inverso de encode_cursor"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, analysis_id = json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursorError('Cursor inválido') from e
+    try:
+        datetime.fromisoformat(created_at)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursorError('Cursor inválido') from e
+    if isinstance(analysis_id, bool) or not _CURSOR_ID.match(str(analysis_id)):
+        raise InvalidCursorError('Cursor inválido')
+    return created_at, analysis_id
+
+
+def list_analyses(client, user_id: str, limit: Optional[int] = None,
+                  cursor: Optional[str] = None) -> Dict[str, Any]:
+    """Página de resúmenes de análisis del usuario, del más reciente al más antiguo"""
+    limit = max(1, min(limit or ANALYSES_PAGE_SIZE, ANALYSES_MAX_PAGE_SIZE))
+
+    query = (client.table('analyses')
+             .select(*ANALYSIS_SUMMARY_COLUMNS)
+             .eq('user_id', user_id))
+    if cursor:
+        created_at, analysis_id = decode_cursor(cursor)
+        # (created_at, id) < (cursor): el id desempata análisis con la misma fecha
+        query = query.or_(
+            f'created_at.lt."{created_at}",'
+            f'and(created_at.eq."{created_at}",id.lt.{analysis_id})'
+        )
+    # Se pide una fila de más para saber si hay página siguiente
+    rows = (query.order('created_at', desc=True)
+            .order('id', desc=True)
+            .limit(limit + 1)
+            .execute()).data
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]['created_at'], rows[-1]['id'])
+    return {'analyses': rows, 'next_cursor': next_cursor}
+
+
+def get_analysis(client, user_id: str, analysis_id: str) -> Optional[Dict[str, Any]]:
+    """Análisis completo (None si no existe o es de otro usuario)"""
+    rows = (client.table('analyses')
+            .select('*')
+            .eq('user_id', user_id)
+            .eq('id', analysis_id)
+            .limit(1)
+            .execute()).data
+    return analysis_codec.decode_row(rows[0]) if rows else None
@@ -0,0 +1,341 @@
+"""
+Persistencia write-behind de análisis en Supabase.
+Las rutas encolan la fila y responden sin esperar al insert; un hilo de fondo
+inserta por lotes (por tamaño o por tiempo), reintenta con backoff y, si la
+base de datos no está disponible, vuelca las filas a un journal local en disco
+que se reinserta cuando vuelve a responder. Al apagar se vacía la cola.
+
+Cada fila lleva un id generado al encolarla y se escribe con un upsert que
+ignora duplicados, de modo que reintentar un lote que sí llegó a insertarse
+(p. ej. tras un timeout) no lo duplica; la columna `id` de la tabla debe ser
+de tipo uuid. Sólo se reintentan los errores transitorios (red, 5xx,
+conexión): un lote rechazado por sus datos (restricciones, tipos, columnas)
+se reintenta fila a fila y las filas rechazadas se apartan a
+<journal_dir>/rejected/<tabla>.jsonl en lugar de bloquear las siguientes.
+"""
+
+import os
+import json
+import glob
+import time
+import queue
+import uuid
+import atexit
+import threading
+from typing import Any, Dict, List, Optional
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+
+def _with_id(row: Dict[str, Any]) -> Dict[str, Any]:
+    # Id fijado en el cliente: los reintentos del mismo lote no duplican filas
+    return row if row.get('id') else dict(row, id=str(uuid.uuid4()))
+
+
+def _is_permanent(error: Exception) -> bool:
+    """Errores que reintentar no arregla: la fila es rechazada por sus datos"""
+    if isinstance(error, (TypeError, ValueError)):
+        # Fallo al codificar la fila
+        return True
+    code = getattr(error, 'code', None)
+    if not isinstance(code, str):
+        return False
+    # SQLSTATE 22 (datos), 23 (restricciones), 42 (columnas/tipos) y errores de petición de PostgREST
+    return code[:2] in ('22', '23', '42') or code.startswith(('PGRST1', 'PGRST2'))
+
+
+class AnalysisWriter:
+    """Cola acotada de filas de análisis con flusher por lotes en segundo plano"""
+
+    def __init__(self, journal_dir: str, table: str = 'analyses', max_queue: int = 1000,
+                 batch_size: int = 50, flush_interval: float = 1.0, max_retries: int = 3,
+                 backoff_base: float = 0.5, backoff_max: float = 10.0, replay_interval: float = 30.0):
+        self.journal_dir = journal_dir
+        self.table = table
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.replay_interval = replay_interval
+        self._queue: 'queue.Queue[Dict[str, Any]]' = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._journal_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._last_replay = 0.0
+        self.enqueued = 0
+        self.inserted = 0
+        self.batches = 0
+        self.retries = 0
+        self.spilled = 0
+        self.replayed = 0
+        self.rejected = 0
+
+        os.makedirs(journal_dir, exist_ok=True)
+
+    # --- API pública -----------------------------------------------------------
+
+    def ensure_started(self) -> None:
+        """Arrancar el flusher en este proceso si aún no está en marcha"""
+        if self._pid == os.getpid() and self._thread is not None:
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None:
+                return
+            if self._pid != os.getpid():
+                # Las filas en cola pertenecen al proceso padre
+                self._queue = queue.Queue(maxsize=self._queue.maxsize)
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._flush_loop, name='anclora-analysis-writer', daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def enqueue(self, row: Dict[str, Any]) -> None:
+        """Encolar una fila para insertarla en segundo plano (nunca bloquea)"""
+        self.ensure_started()
+        row = _with_id(row)
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            # Cola llena: la fila va directa al journal para no perderla
+            self._spill([row])
+        with self._lock:
+            self.enqueued += 1
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Esperar a que la cola se vacíe (True si lo hizo dentro del plazo)"""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def shutdown(self, timeout: float = 10.0) -> None:
+        """Vaciar la cola y detener el flusher; lo que no se inserte queda en el journal"""
+        if self._pid != os.getpid():
+            # Nada que vaciar: las filas heredadas de un fork pertenecen al proceso padre
+            return
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._thread = None
+        # Si el flusher no terminó a tiempo, las filas pendientes se vuelcan a disco
+        pending = self._drain_nowait(self._queue.qsize())
+        if pending:
+            self._spill(pending)
+            self._done(pending)
+
+    def stats(self) -> Dict[str, Any]:
+        """Métricas de la cola y del journal"""
+        with self._lock:
+            return {
+                'queued': self._queue.qsize(),
+                'max_queue': self._queue.maxsize,
+                'enqueued': self.enqueued,
+                'inserted': self.inserted,
+                'batches': self.batches,
+                'retries': self.retries,
+                'spilled': self.spilled,
+                'replayed': self.replayed,
+                'rejected': self.rejected,
+                'journal_files': len(glob.glob(os.path.join(self.journal_dir, '*.jsonl*')))
+            }
+
+    # --- Flusher ---------------------------------------------------------------
+
+    def _insert_batch(self, rows: List[Dict[str, Any]]) -> None:
+        from services.supabase_client import supabase_factory
+        from services.analysis_codec import analysis_codec
+
+        # Se codifica aquí, fuera del camino de la petición (el journal guarda las filas en claro)
+        rows = [analysis_codec.encode_row(row) for row in rows]
+        supabase_factory.get().table(self.table).upsert(
+            rows, on_conflict='id', ignore_duplicates=True, returning='minimal'
+        ).execute()
+
+    def _drain_nowait(self, limit: int) -> List[Dict[str, Any]]:
+        rows = []
+        while len(rows) < limit:
+            try:
+                rows.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return rows
+
+    def _collect(self) -> List[Dict[str, Any]]:
+        """Esperar a la primera fila y juntar un lote hasta batch_size o flush_interval"""
+        if self._stop.is_set():
+            return self._drain_nowait(self.batch_size)
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size and not self._stop.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        batch.extend(self._drain_nowait(self.batch_size - len(batch)))
+        return batch
+
+    def _done(self, rows: List[Dict[str, Any]]) -> None:
+        # Las filas cuentan como terminadas cuando están en la base de datos o en disco
+        for _ in rows:
+            self._queue.task_done()
+
+    def _write(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Insertar un lote con reintentos y backoff exponencial; devuelve las filas aún pendientes"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                self._insert_batch(rows)
+                with self._lock:
+                    self.inserted += len(rows)
+                    self.batches += 1
+                return []
+            except Exception as e:
+                print(f"Analysis writer error (intento {attempt + 1}): {e}")
+                if _is_permanent(e):
+                    return self._isolate(rows, e)
+                if attempt == self.max_retries:
+                    break
+                with self._lock:
+                    self.retries += 1
+                # Al apagar no se espera: se reintenta de inmediato y se vuelca a disco
+                self._stop.wait(min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        return rows
+
+    def _isolate(self, rows: List[Dict[str, Any]], error: Exception) -> List[Dict[str, Any]]:
+        """Lote rechazado: se reintenta fila a fila y las rechazadas van al dead-letter"""
+        if len(rows) == 1:
+            self._reject(rows[0], error)
+            return []
+        for index, row in enumerate(rows):
+            if self._write([row]):
+                # Error transitorio: esta fila y las siguientes siguen pendientes
+                return rows[index:]
+        return []
+
+    def _flush_loop(self) -> None:
+        while True:
+            batch = self._collect()
+            if batch:
+                pending = self._write(batch)
+                written = not pending
+                if pending:
+                    self._spill(pending)
+                self._done(batch)
+                if written and not self._stop.is_set():
+                    self._maybe_replay()
+            elif self._stop.is_set():
+                break
+            else:
+                self._maybe_replay()
+
+    # --- Journal en disco ------------------------------------------------------
+
+    def _journal_path(self) -> str:
+        return os.path.join(self.journal_dir, f'{self.table}-{os.getpid()}.jsonl')
+
+    def _spill(self, rows: List[Dict[str, Any]]) -> None:
+        """Añadir filas al journal del proceso (una fila JSON por línea)"""
+        with self._journal_lock:
+            with open(self._journal_path(), 'a', encoding='utf-8') as journal:
+                for row in rows:
+                    journal.write(json.dumps(row, ensure_ascii=False, default=str) + '\n')
+                journal.flush()
+                os.fsync(journal.fileno())
+        with self._lock:
+            self.spilled += len(rows)
+        print(f"Analysis writer: {len(rows)} filas guardadas en el journal")
+
+    def _reject(self, row: Dict[str, Any], error: Exception) -> None:
+        """Apartar una fila rechazada por la base de datos (no se vuelve a reintentar)"""
+        directory = os.path.join(self.journal_dir, 'rejected')
+        os.makedirs(directory, exist_ok=True)
+        entry = {'row': row, 'error': str(error), 'rejected_at': time.time()}
+        with self._journal_lock:
+            with open(os.path.join(directory, f'{self.table}.jsonl'), 'a', encoding='utf-8') as dead_letter:
+                dead_letter.write(json.dumps(entry, ensure_ascii=False, default=str) + '\n')
+                dead_letter.flush()
+                os.fsync(dead_letter.fileno())
+        with self._lock:
+            self.rejected += 1
+        print(f"Analysis writer: fila {row.get('id')} rechazada ({error})")
+
+    def _maybe_replay(self) -> None:
+        now = time.monotonic()
+        if now - self._last_replay < self.replay_interval:
+            return
+        self._last_replay = now
+        self._replay_journal()
+
+    def _pending_journals(self) -> List[str]:
+        """Journals propios y los de procesos que ya no existen (sin escritor activo)"""
+        pending = []
+        pattern = os.path.join(self.journal_dir, f'{self.table}-*.jsonl*')
+        for path in glob.glob(pattern):
+            # analyses-<pid escritor>.jsonl o analyses-<pid>.jsonl.replay-<pid que lo reclamó>
+            base, _, claim = os.path.basename(path).partition('.jsonl')
+            owner = int(claim.rsplit('-', 1)[1]) if claim else int(base.rsplit('-', 1)[1])
+            if (owner == os.getpid() and not claim) or not _pid_alive(owner):
+                pending.append(path)
+        return pending
+
+    def _replay_journal(self) -> None:
+        """Reinsertar journals pendientes (de este proceso o de procesos anteriores)"""
+        paths = self._pending_journals()
+        for path in paths:
+            # El rename es atómico: solo un proceso reclama cada journal
+            claimed = f"{path.split('.jsonl')[0]}.jsonl.replay-{os.getpid()}"
+            try:
+                with self._journal_lock:
+                    os.rename(path, claimed)
+            except OSError:
+                continue
+
+            with open(claimed, encoding='utf-8') as journal:
+                # Los journals anteriores a los ids de cliente no los llevan
+                rows = [_with_id(json.loads(line)) for line in journal if line.strip()]
+
+            for start in range(0, len(rows), self.batch_size):
+                chunk = rows[start:start + self.batch_size]
+                pending = self._write(chunk)
+                if pending:
+                    # La base de datos sigue caída: lo que falta vuelve al journal
+                    remaining = pending + rows[start + len(chunk):]
+                    self._spill(remaining)
+                    with self._lock:
+                        self.spilled -= len(remaining)
+                        self.replayed += len(chunk) - len(pending)
+                    os.remove(claimed)
+                    return
+                with self._lock:
+                    self.replayed += len(chunk)
+            os.remove(claimed)
+
+
+# Instancia global del persistidor de análisis
+analysis_writer = AnalysisWriter(
+    journal_dir=os.getenv('ANALYSIS_JOURNAL_DIR', os.path.join(os.path.dirname(__file__), '..', 'data', 'analysis_journal')),
+    max_queue=int(os.getenv('ANALYSIS_WRITER_QUEUE_SIZE', '1000')),
+    batch_size=int(os.getenv('ANALYSIS_WRITER_BATCH_SIZE', '50')),
+    flush_interval=float(os.getenv('ANALYSIS_WRITER_FLUSH_INTERVAL', '1.0')),
+    max_retries=int(os.getenv('ANALYSIS_WRITER_MAX_RETRIES', '3'))
+)
+atexit.register(analysis_writer.shutdown)
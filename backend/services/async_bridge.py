@@ -0,0 +1,117 @@
+"""
+Puente entre los handlers síncronos de Flask y el código asíncrono de los agentes.
+Mantiene un único event loop de larga vida en un hilo dedicado al que se envían
+corrutinas, en lugar de crear y cerrar un loop nuevo en cada petición.
+"""
+
+import os
+import asyncio
+import atexit
+import threading
+import concurrent.futures
+from typing import Any, AsyncIterator, Awaitable, Iterator, Optional
+
+
+class AsyncLoopBridge:
+    """Event loop persistente ejecutándose en un hilo en segundo plano"""
+
+    def __init__(self, name: str = 'anclora-async-loop', default_timeout: Optional[float] = None):
+        self.name = name
+        self.default_timeout = default_timeout
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """Loop en ejecución (se arranca bajo demanda)"""
+        return self._ensure_started()
+
+    def _ensure_started(self) -> asyncio.AbstractEventLoop:
+        """Arrancar el hilo del loop si no existe (o si el proceso se ha bifurcado)"""
+        loop = self._loop
+        if loop is not None and self._pid == os.getpid() and not loop.is_closed():
+            return loop
+
+        with self._lock:
+            if self._loop is not None and self._pid == os.getpid() and not self._loop.is_closed():
+                return self._loop
+
+            # Tras un fork el hilo del padre no existe en el hijo: se crea uno nuevo
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def _run():
+                asyncio.set_event_loop(loop)
+                loop.call_soon(ready.set)
+                loop.run_forever()
+
+            thread = threading.Thread(target=_run, name=self.name, daemon=True)
+            thread.start()
+            ready.wait()
+
+            self._loop = loop
+            self._thread = thread
+            self._pid = os.getpid()
+            return loop
+
+    def submit(self, coro: Awaitable[Any]) -> concurrent.futures.Future:
+        """Enviar una corrutina al loop y devolver un Future concurrente"""
+        loop = self._ensure_started()
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("No se puede esperar de forma síncrona desde el propio hilo del loop")
+        return asyncio.run_coroutine_threadsafe(coro, loop)
+
+    def run(self, coro: Awaitable[Any], timeout: Optional[float] = None) -> Any:
+        """Ejecutar una corrutina y esperar su resultado con un plazo máximo"""
+        if timeout is None:
+            timeout = self.default_timeout
+        future = self.submit(coro)
+        try:
+            return future.result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise TimeoutError(f"La operación asíncrona superó el plazo de {timeout}s")
+
+    def iterate(self, agen: AsyncIterator[Any], timeout: Optional[float] = None) -> Iterator[Any]:
+        """Consumir un generador asíncrono desde código síncrono, elemento a elemento"""
+        async def _next():
+            return await agen.__anext__()
+
+        try:
+            while True:
+                try:
+                    yield self.run(_next(), timeout)
+                except StopAsyncIteration:
+                    return
+        finally:
+            async def _close():
+                await agen.aclose()
+
+            try:
+                self.run(_close(), timeout)
+            except Exception:
+                pass
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        """Detener el loop y esperar a que termine el hilo"""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = None
+            self._thread = None
+            if loop is None or self._pid != os.getpid() or loop.is_closed():
+                return
+
+            loop.call_soon_threadsafe(loop.stop)
+            if thread is not None:
+                thread.join(timeout)
+            if not loop.is_running():
+                loop.close()
+
+
+# Instancia global del puente asíncrono
+async_bridge = AsyncLoopBridge(
+    default_timeout=float(os.getenv('ASYNC_BRIDGE_TIMEOUT', '60'))
+)
+atexit.register(async_bridge.shutdown)
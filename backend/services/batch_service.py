@@ -0,0 +1,115 @@
+"""
+Análisis por lotes: ejecuta muchos negocios a través del orquestador de agentes
+con paralelismo acotado y devuelve los resultados en orden de finalización,
+cada uno etiquetado con su índice en el lote.
+"""
+
+import os
+import json
+import queue
+import asyncio
+from typing import Any, Dict, Iterator, List, Optional
+
+from services.ai_agents import AIAgentOrchestrator, agent_orchestrator
+from services.async_bridge import async_bridge
+
+# Cada elemento es un análisis completo (o varias generaciones del LLM): lotes pequeños
+BATCH_MAX_ITEMS = int(os.getenv('BATCH_MAX_ITEMS', '50'))
+BATCH_MAX_PARALLEL = int(os.getenv('BATCH_MAX_PARALLEL', '8'))
+BATCH_ITEM_TIMEOUT = float(os.getenv('BATCH_ITEM_TIMEOUT', '120'))
+
+
+class BatchParseError(ValueError):
+    """El cuerpo del lote no es un array JSON ni NDJSON"""
+
+
+def parse_batch_body(body: str, mimetype: str = '') -> List[Any]:
+    """Leer un lote como array JSON o NDJSON (una línea inválida es un item con error)"""
+    text = body.strip()
+    if not text:
+        raise BatchParseError("El lote está vacío")
+
+    if text.startswith('[') and mimetype != 'application/x-ndjson':
+        try:
+            items = json.loads(text)
+        except ValueError as e:
+            raise BatchParseError(f"Array JSON inválido: {e}")
+    else:
+        items = []
+        for line in text.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError as e:
+                items.append(BatchParseError(f"Línea NDJSON inválida: {e}"))
+
+    if len(items) > BATCH_MAX_ITEMS:
+        raise BatchParseError(f"El lote supera el máximo de {BATCH_MAX_ITEMS} elementos")
+    return items
+
+
+def to_business_data(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Mapear un item (n8n en snake_case o el formulario del frontend en camelCase) a business_data
+    (campos ausentes -> '')"""
+    return {
+        'business_type': item.get('business_type') or item.get('businessType') or '',
+        'business_name': item.get('business_name') or item.get('businessName') or '',
+        'website': item.get('website') or '',
+        'description': item.get('description') or '',
+        'challenges': (item.get('challenges') or item.get('current_challenges')
+                       or item.get('currentChallenges') or ''),
+        'goals': item.get('goals') or ''
+    }
+
+
+async def _run_batch(items: List[Any], results: 'queue.Queue', orchestrator: AIAgentOrchestrator,
+                     max_parallel: int, scope: Optional[str]) -> None:
+    semaphore = asyncio.Semaphore(max(1, max_parallel))
+
+    async def analyze_item(index: int, item: Any) -> None:
+        if isinstance(item, Exception):
+            results.put({'index': index, 'status': 'error', 'error': str(item)})
+            return
+        if not isinstance(item, dict):
+            results.put({'index': index, 'status': 'error', 'error': 'Cada elemento debe ser un objeto JSON'})
+            return
+
+        async with semaphore:
+            try:
+                result = await asyncio.wait_for(
+                    orchestrator.analyze_business_comprehensive(to_business_data(item), scope=scope),
+                    BATCH_ITEM_TIMEOUT
+                )
+                results.put({'index': index, 'status': 'ok', 'result': result})
+            except Exception as e:
+                results.put({'index': index, 'status': 'error', 'error': str(e) or type(e).__name__})
+
+    await asyncio.gather(*[analyze_item(index, item) for index, item in enumerate(items)])
+
+
+def analyze_batch(items: List[Any], max_parallel: Optional[int] = None,
+                  orchestrator: Optional[AIAgentOrchestrator] = None,
+                  scope: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """Generar los resultados del lote en orden de finalización (scope: usuario que lo envía)"""
+    results: 'queue.Queue' = queue.Queue()
+    future = async_bridge.submit(_run_batch(
+        items, results, orchestrator or agent_orchestrator,
+        min(max_parallel or BATCH_MAX_PARALLEL, BATCH_MAX_PARALLEL), scope
+    ))
+
+    remaining = len(items)
+    try:
+        while remaining:
+            try:
+                line = results.get(timeout=1.0)
+            except queue.Empty:
+                if future.done():
+                    break
+                continue
+            remaining -= 1
+            yield line
+    finally:
+        # Si el cliente se desconecta se cancelan los análisis pendientes
+        future.cancel()
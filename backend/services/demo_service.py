@@ -0,0 +1,204 @@
+"""
+Construcción de la respuesta de análisis demo (sin autenticación).
+Compartida por la API Flask (app.py) y el modo de servicio asíncrono (asgi.py)
+para que ambos devuelvan exactamente el mismo contrato JSON.
+
+Sólo business_name, el resumen y generated_at (y business_type en el análisis
+genérico) cambian entre peticiones: DemoResponseRenderer serializa cada
+plantilla una vez al arrancar y en cada petición sólo codifica esos campos y
+los empalma en los bytes ya generados.
+"""
+
+import datetime
+from typing import Any, Callable, Dict, List, Tuple
+
+# Plantillas demo por tipo de negocio ('default' para el resto de tipos).
+# No deben modificarse: build_demo_analysis comparte sus listas anidadas.
+_DEMO_TEMPLATES: Dict[str, Dict[str, Any]] = {
+    'saas': {
+        'business_type': 'saas',
+        'score': 75,
+        'summary': "Análisis completado para {name}. Identificamos oportunidades clave para optimizar métricas de SaaS.",
+        'recommendations': [
+            {
+                'category': 'Reducción de Churn',
+                'priority': 'Alta',
+                'impact': '30% reducción en cancelaciones',
+                'actions': [
+                    'Implementar sistema de alertas tempranas de churn',
+                    'Crear programa de customer success proactivo',
+                    'Desarrollar feature adoption tracking y nudges'
+                ]
+            },
+            {
+                'category': 'Crecimiento de MRR',
+                'priority': 'Alta',
+                'impact': '25% aumento en revenue mensual',
+                'actions': [
+                    'Optimizar pricing basado en valor',
+                    'Implementar upselling automatizado',
+                    'Crear tiers premium con features avanzadas'
+                ]
+            }
+        ],
+        'kpis': [
+            {'name': 'MRR Growth', 'current': '12%', 'target': '20%', 'improvement': '+67%'},
+            {'name': 'Churn Rate', 'current': '7.2%', 'target': '4.5%', 'improvement': '-38%'},
+            {'name': 'CAC Payback', 'current': '8.2 meses', 'target': '5.1 meses', 'improvement': '-38%'},
+            {'name': 'NPS Score', 'current': '42', 'target': '65', 'improvement': '+55%'}
+        ],
+        'timeline': '3-6 meses para implementación completa',
+        'estimated_roi': '185%'
+    },
+    'ecommerce': {
+        'business_type': 'ecommerce',
+        'score': 68,
+        'summary': "Análisis completado para {name}. Identificamos oportunidades para optimizar conversiones y AOV.",
+        'recommendations': [
+            {
+                'category': 'Optimización de Conversión',
+                'priority': 'Alta',
+                'impact': '35% aumento en conversiones',
+                'actions': [
+                    'Implementar abandoned cart recovery con secuencia de emails',
+                    'Optimizar checkout process reduciendo pasos a 2-3',
+                    'Agregar reviews y ratings prominentes en product pages'
+                ]
+            },
+            {
+                'category': 'Customer Experience',
+                'priority': 'Alta',
+                'impact': '40% aumento en repeat purchases',
+                'actions': [
+                    'Implementar chatbot para soporte 24/7',
+                    'Crear programa de loyalty con rewards',
+                    'Personalizar product recommendations con ML'
+                ]
+            }
+        ],
+        'kpis': [
+            {'name': 'Conversion Rate', 'current': '1.8%', 'target': '2.9%', 'improvement': '+61%'},
+            {'name': 'Average Order Value', 'current': '$67', 'target': '$89', 'improvement': '+33%'},
+            {'name': 'Cart Abandonment', 'current': '69%', 'target': '52%', 'improvement': '-25%'},
+            {'name': 'Customer LTV', 'current': '$156', 'target': '$218', 'improvement': '+40%'}
+        ],
+        'timeline': '2-4 meses para implementación completa',
+        'estimated_roi': '165%'
+    },
+    # Análisis genérico para otros tipos (business_type se copia de la petición)
+    'default': {
+        'score': 68,
+        'summary': "Análisis completado para {name}. Identificamos oportunidades de crecimiento.",
+        'recommendations': [
+            {
+                'category': 'Optimización Digital',
+                'priority': 'Alta',
+                'impact': '30% mejora en presencia online',
+                'actions': [
+                    'Mejorar SEO y presencia online',
+                    'Implementar analytics y tracking',
+                    'Optimizar experiencia del cliente'
+                ]
+            }
+        ],
+        'kpis': [
+            {'name': 'Crecimiento Revenue', 'current': '8%', 'target': '15%', 'improvement': '+88%'},
+            {'name': 'Satisfacción Cliente', 'current': '7.2/10', 'target': '8.5/10', 'improvement': '+18%'}
+        ],
+        'timeline': '2-4 meses para implementación',
+        'estimated_roi': '165%'
+    }
+}
+
+
+def _template_key(business_type: Any) -> str:
+    # Comparación por igualdad (como antes): business_type puede ser cualquier valor JSON
+    if business_type == 'saas':
+        return 'saas'
+    if business_type == 'ecommerce':
+        return 'ecommerce'
+    return 'default'
+
+
+def _fill(template: Dict[str, Any], business_type: Any, business_name: Any, summary: Any, generated_at: Any) -> Dict[str, Any]:
+    """Documento demo con los campos variables dados, en el orden de claves original"""
+    return {
+        'business_type': template.get('business_type', business_type),
+        'business_name': business_name,
+        'score': template['score'],
+        'summary': summary,
+        'recommendations': template['recommendations'],
+        'kpis': template['kpis'],
+        'timeline': template['timeline'],
+        'estimated_roi': template['estimated_roi'],
+        'is_demo': True,
+        'generated_at': generated_at
+    }
+
+
+def build_demo_analysis(business_type: str, business_name: str) -> Dict[str, Any]:
+    """Generar el análisis demo para un tipo de negocio"""
+    template = _DEMO_TEMPLATES[_template_key(business_type)]
+    return _fill(
+        template, business_type, business_name,
+        template['summary'].format(name=business_name),
+        datetime.datetime.utcnow().isoformat()
+    )
+
+
+class DemoResponseRenderer:
+    """Cuerpos de respuesta demo pre-serializados con huecos para los campos variables"""
+
+    # Marcadores que no pueden aparecer en el texto fijo de las plantillas
+    _SLOTS = {
+        'business_type': '\x00business_type\x00',
+        'business_name': '\x00business_name\x00',
+        'summary': '\x00summary\x00',
+        'generated_at': '\x00generated_at\x00'
+    }
+
+    def __init__(self, render: Callable[[Any], bytes], encode: Callable[[Any], bytes]):
+        # render: documento -> cuerpo completo; encode: valor -> JSON del valor.
+        # Deben ser el mismo serializador que usaría la respuesta normal.
+        self._encode = encode
+        self._compiled = {key: self._compile(key, render) for key in _DEMO_TEMPLATES}
+
+    def _compile(self, key: str, render: Callable[[Any], bytes]) -> Tuple[List[bytes], List[str]]:
+        template = _DEMO_TEMPLATES[key]
+        slots = self._SLOTS
+        body = render(_fill(template, slots['business_type'], slots['business_name'],
+                            slots['summary'], slots['generated_at']))
+
+        markers = {self._encode(marker): name for name, marker in slots.items()}
+        chunks: List[bytes] = []
+        order: List[str] = []
+        position = 0
+        while True:
+            found = [(body.find(marker, position), marker) for marker in markers]
+            found = [(index, marker) for index, marker in found if index >= 0]
+            if not found:
+                break
+            index, marker = min(found)
+            chunks.append(body[position:index])
+            order.append(markers[marker])
+            position = index + len(marker)
+        chunks.append(body[position:])
+        return chunks, order
+
+    def render(self, business_type: Any, business_name: Any) -> bytes:
+        """Mismos bytes que serializar build_demo_analysis(business_type, business_name)"""
+        key = _template_key(business_type)
+        chunks, order = self._compiled[key]
+        encode = self._encode
+        values = {
+            'business_type': encode(business_type) if 'business_type' in order else b'',
+            'business_name': encode(business_name),
+            'summary': encode(_DEMO_TEMPLATES[key]['summary'].format(name=business_name)),
+            # isoformat() sólo produce dígitos, '-', ':', '.' y 'T': no necesita escape
+            'generated_at': b'"' + datetime.datetime.utcnow().isoformat().encode('ascii') + b'"'
+        }
+        parts = [chunks[0]]
+        for name, chunk in zip(order, chunks[1:]):
+            parts.append(values[name])
+            parts.append(chunk)
+        return b''.join(parts)
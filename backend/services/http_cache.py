@@ -0,0 +1,72 @@
+"""
+ETags, GET condicionales y compresión para las respuestas JSON de análisis.
+Cada respuesta lleva un ETag fuerte calculado del contenido (distinto por
+codificación) y `Cache-Control: private, no-cache`, de modo que el navegador
+(y el service worker de la PWA) revalida con If-None-Match y recibe un 304
+sin cuerpo si nada cambió. Los cuerpos grandes se comprimen con brotli (si
+está instalado) o gzip.
+"""
+
+import os
+import gzip
+import hashlib
+from functools import wraps
+from typing import Optional
+
+from flask import Response, make_response, request
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional: sin él se usa gzip
+    brotli = None
+
+COMPRESSION_MIN_BYTES = int(os.getenv('HTTP_COMPRESSION_MIN_BYTES', '1024'))
+GZIP_LEVEL = int(os.getenv('HTTP_GZIP_LEVEL', '6'))
+BROTLI_QUALITY = int(os.getenv('HTTP_BROTLI_QUALITY', '5'))
+
+
+def negotiate_encoding(size: int) -> Optional[str]:
+    """Codificación a usar según Accept-Encoding y el tamaño del cuerpo"""
+    if size < COMPRESSION_MIN_BYTES:
+        return None
+    accepted = request.accept_encodings
+    if brotli is not None and accepted.quality('br') > 0:
+        return 'br'
+    if accepted.quality('gzip') > 0:
+        return 'gzip'
+    return None
+
+
+def compress_body(body: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    # mtime=0 para que el mismo contenido produzca siempre los mismos bytes
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def conditional_json(f):
+    """Decorador: ETag fuerte, 304 con If-None-Match y compresión de la respuesta"""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        response = make_response(f(*args, **kwargs))
+        if request.method not in ('GET', 'HEAD') or response.status_code != 200 or response.direct_passthrough:
+            return response
+
+        body = response.get_data()
+        encoding = negotiate_encoding(len(body))
+        etag = hashlib.sha256(body).hexdigest()[:32] + (f'-{encoding}' if encoding else '')
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.vary.add('Accept-Encoding')
+
+        if request.if_none_match.contains_weak(etag):
+            not_modified = Response(status=304)
+            for header in ('ETag', 'Cache-Control', 'Vary'):
+                not_modified.headers[header] = response.headers[header]
+            return not_modified
+
+        if encoding:
+            response.set_data(compress_body(body, encoding))
+            response.content_encoding = encoding
+        return response
+    return decorated
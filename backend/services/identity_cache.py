@@ -0,0 +1,250 @@
+"""
+Caché en proceso de identidades verificadas para token_required.
+Evita un round trip a Supabase (auth.get_user) en cada petición protegida:
+la entrada se indexa por el hash del token y caduca en el `exp` del token o
+tras un TTL configurable más corto, lo que ocurra antes.
+
+Las revocaciones (logout) se guardan en un fichero SQLite compartido por
+todos los workers de gunicorn: cada proceso relee las nuevas como mucho cada
+`sync_interval` segundos, así que un token revocado deja de aceptarse en
+todos los workers en ese plazo. Lo mismo con las revocaciones por usuario
+(revoke_user): invalidan los tokens del usuario emitidos (`iat`) hasta ese
+momento.
+"""
+
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+
+def _token_key(token: str) -> str:
+    # Nunca se guarda el token en claro
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+# Vigencia de una revocación sin `exp` conocido (el máximo de un token con "remember me")
+_MAX_TOKEN_LIFETIME = 30 * 24 * 3600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS revoked_tokens (
+    token_hash TEXT PRIMARY KEY,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS revoked_users (
+    user_id TEXT PRIMARY KEY,
+    revoked_at REAL NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+
+
+class IdentityCache:
+    """Caché LRU acotada de usuarios verificados por token"""
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 300,
+                 revocation_path: Optional[str] = None, sync_interval: float = 1.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.revocation_path = revocation_path
+        self.sync_interval = sync_interval
+        self._entries: 'OrderedDict[str, Tuple[float, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+        # Revocaciones conocidas por este proceso (hash -> caducidad) y última fila leída
+        self._revoked: Dict[str, float] = {}
+        self._revoked_rowid = 0
+        # Revocaciones por usuario (id -> (momento de la revocación, caducidad)) y última fila leída
+        self._revoked_users: Dict[str, Tuple[float, float]] = {}
+        self._revoked_users_rowid = 0
+        self._synced_at = 0.0
+        self._pruned_at = 0.0
+        self._sync_pid: Optional[int] = None
+        self._local = threading.local()
+        self.hits = 0
+        self.misses = 0
+        self.revocations = 0
+        self._verify_seconds_total = 0.0
+        self._verify_count = 0
+
+        if revocation_path:
+            os.makedirs(os.path.dirname(os.path.abspath(revocation_path)), exist_ok=True)
+            self._connection().executescript(_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        """Conexión SQLite por hilo (y por proceso)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.revocation_path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _sync_revocations(self) -> None:
+        """Leer las revocaciones hechas por otros procesos (como mucho cada sync_interval)"""
+        now = time.monotonic()
+        if self._sync_pid == os.getpid() and now - self._synced_at < self.sync_interval:
+            return
+        try:
+            conn = self._connection()
+            rows = conn.execute(
+                "SELECT rowid, token_hash, expires_at FROM revoked_tokens WHERE rowid > ? ORDER BY rowid",
+                (self._revoked_rowid,)
+            ).fetchall()
+            user_rows = conn.execute(
+                "SELECT rowid, user_id, revoked_at, expires_at FROM revoked_users WHERE rowid > ? ORDER BY rowid",
+                (self._revoked_users_rowid,)
+            ).fetchall()
+        except sqlite3.Error as e:
+            print(f"Identity cache: no se pudieron leer las revocaciones: {e}")
+            return
+        with self._lock:
+            for rowid, key, expires_at in rows:
+                self._revoked[key] = expires_at
+                self._entries.pop(key, None)
+                self._revoked_rowid = max(self._revoked_rowid, rowid)
+            for rowid, user_id, revoked_at, expires_at in user_rows:
+                self._revoked_users[user_id] = (revoked_at, expires_at)
+                self._drop_user_entries(user_id)
+                self._revoked_users_rowid = max(self._revoked_users_rowid, rowid)
+            if now - self._pruned_at > 60:
+                # Olvidar revocaciones de tokens que ya caducaron
+                wall = time.time()
+                for key in [key for key, expires_at in self._revoked.items() if expires_at <= wall]:
+                    del self._revoked[key]
+                for user_id in [user_id for user_id, (_, expires_at) in self._revoked_users.items()
+                                if expires_at <= wall]:
+                    del self._revoked_users[user_id]
+                self._pruned_at = now
+            self._synced_at = now
+            self._sync_pid = os.getpid()
+
+    def is_revoked(self, token: str, claims: Optional[Dict[str, Any]] = None) -> bool:
+        """True si el token se revocó (en este o en otro worker) y aún no ha caducado.
+        Con los claims del JWT también se comprueban las revocaciones de su usuario"""
+        if self.revocation_path:
+            self._sync_revocations()
+        now = time.time()
+        with self._lock:
+            expires_at = self._revoked.get(_token_key(token))
+            if expires_at is not None and expires_at > now:
+                return True
+            revoked_user = self._revoked_users.get(str(claims.get('user_id'))) if claims else None
+            if revoked_user is None or revoked_user[1] <= now:
+                return False
+            # Los tokens sin `iat` son anteriores a cualquier revocación
+            return float(claims.get('iat') or 0) <= revoked_user[0]
+
+    def get(self, token: str) -> Optional[Any]:
+        """Usuario verificado para el token, o None si no está, caducó o se revocó"""
+        if self.is_revoked(token):
+            return None
+        key = _token_key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.time():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, token: str, user: Any, token_exp: Optional[float] = None,
+            verify_seconds: Optional[float] = None) -> None:
+        """Guardar el usuario verificado hasta min(exp del token, ahora + TTL)"""
+        now = time.time()
+        expires_at = now + self.ttl_seconds
+        if token_exp is not None:
+            expires_at = min(expires_at, float(token_exp))
+
+        with self._lock:
+            if verify_seconds is not None:
+                self._verify_seconds_total += verify_seconds
+                self._verify_count += 1
+            key = _token_key(token)
+            if expires_at <= now or self.max_entries <= 0 or key in self._revoked:
+                return
+            self._entries[key] = (expires_at, user)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def revoke(self, token: str, token_exp: Optional[float] = None) -> bool:
+        """Revocar el token en todos los workers hasta su `exp` (True si estaba en la caché)"""
+        key = _token_key(token)
+        now = time.time()
+        expires_at = float(token_exp) if token_exp is not None else now + _MAX_TOKEN_LIFETIME
+        if self.revocation_path:
+            conn = self._connection()
+            conn.execute("INSERT OR REPLACE INTO revoked_tokens (token_hash, expires_at) VALUES (?, ?)",
+                         (key, expires_at))
+            # Las revocaciones de tokens ya caducados no hacen falta
+            conn.execute("DELETE FROM revoked_tokens WHERE expires_at < ?", (now,))
+        with self._lock:
+            self._revoked[key] = expires_at
+            removed = self._entries.pop(key, None) is not None
+            self.revocations += 1
+            return removed
+
+    def revoke_user(self, user_id: str) -> int:
+        """Revocar en todos los workers los tokens ya emitidos de un usuario (p. ej. tras cambiar la
+        contraseña); devuelve cuántas entradas se expulsaron de la caché de este proceso"""
+        now = time.time()
+        expires_at = now + _MAX_TOKEN_LIFETIME
+        if self.revocation_path:
+            conn = self._connection()
+            conn.execute("INSERT OR REPLACE INTO revoked_users (user_id, revoked_at, expires_at) VALUES (?, ?, ?)",
+                         (str(user_id), now, expires_at))
+            conn.execute("DELETE FROM revoked_users WHERE expires_at < ?", (now,))
+        with self._lock:
+            self._revoked_users[str(user_id)] = (now, expires_at)
+            removed = self._drop_user_entries(str(user_id))
+            self.revocations += removed
+            return removed
+
+    def _drop_user_entries(self, user_id: str) -> int:
+        # Con el lock tomado
+        keys = [key for key, (_, user) in self._entries.items()
+                if str(getattr(user, 'id', None)) == user_id]
+        for key in keys:
+            del self._entries[key]
+        return len(keys)
+
+    def clear(self) -> None:
+        """Vaciar la caché (las revocaciones se mantienen)"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Métricas de uso y latencia ahorrada"""
+        with self._lock:
+            total = self.hits + self.misses
+            avg_verify = self._verify_seconds_total / self._verify_count if self._verify_count else 0.0
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'revocations': self.revocations,
+                'revoked_tokens': len(self._revoked),
+                'revoked_users': len(self._revoked_users),
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+                'avg_verify_ms': round(avg_verify * 1000, 2),
+                'estimated_saved_ms': round(self.hits * avg_verify * 1000, 2)
+            }
+
+
+# Instancia global de la caché de identidades
+identity_cache = IdentityCache(
+    max_entries=int(os.getenv('IDENTITY_CACHE_SIZE', '10000')),
+    ttl_seconds=float(os.getenv('IDENTITY_CACHE_TTL', '300')),
+    revocation_path=os.getenv('IDENTITY_REVOCATION_PATH', os.path.join(os.path.dirname(__file__), '..', 'data', 'revoked_tokens.sqlite3')),
+    sync_interval=float(os.getenv('IDENTITY_REVOCATION_SYNC', '1.0'))
+)
@@ -0,0 +1,295 @@
+"""
+Cola de trabajos de análisis asíncronos persistida en SQLite.
+Enviar un análisis devuelve un job ID al instante; un pool configurable de
+workers ejecuta el orquestador y los clientes consultan (o esperan con
+long-polling) el estado y el resultado. Los trabajos pendientes sobreviven a
+un reinicio y no hace falta ningún broker externo.
+
+Un trabajo en curso tiene un lease de `lease_seconds` que un hilo de
+mantenimiento por proceso renueva periódicamente (heartbeat); si el proceso
+cae, el lease vence y el mismo hilo de cualquier otro proceso lo reencola.
+Los workers ociosos sólo consultan la cola: no escriben en SQLite.
+
+Cada trabajo guarda su propietario (el usuario que lo envió): sólo él puede
+consultarlo y su análisis se ejecuta en su ámbito de la caché semántica.
+"""
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Set
+
+JOB_STATUSES = ('queued', 'running', 'done', 'failed')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    owner TEXT,
+    status TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs (status, created_at);
+"""
+
+
+class JobQueue:
+    """Cola de trabajos durable con workers en hilos"""
+
+    def __init__(self, db_path: str, workers: int = 2, poll_interval: float = 1.0,
+                 max_attempts: int = 3, lease_seconds: float = 300,
+                 retention_seconds: float = 7 * 24 * 3600):
+        self.db_path = db_path
+        self.workers = max(1, workers)
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self.retention_seconds = retention_seconds
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._pid: Optional[int] = None
+        # Trabajos que ejecuta este proceso (para renovar su lease)
+        self._running: Set[str] = set()
+
+        directory = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        conn.executescript(_SCHEMA)
+        # Colas creadas antes de guardar el propietario
+        if 'owner' not in {row['name'] for row in conn.execute('PRAGMA table_info(jobs)')}:
+            conn.execute('ALTER TABLE jobs ADD COLUMN owner TEXT')
+
+    def _connection(self) -> sqlite3.Connection:
+        """Conexión SQLite por hilo (y por proceso)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    # --- API pública -----------------------------------------------------------
+
+    def ensure_started(self) -> None:
+        """Arrancar los workers en este proceso si aún no están en marcha"""
+        if self._pid == os.getpid() and self._threads:
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._threads:
+                return
+            self._stop.clear()
+            self._running = set()
+            self._recover_interrupted()
+            self._purge_finished()
+            self._threads = [
+                threading.Thread(target=self._worker_loop, name=f'anclora-job-{i}', daemon=True)
+                for i in range(self.workers)
+            ]
+            self._threads.append(
+                threading.Thread(target=self._maintenance_loop, name='anclora-job-maintenance', daemon=True)
+            )
+            for thread in self._threads:
+                thread.start()
+            self._pid = os.getpid()
+
+    def submit(self, payload: Dict[str, Any], owner: Optional[str] = None) -> str:
+        """Encolar un análisis de `owner` y devolver su job ID"""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        self._connection().execute(
+            "INSERT INTO jobs (id, owner, status, payload, created_at, updated_at) VALUES (?, ?, 'queued', ?, ?, ?)",
+            (job_id, owner, json.dumps(payload, ensure_ascii=False), now, now)
+        )
+        with self._wakeup:
+            self._wakeup.notify()
+        return job_id
+
+    def get(self, job_id: str, owner: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Estado (y resultado si ha terminado) de un trabajo; con owner, None si es de otro usuario"""
+        row = self._connection().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None or (owner is not None and row['owner'] != owner):
+            return None
+
+        job = {
+            'job_id': row['id'],
+            'status': row['status'],
+            'attempts': row['attempts'],
+            'created_at': row['created_at'],
+            'updated_at': row['updated_at']
+        }
+        if row['status'] == 'queued':
+            job['queue_position'] = self._connection().execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND created_at <= ?", (row['created_at'],)
+            ).fetchone()[0]
+        if row['result'] is not None:
+            job['result'] = json.loads(row['result'])
+        if row['error'] is not None:
+            job['error'] = row['error']
+        return job
+
+    def wait(self, job_id: str, timeout: float, owner: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Long-polling: esperar hasta que el trabajo termine o venza el plazo"""
+        deadline = time.monotonic() + max(0.0, timeout)
+        while True:
+            job = self.get(job_id, owner)
+            remaining = deadline - time.monotonic()
+            if job is None or job['status'] in ('done', 'failed') or remaining <= 0:
+                return job
+            # Otros procesos también pueden completar el trabajo: se re-consulta
+            with self._wakeup:
+                self._wakeup.wait(min(self.poll_interval, remaining))
+
+    def stats(self) -> Dict[str, int]:
+        """Número de trabajos por estado"""
+        rows = self._connection().execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        counts = {status: 0 for status in JOB_STATUSES}
+        counts.update({row['status']: row['n'] for row in rows})
+        return counts
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        """Detener los workers (los trabajos en curso se reanudan al reiniciar)"""
+        self._stop.set()
+        with self._wakeup:
+            self._wakeup.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    # --- Workers ---------------------------------------------------------------
+
+    def _recover_interrupted(self) -> None:
+        """Reencolar trabajos 'running' cuyo lease venció (el proceso que los tenía cayó)"""
+        conn = self._connection()
+        now = time.time()
+        expired = now - self.lease_seconds
+        # Comprobación de sólo lectura: sin leases vencidos no se toma el lock de escritura
+        if conn.execute("SELECT 1 FROM jobs WHERE status = 'running' AND updated_at < ? LIMIT 1",
+                        (expired,)).fetchone() is None:
+            return
+        conn.execute(
+            "UPDATE jobs SET status = 'failed', error = 'Máximo de reintentos alcanzado', updated_at = ? "
+            "WHERE status = 'running' AND updated_at < ? AND attempts >= ?", (now, expired, self.max_attempts)
+        )
+        conn.execute(
+            "UPDATE jobs SET status = 'queued', updated_at = ? WHERE status = 'running' AND updated_at < ?",
+            (now, expired)
+        )
+
+    def _purge_finished(self) -> None:
+        self._connection().execute(
+            "DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?",
+            (time.time() - self.retention_seconds,)
+        )
+
+    def _heartbeat(self) -> None:
+        """Renovar el lease de los trabajos que ejecuta este proceso"""
+        with self._lock:
+            running = list(self._running)
+        if running:
+            self._connection().execute(
+                f"UPDATE jobs SET updated_at = ? WHERE status = 'running' AND id IN ({','.join('?' * len(running))})",
+                (time.time(), *running)
+            )
+
+    def _maintenance_loop(self) -> None:
+        # Heartbeat tres veces por lease; recuperación de leases vencidos cada medio lease
+        interval = max(0.1, self.lease_seconds / 3)
+        last_recovery = time.monotonic()
+        while not self._stop.wait(interval):
+            try:
+                self._heartbeat()
+                if time.monotonic() - last_recovery >= self.lease_seconds / 2:
+                    self._recover_interrupted()
+                    last_recovery = time.monotonic()
+            except sqlite3.OperationalError as e:
+                print(f"Job queue error: {e}")
+
+    def _claim_next(self) -> Optional[sqlite3.Row]:
+        """Reclamar de forma atómica el trabajo más antiguo en cola"""
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                "SELECT id, owner, payload FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                    (time.time(), row['id'])
+                )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        if row is not None:
+            with self._lock:
+                self._running.add(row['id'])
+        return row
+
+    def _finish(self, job_id: str, result: Optional[Dict[str, Any]] = None, error: Optional[str] = None) -> None:
+        status = 'failed' if error is not None else 'done'
+        try:
+            self._connection().execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ? WHERE id = ?",
+                (status, json.dumps(result, ensure_ascii=False) if result is not None else None,
+                 error, time.time(), job_id)
+            )
+        finally:
+            # Sin heartbeat, si no se pudo guardar el lease vence y otro worker lo reintenta
+            with self._lock:
+                self._running.discard(job_id)
+        with self._wakeup:
+            self._wakeup.notify_all()
+
+    def _run_job(self, payload: Dict[str, Any], owner: Optional[str] = None) -> Dict[str, Any]:
+        from services.ai_agents import agent_orchestrator
+        from services.async_bridge import async_bridge
+
+        return async_bridge.run(agent_orchestrator.analyze_business_comprehensive(payload, scope=owner))
+
+    def _worker_loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                row = self._claim_next()
+            except sqlite3.OperationalError as e:
+                print(f"Job queue error: {e}")
+                row = None
+
+            if row is None:
+                with self._wakeup:
+                    self._wakeup.wait(self.poll_interval)
+                continue
+
+            try:
+                result = self._run_job(json.loads(row['payload']), row['owner'])
+                self._finish(row['id'], result=result)
+            except Exception as e:
+                print(f"Job {row['id']} failed: {e}")
+                try:
+                    self._finish(row['id'], error=str(e) or type(e).__name__)
+                except Exception as finish_error:
+                    # El worker sigue vivo; sin heartbeat el lease vence y el trabajo se reencola
+                    print(f"Job queue error: {finish_error}")
+
+
+# Instancia global de la cola de trabajos
+job_queue = JobQueue(
+    db_path=os.getenv('JOB_DB_PATH', os.path.join(os.path.dirname(__file__), '..', 'data', 'jobs.sqlite3')),
+    workers=int(os.getenv('JOB_WORKERS', '2')),
+    poll_interval=float(os.getenv('JOB_POLL_INTERVAL', '1.0')),
+    max_attempts=int(os.getenv('JOB_MAX_ATTEMPTS', '3')),
+    lease_seconds=float(os.getenv('JOB_LEASE_SECONDS', '300'))
+)
@@ -0,0 +1,83 @@
+"""
+Proveedor JSON de Flask basado en orjson.
+Los documentos de análisis son árboles profundos con muchas cadenas y
+codificarlos con el módulo json de la biblioteca estándar aparece en los
+perfiles. orjson escribe directamente bytes UTF-8, ordena claves y serializa
+datetime/date en ISO 8601 de forma nativa. Si orjson no está instalado (o no
+puede con un valor, p. ej. enteros de más de 64 bits) se usa el proveedor
+por defecto de Flask con el mismo formato de fechas.
+"""
+
+import dataclasses
+import datetime
+import decimal
+import uuid
+from collections.abc import Mapping
+from typing import Any
+
+from flask import Response
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional: sin él se usa json de la biblioteca estándar
+    orjson = None
+
+
+def _default(obj: Any) -> Any:
+    """Tipos que ni orjson ni json serializan por sí mismos"""
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, (decimal.Decimal, uuid.UUID)):
+        return str(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, Mapping):
+        return dict(obj)
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return dataclasses.asdict(obj)
+    if hasattr(obj, '__html__'):
+        return str(obj.__html__())
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Proveedor JSON con orjson y respaldo en el de la biblioteca estándar"""
+
+    default = staticmethod(_default)
+    # orjson escribe UTF-8 sin escapar: el respaldo hace lo mismo
+    ensure_ascii = False
+
+    def _options(self, indent: bool = False) -> int:
+        option = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def dumps_bytes(self, obj: Any, indent: bool = False) -> bytes:
+        """Serializar a bytes UTF-8 (sin pasar por str cuando hay orjson)"""
+        if orjson is not None:
+            try:
+                return orjson.dumps(obj, default=self.default, option=self._options(indent))
+            except orjson.JSONEncodeError:
+                pass
+        kwargs = {'indent': 2} if indent else {'separators': (',', ':')}
+        return super().dumps(obj, **kwargs).encode('utf-8')
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        if orjson is None or kwargs:
+            # Argumentos propios de json.dumps: se respeta el comportamiento de Flask
+            return super().dumps(obj, **kwargs)
+        return self.dumps_bytes(obj).decode('utf-8')
+
+    def loads(self, s: Any, **kwargs: Any) -> Any:
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args: Any, **kwargs: Any) -> Response:
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        return self._app.response_class(self.dumps_bytes(obj, indent=indent) + b'\n', mimetype=self.mimetype)
@@ -0,0 +1,137 @@
+"""
+Matcher de keywords multi-patrón (Aho–Corasick) para las heurísticas de texto.
+Un único autómata compilado al importar contiene todas las familias de keywords
+(incluidas frases de varias palabras) y encuentra todas las coincidencias en
+una sola pasada sobre el texto normalizado (minúsculas, sin acentos ni
+puntuación).
+"""
+
+import re
+import unicodedata
+from collections import deque
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+# Keywords relevantes para análisis de negocio (BusinessAnalysisAI)
+BUSINESS_KEYWORDS = (
+    'tráfico', 'visitas', 'seo', 'conversión', 'ventas', 'clientes',
+    'competencia', 'precios', 'marketing', 'publicidad', 'redes sociales',
+    'email', 'contenido', 'blog', 'landing', 'website', 'móvil',
+    'retención', 'churn', 'satisfacción', 'experiencia', 'soporte',
+    'producto', 'servicio', 'calidad', 'innovación', 'tecnología',
+    'costos', 'ingresos', 'rentabilidad', 'crecimiento', 'escalabilidad'
+)
+
+# Keywords de pain points del cliente (CustomerAnalysisAgent)
+PAIN_POINT_KEYWORDS = (
+    'churn', 'conversión', 'retención', 'satisfacción',
+    'soporte', 'onboarding', 'precio', 'competencia'
+)
+
+# Keywords de etapa del negocio (GrowthStrategyAgent)
+BUSINESS_STAGE_KEYWORDS = ('mvp', 'validar', 'crecimiento', 'escalar', 'optimizar')
+
+_NON_WORD_RE = re.compile(r'[\W_]+')
+
+
+def normalize_text(text: Optional[str]) -> str:
+    """Minúsculas, sin acentos y con la puntuación convertida en espacios"""
+    if not text:
+        return ''
+    decomposed = unicodedata.normalize('NFKD', text.lower())
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return _NON_WORD_RE.sub(' ', stripped).strip()
+
+
+class KeywordMatcher:
+    """Autómata Aho–Corasick sobre varias familias de keywords"""
+
+    def __init__(self, families: Dict[str, Iterable[str]], whole_word: Iterable[str] = ()):
+        self.families = {name: tuple(keywords) for name, keywords in families.items()}
+        self.whole_word = frozenset(whole_word)
+
+        # patrones: (familia, keyword original, longitud normalizada)
+        self._patterns: List[Tuple[str, str, int]] = []
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[int]] = [[]]
+
+        for family, keywords in self.families.items():
+            for keyword in keywords:
+                self._add_pattern(family, keyword)
+        self._build_failure_links()
+
+    def _add_pattern(self, family: str, keyword: str) -> None:
+        normalized = normalize_text(keyword)
+        state = 0
+        for char in normalized:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        self._output[state].append(len(self._patterns))
+        self._patterns.append((family, keyword, len(normalized)))
+
+    def _build_failure_links(self) -> None:
+        # Los hijos de la raíz fallan a la raíz; el resto se resuelve en anchura
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def scan(self, text: Optional[str]) -> Mapping[str, Tuple[str, ...]]:
+        """Todas las coincidencias por familia (en orden de aparición, con repeticiones)"""
+        return _cached_scan(self, text or '')
+
+    def find(self, text: Optional[str], family: str) -> Tuple[str, ...]:
+        """Coincidencias de una familia concreta"""
+        return self.scan(text)[family]
+
+    def _scan(self, text: str) -> Mapping[str, Tuple[str, ...]]:
+        normalized = normalize_text(text)
+        matches: Dict[str, List[str]] = {family: [] for family in self.families}
+        goto, fail, output, patterns = self._goto, self._fail, self._output, self._patterns
+        last = len(normalized) - 1
+        state = 0
+
+        for index, char in enumerate(normalized):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for pattern_id in output[state]:
+                family, keyword, length = patterns[pattern_id]
+                if family in self.whole_word:
+                    start = index - length + 1
+                    if (start > 0 and normalized[start - 1] != ' ') or (index < last and normalized[index + 1] != ' '):
+                        continue
+                matches[family].append(keyword)
+
+        return MappingProxyType({family: tuple(found) for family, found in matches.items()})
+
+
+@lru_cache(maxsize=2048)
+def _cached_scan(matcher: KeywordMatcher, text: str) -> Mapping[str, Tuple[str, ...]]:
+    # Los mismos textos (desafíos, descripción) se analizan desde varios agentes
+    return matcher._scan(text)
+
+
+# Instancia global del matcher con todas las familias de keywords
+keyword_matcher = KeywordMatcher(
+    {
+        'business': BUSINESS_KEYWORDS,
+        'pain_points': PAIN_POINT_KEYWORDS,
+        'business_stage': BUSINESS_STAGE_KEYWORDS
+    },
+    whole_word=('business',)
+)
@@ -0,0 +1,258 @@
+"""
+Caché persistente de generaciones del LLM en un único fichero SQLite.
+Muchos prompts se repiten (tráfico de la demo, reintentos de n8n, las mismas
+preguntas por tipo de negocio): la respuesta se guarda comprimida bajo una
+clave derivada del modelo (huella del fichero GGUF), los parámetros de
+muestreo y el hash del prompt, y sobrevive a reinicios.
+
+El fichero se comparte entre los workers de gunicorn (WAL y conexiones por
+proceso e hilo) y se limita por tamaño: al superar el máximo se desalojan las
+entradas usadas hace más tiempo y se devuelve el espacio al sistema. Un
+acierto sólo lee: el uso (hits y last_used) se acumula en memoria y se escribe
+en una sola transacción cada `touch_interval` segundos, al guardar y antes de
+desalojar.
+"""
+
+import os
+import json
+import time
+import zlib
+import atexit
+import sqlite3
+import hashlib
+import threading
+from typing import Any, Dict, List, Optional
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS completions (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    compute_ms REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_completions_last_used ON completions (last_used);
+"""
+
+# Bytes aproximados de una fila además del texto comprimido (clave, índices, columnas)
+_ROW_OVERHEAD = 160
+
+
+def model_fingerprint(model_path: str, sample_bytes: int = 2 ** 20) -> str:
+    """Identificador del modelo: nombre más hash del tamaño y del principio y final del GGUF"""
+    digest = hashlib.sha256()
+    size = os.path.getsize(model_path)
+    digest.update(str(size).encode('ascii'))
+    with open(model_path, 'rb') as model_file:
+        # La cabecera incluye los metadatos y el vocabulario; el final, los últimos tensores
+        digest.update(model_file.read(sample_bytes))
+        model_file.seek(max(0, size - sample_bytes))
+        digest.update(model_file.read(sample_bytes))
+    return f"{os.path.basename(model_path)}:{digest.hexdigest()[:16]}"
+
+
+def completion_cache_key(model_id: str, prompt: str, sampling: Dict[str, Any]) -> str:
+    """Clave de la caché para un prompt, un modelo y unos parámetros de muestreo"""
+    prompt_hash = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+    raw = json.dumps([model_id, sampling, prompt_hash], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class CompletionCache:
+    """Generaciones del LLM persistidas en SQLite con desalojo LRU por tamaño"""
+
+    def __init__(self, db_path: str, max_bytes: int = 64 * 2 ** 20, touch_interval: float = 5.0):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.touch_interval = touch_interval
+        # Con tamaño 0 la caché queda desactivada
+        self.enabled = max_bytes > 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._ready_pid: Optional[int] = None
+        # Usos pendientes de escribir: clave -> [hits, último uso]
+        self._touched: Dict[str, List[float]] = {}
+        self._touched_pid: Optional[int] = None
+        self._last_touch_flush = time.monotonic()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.errors = 0
+        self.time_saved_ms = 0.0
+
+    def _connection(self) -> sqlite3.Connection:
+        """Conexión SQLite por hilo (y por proceso)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            # Debe fijarse antes de crear las tablas para que el fichero pueda encoger
+            conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            if self._ready_pid != os.getpid():
+                with self._lock:
+                    conn.executescript(_SCHEMA)
+                    self._ready_pid = os.getpid()
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key: str) -> Optional[str]:
+        """Texto guardado para la clave o None"""
+        if not self.enabled:
+            return None
+        try:
+            conn = self._connection()
+            row = conn.execute('SELECT value, compute_ms FROM completions WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                with self._lock:
+                    self.misses += 1
+                return None
+            text = zlib.decompress(row[0]).decode('utf-8')
+        except (sqlite3.Error, zlib.error) as e:
+            with self._lock:
+                self.errors += 1
+            print(f"Caché LLM no disponible: {e}")
+            return None
+        with self._lock:
+            self.hits += 1
+            self.time_saved_ms += row[1]
+            self._touch(key)
+            due = time.monotonic() - self._last_touch_flush >= self.touch_interval
+        if due:
+            self.flush()
+        return text
+
+    def _touch(self, key: str) -> None:
+        # Con el lock tomado; los usos heredados de un fork los escribe el proceso padre
+        if self._touched_pid != os.getpid():
+            self._touched = {}
+            self._touched_pid = os.getpid()
+        pending = self._touched.setdefault(key, [0, 0.0])
+        pending[0] += 1
+        pending[1] = time.time()
+
+    def flush(self) -> None:
+        """Escribir en el fichero los usos acumulados (hits y last_used)"""
+        with self._lock:
+            if self._touched_pid != os.getpid() or not self._touched:
+                self._last_touch_flush = time.monotonic()
+                return
+            touched, self._touched = self._touched, {}
+            self._last_touch_flush = time.monotonic()
+        try:
+            conn = self._connection()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.executemany(
+                    'UPDATE completions SET hits = hits + ?, last_used = MAX(last_used, ?) WHERE key = ?',
+                    [(hits, last_used, key) for key, (hits, last_used) in touched.items()]
+                )
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        except sqlite3.Error as e:
+            with self._lock:
+                self.errors += 1
+            print(f"Caché LLM no disponible: {e}")
+
+    def set(self, key: str, model_id: str, text: str, compute_ms: float) -> None:
+        """Guardar una generación y desalojar si se supera el tamaño máximo"""
+        if not self.enabled:
+            return
+        value = zlib.compress(text.encode('utf-8'), 6)
+        size = len(value) + _ROW_OVERHEAD
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        try:
+            # Los usos pendientes cuentan para el LRU del desalojo
+            self.flush()
+            conn = self._connection()
+            conn.execute(
+                'INSERT OR REPLACE INTO completions (key, model, value, size, compute_ms, created_at, last_used) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (key, model_id, value, size, compute_ms, now, now)
+            )
+            with self._lock:
+                self.stores += 1
+            self._evict(conn)
+        except sqlite3.Error as e:
+            with self._lock:
+                self.errors += 1
+            print(f"Caché LLM no disponible: {e}")
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM completions').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Se libera hasta el 90% del máximo para no desalojar en cada inserción
+        removed = conn.execute(
+            'DELETE FROM completions WHERE key IN ('
+            ' SELECT key FROM (SELECT key, SUM(size) OVER (ORDER BY last_used DESC, key) AS kept FROM completions)'
+            ' WHERE kept > ?)',
+            (int(self.max_bytes * 0.9),)
+        ).rowcount
+        with self._lock:
+            self.evictions += max(0, removed)
+        conn.execute('PRAGMA incremental_vacuum')
+
+    def clear(self) -> None:
+        with self._lock:
+            self._touched = {}
+        try:
+            conn = self._connection()
+            conn.execute('DELETE FROM completions')
+            conn.execute('PRAGMA incremental_vacuum')
+        except sqlite3.Error as e:
+            print(f"Caché LLM no disponible: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Métricas de este proceso y tamaño y ahorro acumulados del fichero compartido"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            stats = {
+                'enabled': self.enabled,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'time_saved_ms': round(self.time_saved_ms, 1),
+                'stores': self.stores,
+                'evictions': self.evictions,
+                'errors': self.errors,
+                'max_mb': round(self.max_bytes / 2 ** 20, 2)
+            }
+        # Sin fichero no hay nada que contar: /metrics no lo crea (p. ej. con el LLM desactivado)
+        if not self.enabled or not os.path.exists(self.db_path):
+            return stats
+        try:
+            entries, size, hits, saved = self._connection().execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(hits), 0), '
+                'COALESCE(SUM(hits * compute_ms), 0) FROM completions'
+            ).fetchone()
+        except sqlite3.Error:
+            return stats
+        stats.update({
+            'entries': entries,
+            'size_mb': round(size / 2 ** 20, 2),
+            'file_mb': round(os.path.getsize(self.db_path) / 2 ** 20, 2) if os.path.exists(self.db_path) else 0.0,
+            # Todos los procesos, desde que cada entrada está en el fichero
+            'total_hits': hits,
+            'total_time_saved_ms': round(saved, 1)
+        })
+        return stats
+
+
+# Instancia global de la caché de generaciones del LLM
+completion_cache = CompletionCache(
+    db_path=os.getenv('LLM_CACHE_PATH', os.path.join(os.path.dirname(__file__), '..', 'data', 'llm_cache.sqlite3')),
+    max_bytes=int(float(os.getenv('LLM_CACHE_MAX_MB', '64')) * 2 ** 20),
+    touch_interval=float(os.getenv('LLM_CACHE_TOUCH_INTERVAL', '5'))
+)
+atexit.register(completion_cache.flush)
@@ -0,0 +1,340 @@
+"""
+Motor LLM local (llama.cpp) compartido por los agentes.
+El modelo GGUF de LLAMA_MODEL_PATH se carga una sola vez por proceso, con los
+pesos mapeados en memoria (los workers de gunicorn comparten las páginas del
+fichero) y tantos hilos como núcleos disponibles. Las peticiones concurrentes
+se multiplexan sobre el modelo con batching continuo (services.llm_scheduler):
+un único hilo decodifica a la vez todas las secuencias activas, y los
+prefijos de prompt comunes (instrucciones del agente y contexto del tipo de
+negocio) se evalúan una vez y se reutilizan desde la caché KV
+(services.llm_prefix_cache). Las generaciones completas se guardan en una
+caché en disco compartida por los workers (services.llm_completion_cache):
+un prompt repetido no llega al modelo. Con LLM_DRAFT_MODEL_PATH, un modelo
+borrador pequeño del mismo vocabulario propone tokens que el principal
+verifica en bloque (services.llm_speculative). Las salidas estructuradas de
+los agentes se generan restringidas por una gramática derivada de su esquema
+JSON (services.llm_structured). Si el modelo o llama-cpp-python no
+están disponibles, los agentes siguen usando sus reglas (LLM_MODE=auto); con
+LLM_MODE=llm la API no arranca sin el modelo y los agentes no recurren a las
+reglas cuando la generación falla.
+"""
+
+import os
+import time
+import hashlib
+import atexit
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Any, Dict, List, Optional
+
+from services.llm_completion_cache import CompletionCache, completion_cache, completion_cache_key, model_fingerprint
+from services.llm_prefix_cache import kv_bytes_per_cell
+from services.llm_scheduler import BatchScheduler, QueueFullError
+from services.llm_structured import max_chars, parse_structured, schema_to_gbnf, schema_template
+from services.llm_speculative import DraftModel
+
+try:
+    import llama_cpp
+except ImportError:  # llama-cpp-python es opcional: sin él los agentes usan reglas
+    llama_cpp = None
+
+# auto: el modelo si está disponible, si no reglas; llm: sólo el modelo; rules: sólo reglas
+LLM_MODES = ('auto', 'llm', 'rules')
+
+
+class LLMUnavailableError(RuntimeError):
+    """El modelo no está disponible o no admite más peticiones"""
+
+
+def available_cores() -> int:
+    """Núcleos que puede usar este proceso (respeta cgroups/taskset)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+class LLMEngine:
+    """Modelo llama.cpp cargado una vez por proceso con un planificador de batching continuo"""
+
+    def __init__(self, model_path: str, mode: str = 'auto', n_ctx: int = 2048,
+                 n_threads: Optional[int] = None, n_batch: int = 512, max_sequences: int = 4,
+                 max_queue: int = 64, max_tokens: int = 192, prefix_cache_mb: float = 512,
+                 timeout: float = 20.0, cache: Optional[CompletionCache] = None,
+                 draft_model_path: Optional[str] = None, draft_tokens: int = 4):
+        if mode not in LLM_MODES:
+            raise ValueError(f"LLM_MODE debe ser uno de {LLM_MODES}")
+        self.model_path = model_path
+        self.mode = mode
+        self.n_ctx = n_ctx
+        self.n_threads = n_threads or available_cores()
+        self.n_batch = n_batch
+        self.max_sequences = max_sequences
+        self.max_queue = max_queue
+        self.max_tokens = max_tokens
+        self.prefix_cache_mb = prefix_cache_mb
+        self.timeout = timeout
+        self.cache = cache
+        self.draft_model_path = draft_model_path or None
+        self.draft_tokens = draft_tokens
+        # Parámetros del muestreador, parte de la clave de la caché de generaciones
+        self.sampling = {'top_k': 40, 'top_p': 0.95, 'repeat_penalty': 1.1, 'repeat_last_n': 64}
+        self._model_id: Optional[str] = None
+        # Intentos de salida estructurada, con y sin gramática
+        self._stats_lock = threading.Lock()
+        self._structured = {mode: {'requests': 0, 'parsed_first_try': 0, 'retries': 0, 'failures': 0,
+                                   'cache_hits': 0, 'tokens': 0, 'wasted_tokens': 0}
+                            for mode in ('constrained', 'unconstrained')}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._model = None
+        self._scheduler: Optional[BatchScheduler] = None
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+
+    @property
+    def enabled(self) -> bool:
+        """True si los agentes deben usar el modelo"""
+        if self.mode == 'rules':
+            return False
+        return llama_cpp is not None and os.path.exists(self.model_path)
+
+    @property
+    def required(self) -> bool:
+        """True si el modelo es obligatorio (sin recurso a las reglas)"""
+        return self.mode == 'llm'
+
+    def check_available(self) -> None:
+        """Con LLM_MODE=llm, fallar al arrancar si el modelo no se puede usar"""
+        if not self.required:
+            return
+        if llama_cpp is None:
+            raise LLMUnavailableError('LLM_MODE=llm requiere llama-cpp-python')
+        if not os.path.exists(self.model_path):
+            raise LLMUnavailableError(f'LLM_MODE=llm requiere el modelo {self.model_path}')
+
+    def _load_model(self, model_path: str):
+        return llama_cpp.Llama(
+            model_path=model_path,
+            n_ctx=self.n_ctx,
+            n_batch=self.n_batch,
+            n_threads=self.n_threads,
+            n_threads_batch=self.n_threads,
+            use_mmap=True,
+            use_mlock=False,
+            verbose=False
+        )
+
+    def ensure_loaded(self) -> None:
+        """Cargar el modelo y arrancar el hilo de inferencia en este proceso"""
+        if self._pid == os.getpid() and self._model is not None:
+            return
+        if not self.enabled:
+            raise LLMUnavailableError(f'Modelo LLM no disponible: {self.model_path}')
+        with self._lock:
+            if self._pid == os.getpid() and self._model is not None:
+                return
+            # Tras un fork el estado de llama.cpp del padre no es utilizable
+            self._stop.clear()
+            started = time.perf_counter()
+            self._model = self._load_model(self.model_path)
+            draft = self._load_draft()
+            # Los prefijos no pueden ocupar más de media caché KV
+            prefix_cells = min(self.n_ctx // 2, int(self.prefix_cache_mb * 2 ** 20) // kv_bytes_per_cell(self._model))
+            self._scheduler = BatchScheduler(self._model, n_ctx=self.n_ctx, n_batch=self.n_batch,
+                                             max_sequences=self.max_sequences, max_queue=self.max_queue,
+                                             prefix_cache_cells=prefix_cells, draft=draft,
+                                             draft_tokens=self.draft_tokens, **self.sampling)
+            print(f"✅ Modelo LLM cargado en {time.perf_counter() - started:.1f}s "
+                  f"({os.path.basename(self.model_path)}, {self.n_threads} hilos, "
+                  f"{self.max_sequences} secuencias en paralelo"
+                  + (f", borrador {os.path.basename(self.draft_model_path)}" if draft is not None else '') + ")")
+            self._thread = threading.Thread(target=self._worker_loop, name='anclora-llm', daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def _load_draft(self) -> Optional[DraftModel]:
+        """Modelo borrador para decodificación especulativa (None si no hay o no es compatible)"""
+        if not self.draft_model_path or self.draft_tokens <= 0:
+            return None
+        if not os.path.exists(self.draft_model_path):
+            print(f"⚠️ Modelo borrador no disponible: {self.draft_model_path}")
+            return None
+        draft = DraftModel(self._load_model(self.draft_model_path), self.n_batch)
+        if not draft.compatible_with(self._model):
+            print(f"⚠️ El modelo borrador {os.path.basename(self.draft_model_path)} no comparte vocabulario con el principal")
+            draft.close()
+            return None
+        return draft
+
+    def submit(self, prompt: str, max_tokens: Optional[int] = None, temperature: float = 0.2,
+               stop: Optional[List[str]] = None, prefix: Optional[str] = None,
+               prefix_key: Optional[str] = None, speculative: bool = True,
+               grammar: Optional[str] = None) -> Future:
+        """Encolar una generación; el Future resuelve con el texto generado.
+        Si el prompt empieza por prefix, su estado KV se reutiliza entre peticiones con la misma prefix_key;
+        con speculative=False no se usa el modelo borrador y grammar (GBNF) restringe la salida"""
+        self.ensure_loaded()
+        try:
+            return self._scheduler.submit(prompt, self._budget(max_tokens), temperature=temperature,
+                                          stop=stop, prefix=prefix, prefix_key=prefix_key, speculative=speculative,
+                                          grammar=grammar)
+        except QueueFullError as e:
+            raise LLMUnavailableError(str(e))
+
+    @property
+    def model_id(self) -> str:
+        """Huella del fichero del modelo (nombre y hash parcial del GGUF)"""
+        if self._model_id is None:
+            self._model_id = model_fingerprint(self.model_path)
+        return self._model_id
+
+    def _budget(self, max_tokens: Optional[int]) -> int:
+        # LLM_MAX_TOKENS acota toda generación, también las restringidas por gramática
+        return min(max_tokens or self.max_tokens, self.max_tokens)
+
+    def _cache_key(self, prompt: str, max_tokens: int, temperature: float, stop: Optional[List[str]],
+                   grammar: Optional[str]) -> Optional[str]:
+        if self.cache is None or not self.cache.enabled or not self.enabled:
+            return None
+        # Ni el prefijo ni el borrador cambian el texto generado: sólo cuenta el prompt completo
+        sampling = dict(self.sampling, max_tokens=max_tokens, temperature=temperature, stop=list(stop or []))
+        if grammar is not None:
+            sampling['grammar'] = hashlib.sha256(grammar.encode('utf-8')).hexdigest()
+        return completion_cache_key(self.model_id, prompt, sampling)
+
+    def complete(self, prompt: str, max_tokens: Optional[int] = None, temperature: float = 0.2,
+                 stop: Optional[List[str]] = None, timeout: Optional[float] = None,
+                 prefix: Optional[str] = None, prefix_key: Optional[str] = None,
+                 use_cache: bool = True, speculative: bool = True, grammar: Optional[str] = None) -> str:
+        """Generar de forma bloqueante (concurrent.futures.TimeoutError si vence el plazo).
+        Con la caché de generaciones activa, un prompt ya generado con los mismos parámetros no llega al modelo"""
+        max_tokens = self._budget(max_tokens)
+        cache_key = self._cache_key(prompt, max_tokens, temperature, stop, grammar) if use_cache else None
+        if cache_key is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+        started = time.perf_counter()
+        future = self.submit(prompt, max_tokens=max_tokens, temperature=temperature, stop=stop,
+                             prefix=prefix, prefix_key=prefix_key, speculative=speculative, grammar=grammar)
+        try:
+            text = future.result(timeout=self.timeout if timeout is None else timeout)
+        except FutureTimeoutError:
+            # Nadie espera ya el resultado: se descarta o se corta en el siguiente paso
+            future.cancel()
+            raise
+        if cache_key is not None:
+            self.cache.set(cache_key, self.model_id, text, (time.perf_counter() - started) * 1000)
+        return text
+
+    def complete_structured(self, prompt: str, schema: Dict[str, Any], constrained: bool = True,
+                            retries: int = 2, temperature: float = 0.2, timeout: Optional[float] = None,
+                            prefix: Optional[str] = None, prefix_key: Optional[str] = None,
+                            speculative: bool = True) -> Any:
+        """JSON con la forma de schema. Con constrained la gramática garantiza que se parsea a la primera;
+        sin ella se reintenta hasta `retries` veces (ValueError si ningún intento es válido)"""
+        grammar = schema_to_gbnf(schema) if constrained else None
+        # Presupuesto: la longitud máxima del JSON (un token genera al menos un carácter), sin pasar de
+        # LLM_MAX_TOKENS para que el agente responda dentro de su plazo. Una salida cortada no parsea
+        # y cuenta como reintento
+        max_tokens = min(max_chars(schema), self.max_tokens)
+        stats = self._structured['constrained' if constrained else 'unconstrained']
+        with self._stats_lock:
+            stats['requests'] += 1
+        # Sólo se cachean salidas válidas
+        cache_key = self._cache_key(prompt, max_tokens, temperature, None, grammar or f'json:{schema_template(schema)}')
+        cached = self.cache.get(cache_key) if cache_key is not None else None
+        if cached is not None:
+            with self._stats_lock:
+                stats['cache_hits'] += 1
+            return parse_structured(cached, schema)
+
+        error = None
+        for attempt in range(1 + retries):
+            started = time.perf_counter()
+            text = self.complete(prompt, max_tokens=max_tokens, temperature=temperature, timeout=timeout,
+                                 prefix=prefix, prefix_key=prefix_key, use_cache=False, speculative=speculative,
+                                 grammar=grammar)
+            # Si el hilo de inferencia cayó tras generar, el modelo ya no está para contar tokens
+            model = self._model
+            tokens = len(model.tokenize(text.encode('utf-8'), add_bos=False)) if text and model is not None else 0
+            try:
+                value = parse_structured(text, schema)
+            except ValueError as e:
+                error = e
+                with self._stats_lock:
+                    stats['tokens'] += tokens
+                    stats['wasted_tokens'] += tokens
+                    stats['retries' if attempt < retries else 'failures'] += 1
+                continue
+            with self._stats_lock:
+                stats['tokens'] += tokens
+                if attempt == 0:
+                    stats['parsed_first_try'] += 1
+            if cache_key is not None:
+                self.cache.set(cache_key, self.model_id, text, (time.perf_counter() - started) * 1000)
+            return value
+        raise ValueError(f'Salida estructurada no válida tras {1 + retries} intentos: {error}')
+
+    def stats(self) -> Dict[str, Any]:
+        """Métricas de uso del modelo y del planificador"""
+        loaded = self._scheduler is not None and self._pid == os.getpid()
+        stats = {
+            'enabled': self.enabled,
+            'loaded': loaded,
+            'model': os.path.basename(self.model_path),
+            'draft_model': os.path.basename(self.draft_model_path) if self.draft_model_path else None,
+            'threads': self.n_threads
+        }
+        if loaded:
+            stats.update(self._scheduler.stats())
+        if self.cache is not None:
+            stats['completion_cache'] = self.cache.stats()
+        with self._stats_lock:
+            stats['structured'] = {mode: dict(counters) for mode, counters in self._structured.items()}
+        return stats
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        """Detener el hilo de inferencia (las peticiones pendientes fallan)"""
+        if self._pid != os.getpid():
+            return
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._thread = None
+        self._scheduler = None
+        self._model = None
+
+    def _worker_loop(self) -> None:
+        scheduler = self._scheduler
+        try:
+            scheduler.run(self._stop)
+        except Exception as e:
+            print(f"LLM error: {e}")
+        finally:
+            scheduler.close(LLMUnavailableError('Motor LLM detenido'))
+            with self._lock:
+                # Si el bucle cae, la siguiente petición vuelve a cargar el modelo
+                if self._scheduler is scheduler:
+                    self._scheduler = None
+                    self._model = None
+
+
+# Instancia global del motor LLM
+llm_engine = LLMEngine(
+    model_path=os.getenv('LLAMA_MODEL_PATH', './models/llama-2-7b-chat.gguf'),
+    mode=os.getenv('LLM_MODE', 'auto'),
+    n_ctx=int(os.getenv('LLM_CONTEXT_SIZE', '2048')),
+    n_threads=int(os.getenv('LLM_THREADS', '0')) or None,
+    n_batch=int(os.getenv('LLM_BATCH_SIZE', '512')),
+    max_sequences=int(os.getenv('LLM_PARALLEL', '4')),
+    max_queue=int(os.getenv('LLM_QUEUE_SIZE', '64')),
+    max_tokens=int(os.getenv('LLM_MAX_TOKENS', '192')),
+    prefix_cache_mb=float(os.getenv('LLM_PREFIX_CACHE_MB', '512')),
+    timeout=float(os.getenv('LLM_TIMEOUT', '20')),
+    cache=completion_cache,
+    draft_model_path=os.getenv('LLM_DRAFT_MODEL_PATH'),
+    draft_tokens=int(os.getenv('LLM_DRAFT_TOKENS', '4'))
+)
+atexit.register(llm_engine.shutdown)
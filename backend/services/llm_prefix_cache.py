@@ -0,0 +1,144 @@
+"""
+Caché de prefijos de prompt en la caché KV de llama.cpp.
+Los prompts de cada agente empiezan por el mismo prefijo (instrucciones del
+sistema y contexto del tipo de negocio). La primera petición de cada clave
+(agente, tipo de negocio) deja sus celdas KV del prefijo asignadas a un
+seq_id propio de la caché; las siguientes las comparten con
+llama_kv_cache_seq_cp (sin copiar memoria) y sólo evalúan el resto del prompt.
+
+Las entradas ocupan celdas de la caché KV del contexto, así que se limitan por
+presupuesto de memoria y se desalojan por LRU. Una entrada en uso por una
+secuencia activa no se desaloja.
+"""
+
+import ctypes
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+try:
+    import llama_cpp
+except ImportError:  # llama-cpp-python es opcional (ver services.llm_engine)
+    llama_cpp = None
+
+
+def _model_meta(model: Any, key: str) -> Optional[str]:
+    buffer = ctypes.create_string_buffer(128)
+    length = llama_cpp.llama_model_meta_val_str(model.model, key.encode('utf-8'), buffer, len(buffer))
+    return buffer.value.decode('utf-8') if length >= 0 else None
+
+
+def kv_bytes_per_cell(model: Any) -> int:
+    """Bytes de K+V (f16) por celda de la caché KV del modelo"""
+    arch = _model_meta(model, 'general.architecture') or 'llama'
+    n_layer = int(_model_meta(model, f'{arch}.block_count') or 32)
+    n_head = int(_model_meta(model, f'{arch}.attention.head_count') or 1)
+    n_head_kv = int(_model_meta(model, f'{arch}.attention.head_count_kv') or n_head)
+    n_embd_kv = llama_cpp.llama_n_embd(model.model) * n_head_kv // n_head
+    return 2 * n_layer * n_embd_kv * 2
+
+
+class _PrefixEntry:
+    """Prefijo residente en la caché KV bajo su propio seq_id"""
+
+    __slots__ = ('key', 'seq_id', 'tokens', 'refs')
+
+    def __init__(self, key: str, seq_id: int, tokens: Tuple[int, ...]):
+        self.key = key
+        self.seq_id = seq_id
+        self.tokens = tokens
+        self.refs = 0
+
+
+class PrefixCache:
+    """Prefijos de prompt reutilizables entre secuencias de un mismo contexto"""
+
+    def __init__(self, model: Any, budget_cells: int, first_seq_id: int, max_entries: int = 256):
+        self.model = model
+        self.budget_cells = budget_cells
+        self.max_entries = max_entries
+        self.bytes_per_cell = kv_bytes_per_cell(model)
+        self._entries: 'OrderedDict[str, _PrefixEntry]' = OrderedDict()
+        self._free_seq_ids = list(range(first_seq_id + max_entries - 1, first_seq_id - 1, -1))
+        self.cells = 0
+        self.hits = 0
+        self.misses = 0
+        self.tokens_reused = 0
+        self.evictions = 0
+
+    def match(self, key: str, prompt_tokens: Sequence[int]) -> Tuple[Optional[_PrefixEntry], int]:
+        """(entrada, tokens reutilizables) para un prompt; siempre queda al menos un token por evaluar"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None, 0
+        limit = min(len(entry.tokens), len(prompt_tokens) - 1)
+        reuse = 0
+        while reuse < limit and entry.tokens[reuse] == prompt_tokens[reuse]:
+            reuse += 1
+        return (entry, reuse) if reuse else (None, 0)
+
+    def attach(self, entry: _PrefixEntry, seq_id: int, reuse: int) -> None:
+        """Compartir las primeras `reuse` celdas del prefijo con la secuencia seq_id"""
+        llama_cpp.llama_kv_cache_seq_cp(self.model.ctx, entry.seq_id, seq_id, 0, reuse)
+        entry.refs += 1
+        self._entries.move_to_end(entry.key)
+        self.hits += 1
+        self.tokens_reused += reuse
+
+    def miss(self) -> None:
+        self.misses += 1
+
+    def release(self, entry: _PrefixEntry) -> None:
+        entry.refs -= 1
+
+    def store(self, key: str, seq_id: int, tokens: Sequence[int]) -> Optional[_PrefixEntry]:
+        """Conservar el prefijo ya evaluado por seq_id (la entrada queda en uso por ella)"""
+        if key in self._entries or len(tokens) > self.budget_cells:
+            return None
+        self.evict(self.cells + len(tokens) - self.budget_cells)
+        if self.cells + len(tokens) > self.budget_cells or not self._free_seq_ids:
+            return None
+        entry = _PrefixEntry(key, self._free_seq_ids.pop(), tuple(tokens))
+        llama_cpp.llama_kv_cache_seq_cp(self.model.ctx, seq_id, entry.seq_id, 0, len(tokens))
+        entry.refs = 1
+        self._entries[key] = entry
+        self.cells += len(tokens)
+        return entry
+
+    def evict(self, cells: int, keep: Optional[_PrefixEntry] = None) -> int:
+        """Desalojar entradas LRU sin uso hasta liberar `cells` celdas; devuelve las liberadas"""
+        freed = 0
+        for entry in list(self._entries.values()):
+            if freed >= cells:
+                break
+            if entry.refs or entry is keep:
+                continue
+            self._remove(entry)
+            self.evictions += 1
+            freed += len(entry.tokens)
+        return freed
+
+    def clear(self) -> None:
+        for entry in list(self._entries.values()):
+            self._remove(entry)
+
+    def _remove(self, entry: _PrefixEntry) -> None:
+        llama_cpp.llama_kv_cache_seq_rm(self.model.ctx, entry.seq_id, -1, -1)
+        del self._entries[entry.key]
+        self._free_seq_ids.append(entry.seq_id)
+        self.cells -= len(entry.tokens)
+
+    def stats(self) -> Dict[str, Any]:
+        """Métricas de la caché de prefijos"""
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'cells': self.cells,
+            'budget_cells': self.budget_cells,
+            'memory_mb': round(self.cells * self.bytes_per_cell / 2 ** 20, 2),
+            'budget_mb': round(self.budget_cells * self.bytes_per_cell / 2 ** 20, 2),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'tokens_reused': self.tokens_reused,
+            'evictions': self.evictions
+        }
@@ -0,0 +1,498 @@
+"""
+Planificador de generación con batching continuo para el modelo llama.cpp.
+Todas las peticiones activas comparten cada paso de decodificación: un único
+llama_decode procesa el siguiente token de cada secuencia en curso y los
+trozos de prompt de las recién admitidas, cada una con su propio seq_id en la
+caché KV. Las peticiones nuevas se admiten entre pasos, sin esperar a que
+terminen las demás.
+
+Cada petición tiene un presupuesto de tokens (max_tokens, recortado al
+contexto disponible) y sólo se admite si sus celdas KV (prompt + presupuesto)
+caben en la caché compartida, así que ninguna secuencia se queda sin contexto
+a mitad de la generación. Las celdas del prefijo de prompt que ya estén en la
+caché de prefijos (services.llm_prefix_cache) se comparten y no se reservan
+ni se evalúan de nuevo.
+
+Con un modelo borrador (services.llm_speculative), las secuencias que lo
+piden decodifican de forma especulativa: el borrador propone varios tokens y
+el mismo paso del batch los verifica todos con el modelo principal. Se
+aceptan mientras coincidan con el token muestreado por el principal, así que
+el texto es el mismo que sin borrador; las celdas KV de los rechazados se
+eliminan de la secuencia.
+
+Una petición puede llevar una gramática GBNF (services.llm_structured): su
+secuencia tiene su propio estado de gramática y en cada muestreo los tokens
+que la incumplen quedan descartados antes de aplicar temperatura, top-k y
+top-p.
+"""
+
+import time
+import ctypes
+import threading
+from collections import deque
+from concurrent.futures import Future, InvalidStateError
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from services.llm_prefix_cache import PrefixCache
+
+try:
+    import numpy as np
+    import llama_cpp
+    from llama_cpp.llama_grammar import LlamaGrammar
+except ImportError:  # llama-cpp-python (y numpy) son opcionales (ver services.llm_engine)
+    np = llama_cpp = LlamaGrammar = None
+
+
+class QueueFullError(RuntimeError):
+    """La cola del planificador está llena"""
+
+
+class GenerationRequest:
+    """Petición de generación pendiente o en curso"""
+
+    __slots__ = ('prompt_tokens', 'max_tokens', 'temperature', 'stop', 'prefix_key', 'prefix_len',
+                 'speculative', 'grammar', 'future', 'enqueued_at')
+
+    def __init__(self, prompt_tokens: List[int], max_tokens: int, temperature: float, stop: Optional[List[str]],
+                 prefix_key: Optional[str] = None, prefix_len: int = 0, speculative: bool = False,
+                 grammar: Any = None):
+        self.prompt_tokens = prompt_tokens
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.stop = [s for s in (stop or []) if s]
+        # Clave y longitud (en tokens) del prefijo reutilizable del prompt
+        self.prefix_key = prefix_key
+        self.prefix_len = prefix_len
+        # Decodificar con el modelo borrador si el planificador tiene uno
+        self.speculative = speculative
+        # Gramática compilada (LlamaGrammar) que restringe la salida
+        self.grammar = grammar
+        # El Future no pasa a RUNNING: si el cliente lo cancela la secuencia se
+        # corta en el siguiente paso y libera su hueco
+        self.future: Future = Future()
+        self.enqueued_at = time.perf_counter()
+
+    @property
+    def kv_cells(self) -> int:
+        """Celdas de la caché KV que reserva la petición (prompt + presupuesto)"""
+        return len(self.prompt_tokens) + self.max_tokens
+
+
+class _Sequence:
+    """Estado de una petición admitida en el batch"""
+
+    __slots__ = ('request', 'seq_id', 'n_prefilled', 'last_token', 'tokens', 'text', 'admitted_at', 'first_token_at',
+                 'reserved', 'prefix_entry', 'grammar')
+
+    def __init__(self, request: GenerationRequest, seq_id: int, reused: int = 0, prefix_entry: Any = None):
+        self.request = request
+        self.seq_id = seq_id
+        self.n_prefilled = reused
+        self.reserved = request.kv_cells - reused
+        self.prefix_entry = prefix_entry
+        self.last_token: Optional[int] = None
+        self.tokens: List[int] = []
+        self.text = b''
+        self.admitted_at = time.perf_counter()
+        self.first_token_at: Optional[float] = None
+        # Estado propio de la gramática (se avanza con cada token aceptado)
+        self.grammar = llama_cpp.llama_grammar_copy(request.grammar.grammar) if request.grammar is not None else None
+
+    @property
+    def prefilling(self) -> bool:
+        return self.n_prefilled < len(self.request.prompt_tokens)
+
+    @property
+    def position(self) -> int:
+        return self.n_prefilled + len(self.tokens) - 1
+
+
+class BatchScheduler:
+    """Batching continuo de peticiones sobre un contexto llama.cpp"""
+
+    def __init__(self, model: Any, n_ctx: int, n_batch: int, max_sequences: int = 4,
+                 max_queue: int = 64, prefix_cache_cells: int = 0, top_k: int = 40, top_p: float = 0.95,
+                 repeat_penalty: float = 1.1, repeat_last_n: int = 64, seed: Optional[int] = None,
+                 draft: Any = None, draft_tokens: int = 4):
+        self.model = model
+        self.n_ctx = n_ctx
+        self.n_batch = n_batch
+        self.max_sequences = max_sequences
+        self.max_queue = max_queue
+        self.top_k = top_k
+        self.top_p = top_p
+        self.repeat_penalty = repeat_penalty
+        self.repeat_last_n = repeat_last_n
+        self.draft = draft
+        # Los tokens propuestos de todas las secuencias tienen que caber en un batch
+        self.draft_tokens = max(0, min(draft_tokens, n_batch // max_sequences - 1))
+        self._rng = np.random.default_rng(seed)
+        self._n_vocab = model.n_vocab()
+        self._eos = model.token_eos()
+        self._batch = llama_cpp.llama_batch_init(n_batch, 0, 1)
+        # Candidatos para llama_sample_grammar (mismo layout que llama_token_data)
+        self._candidates = np.zeros(self._n_vocab, dtype=[('id', np.intc), ('logit', np.single), ('p', np.single)])
+        self._candidates['id'] = np.arange(self._n_vocab)
+        self._candidates_array = llama_cpp.llama_token_data_array(
+            data=self._candidates.ctypes.data_as(llama_cpp.llama_token_data_p), size=self._n_vocab, sorted=False)
+        self._grammars: Dict[str, Any] = {}
+        # Tokens de byte suelto: bajo gramática cada token debe aportar al menos un carácter completo
+        self._byte_tokens = np.array([token for token in range(self._n_vocab)
+                                      if llama_cpp.llama_token_get_type(model.model, token) == llama_cpp.LLAMA_TOKEN_TYPE_BYTE],
+                                     dtype=np.intc)
+        self._pending: Deque[GenerationRequest] = deque()
+        self._active: List[_Sequence] = []
+        self._free_seq_ids = list(range(max_sequences - 1, -1, -1))
+        self._reserved_cells = 0
+        # Los seq_id de los prefijos van a continuación de los de las secuencias
+        self.prefixes = PrefixCache(model, prefix_cache_cells, first_seq_id=max_sequences) if prefix_cache_cells > 0 else None
+        self._cond = threading.Condition()
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.rejected = 0
+        self.admitted = 0
+        self.prompt_tokens = 0
+        self.tokens_generated = 0
+        self.steps = 0
+        self._step_tokens_total = 0
+        self._step_sequences_total = 0
+        self._queue_wait_total = 0.0
+        self._compute_total = 0.0
+        self._first_token_total = 0.0
+        self._decode_total = 0.0
+
+    def tokenize(self, prompt: str) -> List[int]:
+        # llama_tokenize no toca el contexto: puede llamarse desde cualquier hilo
+        return self.model.tokenize(prompt.encode('utf-8'), add_bos=True, special=False)
+
+    def grammar(self, gbnf: str) -> Any:
+        """Gramática GBNF compilada (una vez por texto de gramática)"""
+        with self._cond:
+            compiled = self._grammars.get(gbnf)
+        if compiled is None:
+            compiled = LlamaGrammar.from_string(gbnf, verbose=False)
+            with self._cond:
+                compiled = self._grammars.setdefault(gbnf, compiled)
+        return compiled
+
+    def submit(self, prompt: str, max_tokens: int, temperature: float = 0.2, stop: Optional[List[str]] = None,
+               prefix: Optional[str] = None, prefix_key: Optional[str] = None, speculative: bool = True,
+               grammar: Optional[str] = None) -> Future:
+        """Encolar una generación; el Future resuelve con el texto generado.
+        prefix (el inicio de prompt) se guarda en la caché de prefijos bajo prefix_key;
+        speculative usa el modelo borrador si lo hay y grammar (GBNF) restringe la salida"""
+        prompt_tokens = self.tokenize(prompt)
+        # Presupuesto por petición: nunca más allá del contexto compartido
+        max_tokens = min(max_tokens, self.n_ctx - len(prompt_tokens))
+        if max_tokens <= 0:
+            raise ValueError(f'Prompt demasiado largo: {len(prompt_tokens)} tokens (contexto {self.n_ctx})')
+        prefix_len = 0
+        if prefix and prefix_key and self.prefixes is not None:
+            # Sólo la parte del prefijo que se tokeniza igual dentro del prompt completo
+            for prefix_token, prompt_token in zip(self.tokenize(prefix), prompt_tokens[:-1]):
+                if prefix_token != prompt_token:
+                    break
+                prefix_len += 1
+        request = GenerationRequest(prompt_tokens, max_tokens, temperature, stop,
+                                    prefix_key if prefix_len else None, prefix_len,
+                                    speculative and self.draft is not None and self.draft_tokens > 0,
+                                    self.grammar(grammar) if grammar else None)
+        with self._cond:
+            if len(self._pending) >= self.max_queue:
+                self.rejected += 1
+                raise QueueFullError('Cola del modelo LLM llena')
+            self._pending.append(request)
+            self._cond.notify()
+        return request.future
+
+    def stats(self) -> Dict[str, Any]:
+        """Métricas del planificador (espera en cola frente a cómputo)"""
+        with self._cond:
+            finished = self.completed + self.failed + self.cancelled
+            admitted = self.admitted
+            return {
+                'queued': len(self._pending),
+                'active': len(self._active),
+                'max_sequences': self.max_sequences,
+                'kv_cells_reserved': self._reserved_cells,
+                'completed': self.completed,
+                'failed': self.failed,
+                'cancelled': self.cancelled,
+                'rejected': self.rejected,
+                'prompt_tokens': self.prompt_tokens,
+                'tokens_generated': self.tokens_generated,
+                'decode_steps': self.steps,
+                'avg_batch_tokens': round(self._step_tokens_total / self.steps, 2) if self.steps else 0.0,
+                'avg_batch_sequences': round(self._step_sequences_total / self.steps, 2) if self.steps else 0.0,
+                'avg_queue_wait_ms': round(self._queue_wait_total / admitted * 1000, 2) if admitted else 0.0,
+                'avg_compute_ms': round(self._compute_total / finished * 1000, 2) if finished else 0.0,
+                'avg_first_token_ms': round(self._first_token_total / finished * 1000, 2) if finished else 0.0,
+                'decode_ms': round(self._decode_total * 1000, 2),
+                'prefix_cache': self.prefixes.stats() if self.prefixes is not None else None,
+                'speculative': self.draft.stats() if self.draft is not None else None
+            }
+
+    def run(self, stop_event: threading.Event) -> None:
+        """Bucle de decodificación (un único hilo por contexto)"""
+        while not stop_event.is_set():
+            self._admit()
+            if not self._active:
+                with self._cond:
+                    if not self._pending:
+                        self._cond.wait(0.5)
+                continue
+            self._step()
+
+    def close(self, error: Exception) -> None:
+        """Fallar las peticiones pendientes y en curso y liberar el batch"""
+        with self._cond:
+            pending, self._pending = list(self._pending), deque()
+        for request in pending:
+            self._resolve(request.future, error=error)
+        for seq in list(self._active):
+            self._finish(seq, error=error)
+        if self.prefixes is not None:
+            self.prefixes.clear()
+        if self.draft is not None:
+            self.draft.close()
+        if self._batch is not None:
+            llama_cpp.llama_batch_free(self._batch)
+            self._batch = None
+
+    # --- Admisión y pasos de decodificación --------------------------------------
+
+    def _admit(self) -> None:
+        # FIFO estricto: si la primera petición no cabe, las siguientes esperan
+        with self._cond:
+            while self._pending and self._free_seq_ids:
+                request = self._pending[0]
+                if request.future.cancelled():
+                    self._pending.popleft()
+                    self.cancelled += 1
+                    continue
+                entry, reused = None, 0
+                if request.prefix_key is not None:
+                    entry, reused = self.prefixes.match(request.prefix_key, request.prompt_tokens)
+                needed = request.kv_cells - reused
+                cached = self.prefixes.cells if self.prefixes is not None else 0
+                if self._reserved_cells + cached + needed > self.n_ctx:
+                    # Hacer sitio desalojando prefijos sin uso (nunca el que va a reutilizar)
+                    overflow = self._reserved_cells + cached + needed - self.n_ctx
+                    if self.prefixes is None or self.prefixes.evict(overflow, keep=entry) < overflow:
+                        break
+                self._pending.popleft()
+                seq = _Sequence(request, self._free_seq_ids.pop(), reused, entry)
+                if entry is not None:
+                    self.prefixes.attach(entry, seq.seq_id, reused)
+                elif request.prefix_key is not None:
+                    self.prefixes.miss()
+                self._active.append(seq)
+                self._reserved_cells += seq.reserved
+                self.admitted += 1
+                self._queue_wait_total += seq.admitted_at - request.enqueued_at
+
+    def _step(self) -> None:
+        entries: List[Tuple[_Sequence, int, int, bool]] = []  # (secuencia, token, posición, logits)
+        budget = self.n_batch
+        decoding = []
+        for seq in list(self._active):
+            if seq.request.future.cancelled():
+                self._finish(seq, cancelled=True)
+            elif not seq.prefilling:
+                decoding.append(seq)
+        drafts = self._propose(decoding)
+        for seq in decoding:
+            # Tras el último token, los propuestos por el borrador (todos con logits para verificarlos)
+            draft = drafts.get(seq.seq_id, [])
+            for offset, token in enumerate([seq.last_token] + draft):
+                entries.append((seq, token, seq.position + offset, True))
+            budget -= 1 + len(draft)
+        # Los prompts de las secuencias nuevas llenan el resto del batch por trozos
+        for seq in self._active:
+            if budget <= 0:
+                break
+            if seq.prefilling:
+                prompt = seq.request.prompt_tokens
+                chunk = prompt[seq.n_prefilled:seq.n_prefilled + budget]
+                for offset, token in enumerate(chunk):
+                    position = seq.n_prefilled + offset
+                    entries.append((seq, token, position, position == len(prompt) - 1))
+                budget -= len(chunk)
+        if entries:
+            self._decode(entries)
+
+    def _propose(self, decoding: List[_Sequence]) -> Dict[int, List[int]]:
+        if self.draft is None:
+            return {}
+        requests = []
+        for seq in decoding:
+            # Los propuestos ocupan celdas KV: nunca más allá del presupuesto de la secuencia
+            k = min(self.draft_tokens, seq.request.max_tokens - len(seq.tokens))
+            if seq.request.speculative and k > 0:
+                requests.append((seq.seq_id, seq.request.prompt_tokens + seq.tokens, k))
+        return self.draft.propose(requests) if requests else {}
+
+    def _decode(self, entries: List[Tuple[_Sequence, int, int, bool]]) -> None:
+        batch = self._batch
+        batch.n_tokens = len(entries)
+        for i, (seq, token, position, logits) in enumerate(entries):
+            batch.token[i] = token
+            batch.pos[i] = position
+            batch.n_seq_id[i] = 1
+            batch.seq_id[i][0] = seq.seq_id
+            batch.logits[i] = logits
+
+        started = time.perf_counter()
+        code = llama_cpp.llama_decode(self.model.ctx, batch)
+        self._decode_total += time.perf_counter() - started
+        if code == 1 and any(self._is_draft(entry) for entry in entries):
+            # Sin hueco para los tokens propuestos: este paso se decodifica sin ellos
+            self._decode([entry for entry in entries if not self._is_draft(entry)])
+            return
+        if code == 1 and len(entries) > 1:
+            # Sin hueco contiguo en la caché KV (fragmentación): partir el batch
+            half = len(entries) // 2
+            self._decode(entries[:half])
+            self._decode(entries[half:])
+            return
+        if code != 0:
+            for seq in {id(seq): seq for seq, *_ in entries}.values():
+                self._finish(seq, error=RuntimeError(f'llama_decode devolvió {code}'))
+            return
+
+        self.steps += 1
+        self._step_tokens_total += len(entries)
+        self._step_sequences_total += len({seq.seq_id for seq, *_ in entries})
+        rejected = set()
+        for i, (seq, token, position, logits) in enumerate(entries):
+            if seq.prefilling:
+                seq.n_prefilled += 1
+                self.prompt_tokens += 1
+                if seq.n_prefilled == seq.request.prefix_len and seq.prefix_entry is None:
+                    self._store_prefix(seq)
+            if not logits or seq not in self._active or seq.seq_id in rejected:
+                continue
+            sampled = self._sample(seq, i)
+            self._accept(seq, sampled)
+            if i + 1 < len(entries) and entries[i + 1][0] is seq:
+                # La siguiente entrada es un token propuesto: vale si coincide con el muestreado
+                if seq in self._active and sampled == entries[i + 1][1]:
+                    self.draft.record(1)
+                    continue
+                rejected.add(seq.seq_id)
+                if seq in self._active:
+                    llama_cpp.llama_kv_cache_seq_rm(self.model.ctx, seq.seq_id, seq.position, -1)
+
+    @staticmethod
+    def _is_draft(entry: Tuple[_Sequence, int, int, bool]) -> bool:
+        seq, _, position, _ = entry
+        return not seq.prefilling and position > seq.position
+
+    def _store_prefix(self, seq: _Sequence) -> None:
+        # Las celdas del prefijo pasan de la reserva de la secuencia a la caché
+        request = seq.request
+        with self._cond:
+            entry = self.prefixes.store(request.prefix_key, seq.seq_id, request.prompt_tokens[:request.prefix_len])
+            if entry is not None:
+                seq.prefix_entry = entry
+                seq.reserved -= request.prefix_len
+                self._reserved_cells -= request.prefix_len
+
+    def _sample(self, seq: _Sequence, index: int) -> int:
+        logits = np.ctypeslib.as_array(llama_cpp.llama_get_logits_ith(self.model.ctx, index),
+                                       shape=(self._n_vocab,)).copy()
+        if seq.grammar is not None:
+            logits = self._apply_grammar(seq, logits)
+            if not np.isfinite(logits).any():
+                return self._eos  # ningún token sigue la gramática: se corta la secuencia
+        recent = seq.tokens[-self.repeat_last_n:]
+        if recent and self.repeat_penalty != 1.0:
+            ids = np.unique(recent)
+            penalized = logits[ids]
+            logits[ids] = np.where(penalized > 0, penalized / self.repeat_penalty, penalized * self.repeat_penalty)
+        temperature = seq.request.temperature
+        if temperature <= 0:
+            return int(np.argmax(logits))
+
+        top = np.argpartition(logits, -self.top_k)[-self.top_k:] if self.top_k < len(logits) else np.arange(len(logits))
+        top = top[np.argsort(logits[top])[::-1]]
+        probs = np.exp((logits[top] - logits[top[0]]) / temperature)
+        probs /= probs.sum()
+        keep = int(np.searchsorted(np.cumsum(probs), self.top_p)) + 1
+        probs = probs[:keep] / probs[:keep].sum()
+        return int(top[self._rng.choice(keep, p=probs)])
+
+    def _apply_grammar(self, seq: _Sequence, logits: Any) -> Any:
+        # llama_sample_grammar pone a -inf los tokens que la gramática no admite (sin reordenar)
+        self._candidates['logit'] = logits
+        self._candidates_array.size = self._n_vocab
+        self._candidates_array.sorted = False
+        llama_cpp.llama_sample_grammar(self.model.ctx, ctypes.byref(self._candidates_array), seq.grammar)
+        logits = self._candidates['logit'].copy()
+        # Así la longitud máxima del JSON en caracteres acota también los tokens
+        logits[self._byte_tokens] = -np.inf
+        return logits
+
+    def _accept(self, seq: _Sequence, token: int) -> None:
+        if seq.first_token_at is None:
+            seq.first_token_at = time.perf_counter()
+        if token == self._eos:
+            self._finish(seq)
+            return
+        if seq.grammar is not None:
+            llama_cpp.llama_grammar_accept_token(self.model.ctx, seq.grammar, token)
+        seq.tokens.append(token)
+        seq.last_token = token
+        self.tokens_generated += 1
+        piece = self.model.detokenize([token])
+        seq.text += piece
+
+        stop = seq.request.stop
+        if stop:
+            # Sólo puede aparecer un stop nuevo en la cola del texto
+            tail_start = max(0, len(seq.text) - len(piece) - max(len(s.encode('utf-8')) for s in stop))
+            tail = seq.text[tail_start:]
+            hits = [tail.find(s.encode('utf-8')) for s in stop]
+            hits = [hit for hit in hits if hit >= 0]
+            if hits:
+                seq.text = seq.text[:tail_start + min(hits)]
+                self._finish(seq)
+                return
+        if len(seq.tokens) >= seq.request.max_tokens:
+            self._finish(seq)
+
+    def _finish(self, seq: _Sequence, error: Optional[Exception] = None, cancelled: bool = False) -> None:
+        llama_cpp.llama_kv_cache_seq_rm(self.model.ctx, seq.seq_id, -1, -1)
+        if self.draft is not None:
+            self.draft.release(seq.seq_id)
+        if seq.grammar is not None:
+            llama_cpp.llama_grammar_free(seq.grammar)
+            seq.grammar = None
+        now = time.perf_counter()
+        with self._cond:
+            self._active.remove(seq)
+            self._free_seq_ids.append(seq.seq_id)
+            self._reserved_cells -= seq.reserved
+            if seq.prefix_entry is not None:
+                self.prefixes.release(seq.prefix_entry)
+            self._compute_total += now - seq.admitted_at
+            self._first_token_total += (seq.first_token_at or now) - seq.admitted_at
+            if cancelled:
+                self.cancelled += 1
+            elif error is not None:
+                self.failed += 1
+            else:
+                self.completed += 1
+        if not cancelled:
+            self._resolve(seq.request.future, seq.text.decode('utf-8', errors='ignore'), error)
+
+    @staticmethod
+    def _resolve(future: Future, result: Any = None, error: Optional[Exception] = None) -> None:
+        try:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+        except InvalidStateError:
+            pass  # cancelado por el cliente entre medias
@@ -0,0 +1,145 @@
+"""
+Modelo borrador para decodificación especulativa.
+Un modelo GGUF mucho más pequeño, con el mismo vocabulario que el principal,
+propone los siguientes tokens de cada secuencia (greedy, en batch para todas
+a la vez); el planificador los verifica con una sola pasada del modelo
+principal y se queda con los que coinciden con lo que el principal habría
+generado. El texto resultante es el mismo que sin borrador: sólo cambia
+cuántos tokens salen por cada pasada del modelo grande.
+
+El borrador tiene su propio contexto y su propia caché KV, con los mismos
+seq_id que las secuencias del planificador. Para cada una recuerda los tokens
+ya evaluados y, antes de proponer, descarta lo que no coincida con el texto
+aceptado y evalúa sólo lo que falte.
+"""
+
+import time
+from typing import Any, Dict, List, Sequence, Tuple
+
+try:
+    import numpy as np
+    import llama_cpp
+except ImportError:  # llama-cpp-python (y numpy) son opcionales (ver services.llm_engine)
+    np = llama_cpp = None
+
+
+class DraftModel:
+    """Contexto llama.cpp de un modelo pequeño que propone tokens al planificador"""
+
+    def __init__(self, model: Any, n_batch: int):
+        self.model = model
+        self.n_batch = n_batch
+        self._n_vocab = model.n_vocab()
+        self._eos = model.token_eos()
+        self._batch = llama_cpp.llama_batch_init(n_batch, 0, 1)
+        # Tokens evaluados en la caché KV del borrador por seq_id
+        self._evaluated: Dict[int, List[int]] = {}
+        self.rounds = 0
+        self.drafted = 0
+        self.accepted = 0
+        self.failures = 0
+        self._draft_total = 0.0
+
+    def compatible_with(self, model: Any) -> bool:
+        """True si el borrador comparte vocabulario con el modelo principal"""
+        if self._n_vocab != model.n_vocab() or self._eos != model.token_eos():
+            return False
+        sample = 'Análisis de mercado: clientes, ventas y crecimiento.'.encode('utf-8')
+        return self.model.tokenize(sample) == model.tokenize(sample)
+
+    def propose(self, requests: Sequence[Tuple[int, Sequence[int], int]]) -> Dict[int, List[int]]:
+        """Hasta k tokens propuestos por seq_id para cada (seq_id, tokens aceptados, k)"""
+        started = time.perf_counter()
+        drafts: Dict[int, List[int]] = {}
+        try:
+            # Ponerse al día: evaluar lo aceptado desde la última propuesta
+            entries = []
+            for seq_id, tokens, k in requests:
+                evaluated = self._evaluated.setdefault(seq_id, [])
+                common, limit = 0, min(len(evaluated), len(tokens) - 1)
+                while common < limit and evaluated[common] == tokens[common]:
+                    common += 1
+                if common < len(evaluated):
+                    llama_cpp.llama_kv_cache_seq_rm(self.model.ctx, seq_id, common, -1)
+                    del evaluated[common:]
+                for position in range(common, len(tokens)):
+                    entries.append((seq_id, tokens[position], position, position == len(tokens) - 1))
+            for start in range(0, len(entries), self.n_batch):
+                for seq_id, token in self._decode(entries[start:start + self.n_batch]):
+                    drafts[seq_id] = [token]
+
+            # Resto de la propuesta: un token por secuencia y pasada
+            budget = {seq_id: k for seq_id, _, k in requests}
+            while True:
+                entries = [(seq_id, draft[-1], len(self._evaluated[seq_id]), True)
+                           for seq_id, draft in drafts.items()
+                           if len(draft) < budget[seq_id] and draft[-1] != self._eos]
+                if not entries:
+                    break
+                for seq_id, token in self._decode(entries):
+                    drafts[seq_id].append(token)
+        except RuntimeError:
+            # Sin hueco en la caché KV del borrador: este paso se decodifica sin propuesta
+            self.failures += 1
+            self.reset()
+            return {}
+        finally:
+            self._draft_total += time.perf_counter() - started
+
+        for seq_id, draft in drafts.items():
+            if self._eos in draft:
+                del draft[draft.index(self._eos):]
+            self.drafted += len(draft)
+        self.rounds += 1
+        return drafts
+
+    def _decode(self, entries: Sequence[Tuple[int, int, int, bool]]) -> List[Tuple[int, int]]:
+        batch = self._batch
+        batch.n_tokens = len(entries)
+        for i, (seq_id, token, position, logits) in enumerate(entries):
+            batch.token[i] = token
+            batch.pos[i] = position
+            batch.n_seq_id[i] = 1
+            batch.seq_id[i][0] = seq_id
+            batch.logits[i] = logits
+        code = llama_cpp.llama_decode(self.model.ctx, batch)
+        if code != 0:
+            raise RuntimeError(f'llama_decode (borrador) devolvió {code}')
+        proposed = []
+        for i, (seq_id, token, position, logits) in enumerate(entries):
+            self._evaluated[seq_id].append(token)
+            if logits:
+                row = np.ctypeslib.as_array(llama_cpp.llama_get_logits_ith(self.model.ctx, i), shape=(self._n_vocab,))
+                proposed.append((seq_id, int(np.argmax(row))))
+        return proposed
+
+    def record(self, accepted: int) -> None:
+        """Anotar cuántos tokens propuestos aceptó el modelo principal"""
+        self.accepted += accepted
+
+    def release(self, seq_id: int) -> None:
+        """Olvidar la secuencia al terminar (su seq_id se reutilizará)"""
+        if self._evaluated.pop(seq_id, None):
+            llama_cpp.llama_kv_cache_seq_rm(self.model.ctx, seq_id, -1, -1)
+
+    def reset(self) -> None:
+        for seq_id in list(self._evaluated):
+            self.release(seq_id)
+
+    def close(self) -> None:
+        self.reset()
+        if self._batch is not None:
+            llama_cpp.llama_batch_free(self._batch)
+            self._batch = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Métricas de la decodificación especulativa"""
+        return {
+            'rounds': self.rounds,
+            'drafted': self.drafted,
+            'accepted': self.accepted,
+            'acceptance_rate': round(self.accepted / self.drafted, 4) if self.drafted else 0.0,
+            'avg_accepted_per_round': round(self.accepted / self.rounds, 2) if self.rounds else 0.0,
+            'failures': self.failures,
+            'draft_ms': round(self._draft_total * 1000, 2)
+        }
@@ -0,0 +1,157 @@
+"""
+Salida estructurada (JSON) de los agentes LLM.
+Las formas que espera _consolidate_results (recomendaciones con category,
+priority, impact y actions; KPIs con name, current, target e improvement) se
+describen con un subconjunto de JSON Schema y se traducen a una gramática
+GBNF de llama.cpp: el muestreo sólo admite tokens que mantienen el JSON
+válido, así que la generación termina siempre en un objeto que se parsea a la
+primera.
+
+Los textos tienen longitud máxima y las listas un número máximo de
+elementos, de modo que el JSON completo tiene un tamaño acotado. Bajo
+gramática el planificador descarta los tokens de byte suelto, así que cada
+token aporta al menos un carácter: la longitud máxima en caracteres es el
+presupuesto de tokens de la petición y el objeto se cierra antes de agotarlo.
+El JSON es compacto (sin espacios entre elementos).
+"""
+
+import json
+from typing import Any, Dict
+
+# Caracteres admitidos dentro de un texto: sin comillas, barras invertidas ni controles
+_CHAR_RULE = 'char ::= [^"\\\\\\x00-\\x1F]'
+
+PRIORITIES = ('Alta', 'Media', 'Baja')
+
+KPI_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'name': {'type': 'string', 'maxLength': 32},
+        'current': {'type': 'string', 'maxLength': 12},
+        'target': {'type': 'string', 'maxLength': 12},
+        'improvement': {'type': 'string', 'maxLength': 8}
+    }
+}
+
+
+def recommendation_schema(category: str, max_actions: int = 3) -> Dict[str, Any]:
+    """Forma de una recomendación consolidada con la categoría del agente fijada"""
+    return {
+        'type': 'object',
+        'properties': {
+            'category': {'const': category},
+            'priority': {'enum': list(PRIORITIES)},
+            'impact': {'type': 'string', 'maxLength': 60},
+            'actions': {'type': 'array', 'minItems': 1, 'maxItems': max_actions,
+                        'items': {'type': 'string', 'maxLength': 80}}
+        }
+    }
+
+
+def kpis_schema(min_items: int = 2, max_items: int = 3) -> Dict[str, Any]:
+    return {'type': 'array', 'minItems': min_items, 'maxItems': max_items, 'items': KPI_SCHEMA}
+
+
+def _escape(char: str) -> str:
+    # El parser GBNF de llama-cpp-python sólo admite ASCII literal: el resto como \uXXXX
+    if char in '\\"':
+        return '\\' + char
+    if ord(char) < 128:
+        return char
+    return f'\\u{ord(char):04X}' if ord(char) <= 0xFFFF else f'\\U{ord(char):08X}'
+
+
+def _literal(value: str) -> str:
+    """Literal GBNF que genera el JSON de un texto fijo"""
+    return '"' + ''.join(_escape(char) for char in json.dumps(value, ensure_ascii=False)) + '"'
+
+
+def _repeat(item: str, min_items: int, max_items: int, separator: str = '') -> str:
+    """Entre min_items y max_items repeticiones de item (sin {m,n}: opcionales anidados)"""
+    sep = f'{separator} ' if separator else ''
+    required = ([item] + [sep + item] * (min_items - 1)) if min_items else []
+    optional = ''
+    for index in range(max_items - min_items):
+        # Sólo el primer elemento de una lista sin obligatorios va sin separador
+        lead = '' if index == max_items - min_items - 1 and not required else sep
+        optional = f'({lead}{item}' + (f' {optional}' if optional else '') + ')?'
+    return ' '.join(required + ([optional] if optional else []))
+
+
+def _expression(schema: Dict[str, Any]) -> str:
+    if 'const' in schema:
+        return _literal(schema['const'])
+    if 'enum' in schema:
+        return '(' + ' | '.join(_literal(value) for value in schema['enum']) + ')'
+    kind = schema.get('type')
+    if kind == 'string':
+        return '"\\"" ' + _repeat('char', schema.get('minLength', 1), schema['maxLength']) + ' "\\""'
+    if kind == 'array':
+        items = _repeat(_expression(schema['items']), schema.get('minItems', 0), schema['maxItems'], '","')
+        return f'"[" {items} "]"'
+    if kind == 'object':
+        fields = [f'{_literal(key)} ":" {_expression(value)}' for key, value in schema['properties'].items()]
+        return '"{" ' + ' "," '.join(fields) + ' "}"'
+    raise ValueError(f'Esquema no soportado: {schema}')
+
+
+def schema_to_gbnf(schema: Dict[str, Any]) -> str:
+    """Gramática GBNF que sólo genera JSON compacto con la forma del esquema"""
+    return f'root ::= {_expression(schema)}\n{_CHAR_RULE}\n'
+
+
+def max_chars(schema: Dict[str, Any]) -> int:
+    """Longitud máxima del JSON generado (cota del presupuesto de tokens)"""
+    if 'const' in schema:
+        return len(json.dumps(schema['const'], ensure_ascii=False))
+    if 'enum' in schema:
+        return max(len(json.dumps(value, ensure_ascii=False)) for value in schema['enum'])
+    kind = schema.get('type')
+    if kind == 'string':
+        return schema['maxLength'] + 2
+    if kind == 'array':
+        return 2 + schema['maxItems'] * (max_chars(schema['items']) + 1)
+    return 2 + sum(len(json.dumps(key)) + 2 + max_chars(value) for key, value in schema['properties'].items())
+
+
+def schema_template(schema: Dict[str, Any]) -> str:
+    """Ejemplo legible de la forma esperada, para el prompt"""
+    def template(node: Dict[str, Any]) -> Any:
+        if 'const' in node:
+            return node['const']
+        if 'enum' in node:
+            return '|'.join(node['enum'])
+        kind = node.get('type')
+        if kind == 'array':
+            return [template(node['items'])]
+        if kind == 'object':
+            return {key: template(value) for key, value in node['properties'].items()}
+        return '...'
+    return json.dumps(template(schema), ensure_ascii=False)
+
+
+def _valid(value: Any, schema: Dict[str, Any]) -> bool:
+    if 'const' in schema:
+        return value == schema['const']
+    if 'enum' in schema:
+        return value in schema['enum']
+    kind = schema.get('type')
+    if kind == 'string':
+        return isinstance(value, str) and schema.get('minLength', 1) <= len(value) <= schema['maxLength']
+    if kind == 'array':
+        return (isinstance(value, list) and schema.get('minItems', 0) <= len(value) <= schema['maxItems']
+                and all(_valid(item, schema['items']) for item in value))
+    return (isinstance(value, dict) and set(value) == set(schema['properties'])
+            and all(_valid(value[key], item) for key, item in schema['properties'].items()))
+
+
+def parse_structured(text: str, schema: Dict[str, Any]) -> Any:
+    """JSON del texto generado si tiene la forma del esquema (ValueError si no)"""
+    try:
+        value = json.loads(text.strip())
+    except json.JSONDecodeError as e:
+        raise ValueError(f'JSON no válido: {e}')
+    if not _valid(value, schema):
+        raise ValueError('El JSON no tiene la forma esperada')
+    return value
+
@@ -0,0 +1,229 @@
+"""
+Caché semántica de análisis con embeddings de sentence-transformers.
+Muchas peticiones son casi duplicadas (la misma plataforma SaaS con el mismo
+problema de churn, redactada de otra forma): la descripción, los desafíos y
+los objetivos normalizados se convierten en un embedding y se buscan en un
+índice en memoria de vecinos más cercanos (similitud coseno). Si el análisis
+previo más parecido supera el umbral de similitud, se reutiliza.
+
+El texto generado por el LLM puede citar el nombre y la descripción del
+negocio, así que sólo se comparan entradas del mismo ámbito (el usuario que
+las envió), namespace, tipo de negocio, nombre y website: nunca se sirve a
+un usuario lo generado para otro. Sin ámbito no se consulta la caché.
+
+El índice tiene un número máximo de entradas con TTL y desalojo LRU. Está
+desactivada por defecto (SEMANTIC_CACHE_SIZE=0) y también si
+sentence-transformers no está instalado. El umbral por defecto no está
+validado con el modelo real: hay que medir precisión y recall con
+benchmarks/bench_semantic_cache.py antes de activarla.
+"""
+
+import os
+import re
+import copy
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from services.analysis_cache import normalize_business_data
+
+try:
+    import numpy as np
+except ImportError:  # numpy es opcional: sin él la caché semántica queda desactivada
+    np = None
+
+try:
+    from sentence_transformers import SentenceTransformer
+except ImportError:  # sentence-transformers es opcional: sin él la caché semántica queda desactivada
+    SentenceTransformer = None
+
+# Campos de texto libre que se comparan por significado
+SEMANTIC_FIELDS = (('description', 'Descripción'), ('challenges', 'Desafíos'), ('goals', 'Objetivos'))
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def _fold(value: Any) -> str:
+    return _WHITESPACE_RE.sub(' ', str(value or '')).strip().lower()
+
+
+def semantic_text(business_data: Dict[str, Any]) -> str:
+    """Texto normalizado (minúsculas, espacios plegados) que se convierte en embedding"""
+    normalized = normalize_business_data(business_data)
+    return '\n'.join(f"{label}: {_fold(normalized.get(field))}" for field, label in SEMANTIC_FIELDS)
+
+
+def semantic_partition(business_data: Dict[str, Any], scope: str, namespace: str = '') -> int:
+    """Id (64 bits) de las entradas comparables: mismo ámbito, namespace, tipo, nombre y website"""
+    key = '\x00'.join([scope, namespace, _fold(business_data.get('business_type')),
+                       _fold(business_data.get('business_name')), _fold(business_data.get('website'))])
+    return int.from_bytes(hashlib.sha256(key.encode('utf-8')).digest()[:8], 'little', signed=True)
+
+
+class SemanticCache:
+    """Índice en memoria de embeddings de entradas con su análisis"""
+
+    def __init__(self, model_name: str, threshold: float = 0.92, max_entries: int = 0,
+                 ttl_seconds: float = 3600):
+        self.model_name = model_name
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._encoder = None
+        self._lock = threading.Lock()
+        self._model_lock = threading.Lock()
+        # Filas del índice: vector normalizado, partición, ocupada, resultado, caducidad y último uso
+        self._vectors: Any = None
+        self._partitions: Any = None
+        self._used: Any = None
+        self._results: List[Optional[Dict[str, Any]]] = []
+        self._expires: Any = None
+        self._last_used: Any = None
+        # Embeddings recientes: el set() tras un get() fallido no vuelve a codificar
+        self._recent: 'OrderedDict[str, Any]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._encode_total = 0.0
+        self._encodes = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and np is not None and SentenceTransformer is not None
+
+    def _encode(self, text: str) -> Any:
+        with self._lock:
+            vector = self._recent.get(text)
+            if vector is not None:
+                self._recent.move_to_end(text)
+                return vector
+        if self._encoder is None:
+            with self._model_lock:
+                if self._encoder is None:
+                    # Se carga en el primer uso de cada proceso (no en el master de gunicorn)
+                    model = SentenceTransformer(self.model_name, device='cpu')
+                    self._encoder = lambda texts: model.encode(texts, normalize_embeddings=True,
+                                                               convert_to_numpy=True, show_progress_bar=False)
+        started = time.perf_counter()
+        vector = np.asarray(self._encoder([text])[0], dtype=np.float32)
+        # Normalizar aquí también: el producto escalar es la similitud coseno
+        vector /= max(float(np.linalg.norm(vector)), 1e-12)
+        with self._lock:
+            self._encode_total += time.perf_counter() - started
+            self._encodes += 1
+            self._recent[text] = vector
+            while len(self._recent) > 256:
+                self._recent.popitem(last=False)
+        return vector
+
+    def _allocate(self, dim: int) -> None:
+        self._vectors = np.zeros((self.max_entries, dim), dtype=np.float32)
+        self._partitions = np.zeros(self.max_entries, dtype=np.int64)
+        self._used = np.zeros(self.max_entries, dtype=bool)
+        self._results = [None] * self.max_entries
+        self._expires = np.zeros(self.max_entries)
+        self._last_used = np.zeros(self.max_entries)
+
+    def lookup(self, business_data: Dict[str, Any], scope: str, namespace: str = '') -> Optional[Dict[str, Any]]:
+        """{'result': análisis, 'similarity': similitud} del análisis previo más parecido por encima del
+        umbral, o None. `result` es el objeto guardado en la caché: no debe modificarse"""
+        if not self.enabled:
+            return None
+        vector = self._encode(semantic_text(business_data))
+        partition = semantic_partition(business_data, scope, namespace)
+        now = time.monotonic()
+        with self._lock:
+            if self._vectors is None:
+                self.misses += 1
+                return None
+            candidates = self._used & (self._partitions == partition) & (self._expires > now)
+            if not candidates.any():
+                self.misses += 1
+                return None
+            similarities = np.where(candidates, self._vectors @ vector, -np.inf)
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return None
+            self._last_used[best] = now
+            self.hits += 1
+            return {'result': self._results[best], 'similarity': float(similarities[best])}
+
+    def get(self, business_data: Dict[str, Any], scope: str, namespace: str = '') -> Optional[Dict[str, Any]]:
+        """Análisis de una entrada casi idéntica del mismo ámbito (con `generated_at` actualizado) o None"""
+        match = self.lookup(business_data, scope, namespace)
+        if match is None:
+            return None
+        result = copy.deepcopy(match['result'])
+        # El nombre coincide salvo mayúsculas y espacios: se devuelve el enviado
+        if 'business_name' in result:
+            result['business_name'] = business_data.get('business_name', '')
+        if 'generated_at' in result:
+            result['generated_at'] = datetime.now().isoformat()
+        return result
+
+    def set(self, business_data: Dict[str, Any], result: Dict[str, Any], scope: str, namespace: str = '') -> None:
+        """Indexar el análisis de una entrada"""
+        if not self.enabled:
+            return
+        vector = self._encode(semantic_text(business_data))
+        partition = semantic_partition(business_data, scope, namespace)
+        # Copia profunda: el llamador sigue teniendo (y puede modificar) el resultado original
+        result = copy.deepcopy(result)
+        now = time.monotonic()
+        with self._lock:
+            if self._vectors is None:
+                self._allocate(len(vector))
+            # Hueco libre o caducado; si no hay, se desaloja la entrada usada hace más tiempo
+            free = np.flatnonzero(~self._used | (self._expires <= now))
+            if len(free):
+                slot = int(free[0])
+                if self._used[slot]:
+                    self.evictions += 1
+            else:
+                slot = int(np.argmin(self._last_used))
+                self.evictions += 1
+            self._vectors[slot] = vector
+            self._partitions[slot] = partition
+            self._used[slot] = True
+            self._results[slot] = result
+            self._expires[slot] = now + self.ttl_seconds
+            self._last_used[slot] = now
+
+    def clear(self) -> None:
+        with self._lock:
+            self._vectors = self._partitions = self._used = None
+            self._results = []
+            self._recent.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores de uso de la caché semántica"""
+        now = time.monotonic()
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'model': self.model_name,
+                'threshold': self.threshold,
+                # Sólo las vigentes: las caducadas ocupan hueco hasta que se reutiliza
+                'entries': int((self._used & (self._expires > now)).sum()) if self._used is not None else 0,
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+                'avg_encode_ms': round(self._encode_total / self._encodes * 1000, 2) if self._encodes else 0.0
+            }
+
+
+# Instancia global de la caché semántica de análisis (desactivada salvo SEMANTIC_CACHE_SIZE > 0;
+# el umbral por defecto no está validado con el modelo real)
+semantic_cache = SemanticCache(
+    model_name=os.getenv('SEMANTIC_CACHE_MODEL', 'paraphrase-multilingual-MiniLM-L12-v2'),
+    threshold=float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.92')),
+    max_entries=int(os.getenv('SEMANTIC_CACHE_SIZE', '0')),
+    ttl_seconds=float(os.getenv('SEMANTIC_CACHE_TTL', '3600'))
+)
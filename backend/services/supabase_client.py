@@ -0,0 +1,149 @@
+"""
+Fábrica del cliente de Supabase: se crea en el primer uso (no al importar, de
+modo que un Supabase lento o caído no retrasa el arranque) y usa conexiones
+HTTP keep-alive en pool con límites y timeouts configurables.
+
+SUPABASE_URL y SUPABASE_KEY se leen al crear el cliente, no al importar el
+módulo: las apps importan los servicios antes de llamar a load_dotenv().
+"""
+
+import os
+import time
+import threading
+from typing import Any, Dict, Optional
+
+import httpx
+from gotrue.http_clients import SyncClient as AuthHttpClient
+from postgrest import SyncPostgrestClient
+from postgrest.utils import SyncClient as RestHttpClient
+from supabase import Client
+from supabase.lib.client_options import ClientOptions
+from supabase._sync.auth_client import SyncSupabaseAuthClient
+
+
+class _PooledPostgrestClient(SyncPostgrestClient):
+    """Cliente PostgREST cuya sesión httpx usa los límites del pool"""
+
+    def __init__(self, *args, limits: httpx.Limits, **kwargs):
+        self._limits = limits
+        super().__init__(*args, **kwargs)
+
+    def create_session(self, base_url, headers, timeout):
+        return RestHttpClient(base_url=base_url, headers=headers, timeout=timeout, limits=self._limits)
+
+
+class PooledSupabaseClient(Client):
+    """Cliente de Supabase con pools keep-alive para auth y PostgREST"""
+
+    def __init__(self, supabase_url: str, supabase_key: str, options: ClientOptions,
+                 limits: httpx.Limits, timeout: httpx.Timeout):
+        self._limits = limits
+        self._timeout = timeout
+        self._auth_http: Optional[AuthHttpClient] = None
+        super().__init__(supabase_url, supabase_key, options)
+
+    def _init_supabase_auth_client(self, auth_url: str, client_options: ClientOptions) -> SyncSupabaseAuthClient:
+        # Se guarda la sesión de auth que creamos para el health check y el cierre
+        self._auth_http = AuthHttpClient(limits=self._limits, timeout=self._timeout)
+        return SyncSupabaseAuthClient(
+            url=auth_url,
+            auto_refresh_token=client_options.auto_refresh_token,
+            persist_session=client_options.persist_session,
+            storage=client_options.storage,
+            headers=client_options.headers,
+            flow_type=client_options.flow_type,
+            http_client=self._auth_http
+        )
+
+    def _init_postgrest_client(self, rest_url: str, headers: Dict[str, str], schema: str,
+                               timeout=None) -> SyncPostgrestClient:
+        return _PooledPostgrestClient(
+            rest_url, headers=headers, schema=schema, timeout=self._timeout, limits=self._limits
+        )
+
+    def auth_health(self) -> httpx.Response:
+        """GET al endpoint de salud de GoTrue por el pool de auth"""
+        return self._auth_http.get(f"{self.auth_url}/health", headers={'apikey': self.supabase_key})
+
+    def close(self) -> None:
+        """Cerrar los pools HTTP"""
+        self._auth_http.close()
+        if self._postgrest is not None:
+            self._postgrest.session.close()
+
+
+class SupabaseClientFactory:
+    """Crea (una vez por proceso) y comparte el cliente de Supabase"""
+
+    def __init__(self, url: Optional[str] = None, key: Optional[str] = None, max_connections: int = 20,
+                 max_keepalive_connections: int = 10, keepalive_expiry: float = 30.0,
+                 timeout: float = 10.0, connect_timeout: float = 3.0):
+        self.url = url
+        self.key = key
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self._client: Optional[PooledSupabaseClient] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def get(self) -> PooledSupabaseClient:
+        """Cliente compartido (se crea en el primer uso y tras un fork)"""
+        client = self._client
+        if client is not None and self._pid == os.getpid():
+            return client
+        with self._lock:
+            if self._client is None or self._pid != os.getpid():
+                # Los sockets heredados de otro proceso no se reutilizan
+                self._client = PooledSupabaseClient(
+                    self.url or os.environ.get('SUPABASE_URL'), self.key or os.environ.get('SUPABASE_KEY'),
+                    ClientOptions(), limits=self.limits, timeout=self.timeout
+                )
+                self._pid = os.getpid()
+            return self._client
+
+    def health_check(self) -> Dict[str, Any]:
+        """Comprobar que el servicio de auth de Supabase responde"""
+        started = time.perf_counter()
+        try:
+            response = self.get().auth_health()
+            status = 'ok' if response.status_code < 500 else 'error'
+            detail = {'status_code': response.status_code}
+        except Exception as e:
+            status = 'error'
+            detail = {'error': str(e)}
+        return {
+            'status': status,
+            'latency_ms': round((time.perf_counter() - started) * 1000, 2),
+            **detail
+        }
+
+    def close(self) -> None:
+        """Cerrar el cliente del proceso actual"""
+        with self._lock:
+            if self._client is not None and self._pid == os.getpid():
+                self._client.close()
+            self._client = None
+
+
+class LazySupabaseClient:
+    """Proxy con la interfaz de Client que delega en el cliente compartido"""
+
+    def __init__(self, factory: SupabaseClientFactory):
+        self._factory = factory
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._factory.get(), name)
+
+
+# Instancia global de la fábrica de clientes de Supabase
+supabase_factory = SupabaseClientFactory(
+    max_connections=int(os.getenv('SUPABASE_MAX_CONNECTIONS', '20')),
+    max_keepalive_connections=int(os.getenv('SUPABASE_MAX_KEEPALIVE', '10')),
+    keepalive_expiry=float(os.getenv('SUPABASE_KEEPALIVE_EXPIRY', '30')),
+    timeout=float(os.getenv('SUPABASE_TIMEOUT', '10')),
+    connect_timeout=float(os.getenv('SUPABASE_CONNECT_TIMEOUT', '3'))
+)
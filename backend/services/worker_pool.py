@@ -0,0 +1,104 @@
+"""
+Pool de trabajo compartido por todo el proceso para ejecutar los agentes de IA.
+Limita tanto los hilos como el trabajo en vuelo (en ejecución + en cola) entre
+todas las peticiones concurrentes, de modo que un pico de tráfico no dispare
+la creación de cientos de hilos.
+"""
+
+import os
+import time
+import atexit
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+
+class PoolSaturatedError(RuntimeError):
+    """La cola del pool está llena y no se liberó hueco dentro del plazo"""
+
+
+class BoundedWorkerPool:
+    """ThreadPoolExecutor con tamaño configurable y cola de envío acotada"""
+
+    def __init__(self, max_workers: int, queue_size: int, acquire_timeout: float = 10.0,
+                 thread_name_prefix: str = 'anclora-agent'):
+        self.max_workers = max(1, max_workers)
+        self.queue_size = max(0, queue_size)
+        self.capacity = self.max_workers + self.queue_size
+        self.acquire_timeout = acquire_timeout
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                            thread_name_prefix=thread_name_prefix)
+        self._slots = threading.BoundedSemaphore(self.capacity)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._rejected = 0
+
+    def _release(self, _future: Future) -> None:
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def _submit_with_slot(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+        """Enviar una tarea cuando ya se tiene reservado un hueco"""
+        with self._lock:
+            self._in_flight += 1
+        try:
+            future = self._executor.submit(fn, *args, **kwargs)
+        except Exception:
+            self._release(None)
+            raise
+        # El hueco se libera cuando la tarea termina de verdad, aunque quien
+        # la esperaba haya abandonado por timeout
+        future.add_done_callback(self._release)
+        return future
+
+    def _reject(self) -> None:
+        with self._lock:
+            self._rejected += 1
+        raise PoolSaturatedError(
+            f"Pool de agentes saturado ({self.capacity} tareas en vuelo)"
+        )
+
+    def submit(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+        """Enviar una tarea bloqueando hasta acquire_timeout si la cola está llena"""
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            self._reject()
+        return self._submit_with_slot(fn, *args, **kwargs)
+
+    async def run(self, fn: Callable[..., Any], *args: Any, timeout: Optional[float] = None,
+                  **kwargs: Any) -> Any:
+        """Ejecutar una tarea en el pool y esperarla sin bloquear el event loop"""
+        deadline = time.monotonic() + self.acquire_timeout
+        delay = 0.001
+        while not self._slots.acquire(blocking=False):
+            if time.monotonic() >= deadline:
+                self._reject()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.05)
+
+        future = self._submit_with_slot(fn, *args, **kwargs)
+        return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+
+    def stats(self) -> Dict[str, int]:
+        """Estado actual del pool"""
+        with self._lock:
+            return {
+                'max_workers': self.max_workers,
+                'queue_size': self.queue_size,
+                'in_flight': self._in_flight,
+                'rejected': self._rejected
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Cerrar el pool esperando a las tareas en curso"""
+        self._executor.shutdown(wait=wait)
+
+
+# Instancia global del pool de agentes
+agent_pool = BoundedWorkerPool(
+    max_workers=int(os.getenv('AGENT_POOL_WORKERS', str(min(32, (os.cpu_count() or 1) * 4)))),
+    queue_size=int(os.getenv('AGENT_POOL_QUEUE_SIZE', '64')),
+    acquire_timeout=float(os.getenv('AGENT_POOL_ACQUIRE_TIMEOUT', '10'))
+)
+atexit.register(agent_pool.shutdown, False)
@@ -0,0 +1,88 @@
+"""
+Un análisis codificado (plantilla + diferencias) debe reconstruirse idéntico,
+también en el tipo de cada valor: True frente a 1 o 70.0 frente a 70 son
+iguales con == de Python pero distintos en el JSON guardado.
+
+Ejecutar desde backend/: python -m pytest tests
+"""
+
+import os
+import sys
+import json
+import asyncio
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from services.ai_agents import AIAgentOrchestrator
+from services.analysis_cache import AnalysisCache
+from services.analysis_codec import AnalysisCodec, AnalysisTemplates
+
+
+def _typed(doc) -> str:
+    return json.dumps(doc, ensure_ascii=False, sort_keys=True)
+
+
+@pytest.fixture(scope='module')
+def codec():
+    return AnalysisCodec(AnalysisTemplates(table=None))
+
+
+@pytest.fixture(scope='module')
+def document():
+    orchestrator = AIAgentOrchestrator(cache=AnalysisCache(max_entries=0))
+    data = {'business_type': 'saas', 'business_name': 'CloudMetrics', 'website': 'https://cloudmetrics.io',
+            'description': 'Plataforma SaaS de analítica', 'challenges': 'Churn alto', 'goals': 'Crecer MRR'}
+    return json.loads(json.dumps(asyncio.run(orchestrator.analyze_business_comprehensive(data))))
+
+
+def _numbers_and_bools(doc, path=()):
+    """Rutas de los valores numéricos y booleanos del documento"""
+    if isinstance(doc, dict):
+        for key, value in doc.items():
+            yield from _numbers_and_bools(value, path + (key,))
+    elif isinstance(doc, list):
+        for index, value in enumerate(doc):
+            yield from _numbers_and_bools(value, path + (index,))
+    elif isinstance(doc, (bool, int, float)):
+        yield path, doc
+
+
+def _swap_type(value):
+    # Mismo valor para == pero otro tipo JSON
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, int):
+        return float(value)
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _set(doc, path, value):
+    for key in path[:-1]:
+        doc = doc[key]
+    doc[path[-1]] = value
+
+
+def test_round_trip(codec, document):
+    compact = codec.encode(document)
+    assert _typed(codec.decode(compact)) == _typed(document)
+    assert _typed(codec.decode(json.loads(json.dumps(compact)))) == _typed(document)
+
+
+def test_round_trip_keeps_bool_and_number_types(codec, document):
+    paths = list(_numbers_and_bools(document))
+    assert paths, 'el análisis debería tener valores numéricos'
+    for path, value in paths:
+        changed = json.loads(json.dumps(document))
+        _set(changed, path, _swap_type(value))
+        assert _typed(codec.decode(codec.encode(changed))) == _typed(changed), path
+
+
+@pytest.mark.parametrize('value', [True, False, 1, 0, 70, 70.0, 0.5])
+def test_round_trip_of_added_values(codec, document, value):
+    changed = json.loads(json.dumps(document))
+    changed['extra'] = {'flag': value, 'list': [value, 1, True, 1.0]}
+    assert _typed(codec.decode(codec.encode(changed))) == _typed(changed)
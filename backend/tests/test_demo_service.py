@@ -0,0 +1,74 @@
+"""
+Las respuestas demo pre-serializadas (DemoResponseRenderer) deben ser byte a
+byte las mismas que serializar build_demo_analysis con el proveedor JSON de
+cada modo: Flask (app.json.response) y ASGI (JSONResponse). Sólo generated_at
+difiere entre dos llamadas y se normaliza antes de comparar.
+
+Ejecutar desde backend/: python -m pytest tests
+"""
+
+import os
+import re
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from starlette.responses import JSONResponse
+from starlette.testclient import TestClient
+
+import asgi
+import wsgi
+from services.demo_service import build_demo_analysis
+
+# app.py se carga por ruta en wsgi.py (el paquete backend/app/ lo oculta)
+flask_app = wsgi.app
+flask_demo_renderer = wsgi._module.demo_renderer
+
+_GENERATED_AT = re.compile(rb'"generated_at":"[^"]*"')
+
+# saas, ecommerce y el genérico ('default'), con variantes que caen en cada plantilla
+BUSINESS_TYPES = ['saas', 'ecommerce', 'local', 'startup', 'SaaS', '', None]
+BUSINESS_NAMES = [
+    'Tu Negocio',
+    'Comillas "dobles" y \'simples\'',
+    'Barras \\invertidas\\ y /normales/',
+    'Añil & Cía — café 🚀',
+    'Control\x00\x01\x1f\x7f\nlínea\ttab\r',
+    '</script>{name}{0}',
+    '',
+]
+
+
+def _normalize(body: bytes) -> bytes:
+    return _GENERATED_AT.sub(b'"generated_at":"-"', body)
+
+
+@pytest.mark.parametrize('business_type', BUSINESS_TYPES)
+@pytest.mark.parametrize('business_name', BUSINESS_NAMES)
+def test_flask_renderer_matches_dynamic(business_type, business_name):
+    expected = flask_app.json.response(build_demo_analysis(business_type, business_name)).get_data()
+    assert _normalize(flask_demo_renderer.render(business_type, business_name)) == _normalize(expected)
+
+
+@pytest.mark.parametrize('business_type', BUSINESS_TYPES)
+@pytest.mark.parametrize('business_name', BUSINESS_NAMES)
+def test_asgi_renderer_matches_dynamic(business_type, business_name):
+    expected = JSONResponse(build_demo_analysis(business_type, business_name)).body
+    assert _normalize(asgi.demo_renderer.render(business_type, business_name)) == _normalize(expected)
+
+
+@pytest.mark.parametrize('business_type', ['saas', 'ecommerce', 'local'])
+def test_demo_endpoints_match_dynamic(business_type):
+    business_name = 'Comillas "dobles", \\barras\\ y ñ\x01'
+    payload = {'business_type': business_type, 'business_name': business_name}
+    expected = build_demo_analysis(business_type, business_name)
+
+    flask_response = flask_app.test_client().post('/analyze-demo', json=payload)
+    assert flask_response.status_code == 200
+    assert _normalize(flask_response.get_data()) == _normalize(flask_app.json.response(expected).get_data())
+
+    asgi_response = TestClient(asgi.app).post('/analyze-demo', json=payload)
+    assert asgi_response.status_code == 200
+    assert _normalize(asgi_response.content) == _normalize(JSONResponse(expected).body)
@@ -0,0 +1,19 @@
+# wsgi.py (Punto de entrada de producción)
+# Carga la API y los servicios de IA antes de que el servidor pre-fork cree los
+# workers, de modo que todos comparten esas páginas de memoria copy-on-write.
+# Ejecutar con: gunicorn -c gunicorn.conf.py wsgi:app
+import os
+import importlib.util
+
+# El paquete backend/app/ oculta app.py en "import app", así que se carga por ruta
+_spec = importlib.util.spec_from_file_location(
+    'anclora_app', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')
+)
+_module = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(_module)
+
+# Precargar servicios de IA y construir el orquestador en el proceso maestro
+from services.ai_service import ai_service  # noqa: E402
+from services.ai_agents import agent_orchestrator  # noqa: E402
+
+app = _module.app
@@ -26,9 +26,64 @@ class AnalysisService {
     }
   }
 
-  async getUserAnalyses() {
+  // Análisis en streaming (SSE): onEvent(evento, datos) se llama por cada agente
+  // que termina y una última vez con el análisis consolidado
+  async streamBusinessAnalysis(businessData, onEvent) {
+    const response = await fetch(`${API_BASE_URL}/analyze/stream`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        'Accept': 'text/event-stream',
+        'Authorization': `Bearer ${localStorage.getItem('token')}`
+      },
+      body: JSON.stringify(businessData)
+    })
+
+    if (!response.ok || !response.body) {
+      throw new Error('Error en el análisis')
+    }
+
+    const reader = response.body.getReader()
+    const decoder = new TextDecoder()
+    let buffer = ''
+    let consolidated = null
+
+    while (true) {
+      const { done, value } = await reader.read()
+      if (done) break
+      buffer += decoder.decode(value, { stream: true })
+
+      let separator
+      while ((separator = buffer.indexOf('\n\n')) !== -1) {
+        const rawEvent = buffer.slice(0, separator)
+        buffer = buffer.slice(separator + 2)
+
+        let event = 'message'
+        let data = ''
+        for (const line of rawEvent.split('\n')) {
+          if (line.startsWith('event: ')) event = line.slice(7)
+          else if (line.startsWith('data: ')) data += line.slice(6)
+        }
+
+        const payload = data ? JSON.parse(data) : null
+        if (event === 'error') throw new Error(payload?.error || 'Error en el análisis')
+        if (event === 'consolidated') consolidated = payload
+        onEvent?.(event, payload)
+      }
+    }
+
+    return consolidated
+  }
+
+  // Página de resúmenes: { analyses, next_cursor }. Pasar next_cursor para la siguiente
+  async getUserAnalyses({ cursor, limit } = {}) {
     try {
-      const response = await fetch(`${API_BASE_URL}/analyses`, {
+      const params = new URLSearchParams()
+      if (cursor) params.set('cursor', cursor)
+      if (limit) params.set('limit', limit)
+      const query = params.toString() ? `?${params}` : ''
+
+      const response = await fetch(`${API_BASE_URL}/analyses${query}`, {
         headers: {
           'Authorization': `Bearer ${localStorage.getItem('token')}`
         }
@@ -45,6 +100,25 @@ class AnalysisService {
     }
   }
 
+  async getAnalysis(analysisId) {
+    try {
+      const response = await fetch(`${API_BASE_URL}/analyses/${encodeURIComponent(analysisId)}`, {
+        headers: {
+          'Authorization': `Bearer ${localStorage.getItem('token')}`
+        }
+      })
+
+      if (!response.ok) {
+        throw new Error('Error obteniendo análisis')
+      }
+
+      return await response.json()
+    } catch (error) {
+      console.error('Error fetching analysis:', error)
+      throw error
+    }
+  }
+
   // Análisis offline con IA simulada
   generateOfflineAnalysis(businessData) {
     const { businessType, businessName, description, currentChallenges, goals } = businessData